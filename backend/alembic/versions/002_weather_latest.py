@@ -0,0 +1,55 @@
+"""Weather latest projection
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('weather_latest',
+    sa.Column('city_id', sa.Integer(), nullable=False),
+    sa.Column('ts', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('temp_c', sa.Float(), nullable=True),
+    sa.Column('feels_like_c', sa.Float(), nullable=True),
+    sa.Column('humidity', sa.Integer(), nullable=True),
+    sa.Column('pressure', sa.Integer(), nullable=True),
+    sa.Column('wind_speed', sa.Float(), nullable=True),
+    sa.Column('wind_deg', sa.Integer(), nullable=True),
+    sa.Column('clouds', sa.Integer(), nullable=True),
+    sa.Column('visibility', sa.Integer(), nullable=True),
+    sa.Column('weather_main', sa.String(length=255), nullable=True),
+    sa.Column('weather_description', sa.String(length=255), nullable=True),
+    sa.Column('raw_id', sa.Integer(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['city_id'], ['cities.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['raw_id'], ['weather_raw.id'], ),
+    sa.PrimaryKeyConstraint('city_id')
+    )
+    
+    # Rellenar con la última observación existente de cada ciudad
+    op.execute("""
+        INSERT INTO weather_latest (
+            city_id, ts, temp_c, feels_like_c, humidity, pressure, wind_speed, wind_deg,
+            clouds, visibility, weather_main, weather_description, raw_id
+        )
+        SELECT h.city_id, h.ts, h.temp_c, h.feels_like_c, h.humidity, h.pressure, h.wind_speed, h.wind_deg,
+               h.clouds, h.visibility, h.weather_main, h.weather_description, h.raw_id
+        FROM weather_hourly h
+        JOIN (
+            SELECT city_id, MAX(ts) AS ts FROM weather_hourly GROUP BY city_id
+        ) latest ON latest.city_id = h.city_id AND latest.ts = h.ts
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('weather_latest')
@@ -0,0 +1,43 @@
+"""Alert firing state, hysteresis and cooldown
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('alerts', sa.Column('hysteresis', sa.Float(), nullable=True))
+    op.add_column('alerts', sa.Column('cooldown_minutes', sa.Integer(), nullable=True))
+    op.add_column('alerts', sa.Column('state', sa.String(length=10), server_default='armed', nullable=False))
+    op.add_column('alerts', sa.Column('state_changed_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('alerts', sa.Column('last_fired_at', sa.DateTime(timezone=True), nullable=True))
+    
+    # Partir de la última activación registrada: las alertas ya disparadas quedan despejadas
+    # y el cooldown evita que se vuelvan a registrar en la primera ejecución del ETL
+    op.execute("""
+        UPDATE alerts SET last_fired_at = (
+            SELECT MAX(ah.ts) FROM alert_history ah WHERE ah.alert_id = alerts.id
+        )
+    """)
+    op.execute("""
+        UPDATE alerts SET state = 'cleared', state_changed_at = last_fired_at
+        WHERE last_fired_at IS NOT NULL
+    """)
+
+
+def downgrade() -> None:
+    op.drop_column('alerts', 'last_fired_at')
+    op.drop_column('alerts', 'state_changed_at')
+    op.drop_column('alerts', 'state')
+    op.drop_column('alerts', 'cooldown_minutes')
+    op.drop_column('alerts', 'hysteresis')
@@ -0,0 +1,34 @@
+"""Composite and partial indexes for alert access paths
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY en PostgreSQL: alert_history puede ser grande y el ETL sigue escribiendo
+    with op.get_context().autocommit_block():
+        op.create_index('idx_alert_history_user_ts', 'alert_history', ['user_id', sa.text('ts DESC')],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index('idx_alert_history_city_ts', 'alert_history', ['city_id', 'ts'],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index('idx_alerts_city_evaluable', 'alerts', ['city_id', 'state'], unique=False,
+                        postgresql_where=sa.text('active = true AND paused = false'),
+                        sqlite_where=sa.text('active = 1 AND paused = 0'),
+                        postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    op.drop_index('idx_alerts_city_evaluable', table_name='alerts')
+    op.drop_index('idx_alert_history_city_ts', table_name='alert_history')
+    op.drop_index('idx_alert_history_user_ts', table_name='alert_history')
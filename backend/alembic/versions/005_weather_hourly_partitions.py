@@ -0,0 +1,118 @@
+"""Monthly range partitioning of weather_hourly (PostgreSQL, optional)
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-17 18:00:00.000000
+
+Solo se aplica en PostgreSQL con WEATHER_HOURLY_PARTITIONING=true; en otro caso (y en
+SQLite) weather_hourly sigue siendo una tabla normal. La conversión copia todas las filas
+a la tabla particionada, así que en bases grandes conviene hacerla en una ventana de
+mantenimiento. No se crea partición DEFAULT: los meses siguientes los crean el arranque
+de la API y scripts/maintain_partitions.py antes de que lleguen sus filas.
+
+"""
+from datetime import date, datetime, timezone
+from alembic import op
+import sqlalchemy as sa
+from app.config import settings
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+COLUMNS = (
+    "id, city_id, ts, temp_c, feels_like_c, humidity, pressure, wind_speed, wind_deg, "
+    "clouds, visibility, weather_main, weather_description, raw_id, created_at"
+)
+
+
+def _is_partitioned(bind) -> bool:
+    return bool(bind.execute(sa.text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('weather_hourly'))"
+    )).scalar())
+
+
+def _rename_weather_hourly(suffix: str):
+    """Apartar la tabla actual liberando los nombres de tabla, restricciones e índices"""
+    op.rename_table('weather_hourly', f'weather_hourly_{suffix}')
+    op.execute(f"ALTER TABLE weather_hourly_{suffix} RENAME CONSTRAINT weather_hourly_pkey TO weather_hourly_{suffix}_pkey")
+    op.execute(f"ALTER TABLE weather_hourly_{suffix} RENAME CONSTRAINT unique_city_timestamp TO unique_city_timestamp_{suffix}")
+    op.execute(f"ALTER INDEX ix_weather_hourly_id RENAME TO ix_weather_hourly_id_{suffix}")
+    op.execute(f"ALTER INDEX idx_weather_hourly_city_ts RENAME TO idx_weather_hourly_city_ts_{suffix}")
+
+
+def _create_weather_hourly(partitioned: bool):
+    """weather_hourly con la definición de 001; particionada la clave primaria incluye ts"""
+    op.create_table('weather_hourly',
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('weather_hourly_id_seq'::regclass)"), nullable=False),
+    sa.Column('city_id', sa.Integer(), nullable=False),
+    sa.Column('ts', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('temp_c', sa.Float(), nullable=True),
+    sa.Column('feels_like_c', sa.Float(), nullable=True),
+    sa.Column('humidity', sa.Integer(), nullable=True),
+    sa.Column('pressure', sa.Integer(), nullable=True),
+    sa.Column('wind_speed', sa.Float(), nullable=True),
+    sa.Column('wind_deg', sa.Integer(), nullable=True),
+    sa.Column('clouds', sa.Integer(), nullable=True),
+    sa.Column('visibility', sa.Integer(), nullable=True),
+    sa.Column('weather_main', sa.String(length=255), nullable=True),
+    sa.Column('weather_description', sa.String(length=255), nullable=True),
+    sa.Column('raw_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['city_id'], ['cities.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['raw_id'], ['weather_raw.id'], ),
+    sa.PrimaryKeyConstraint(*(['id', 'ts'] if partitioned else ['id']), name='weather_hourly_pkey'),
+    sa.UniqueConstraint('city_id', 'ts', name='unique_city_timestamp'),
+    **({'postgresql_partition_by': 'RANGE (ts)'} if partitioned else {})
+    )
+    op.create_index('ix_weather_hourly_id', 'weather_hourly', ['id'], unique=False)
+    op.create_index('idx_weather_hourly_city_ts', 'weather_hourly', ['city_id', 'ts'], unique=False)
+    # La secuencia de ids pasa a la tabla nueva (si no, se borraría con la anterior)
+    op.execute("ALTER SEQUENCE weather_hourly_id_seq OWNED BY weather_hourly.id")
+
+
+def _next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql' or not settings.weather_hourly_partitioning or _is_partitioned(bind):
+        return
+
+    _rename_weather_hourly('unpartitioned')
+    _create_weather_hourly(partitioned=True)
+
+    # Un mes por partición desde la observación más antigua hasta los meses por adelantado
+    first, latest = bind.execute(sa.text("SELECT MIN(ts), MAX(ts) FROM weather_hourly_unpartitioned")).one()
+    today = datetime.now(timezone.utc).date()
+    month = (first.astimezone(timezone.utc).date() if first else today).replace(day=1)
+    last = today.replace(day=1)
+    for _ in range(settings.weather_hourly_partition_months_ahead):
+        last = _next_month(last)
+    if latest is not None:
+        last = max(last, latest.astimezone(timezone.utc).date().replace(day=1))
+    while month <= last:
+        following = _next_month(month)
+        op.execute(
+            f"CREATE TABLE weather_hourly_p{month:%Y_%m} PARTITION OF weather_hourly "
+            f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{following.isoformat()} 00:00:00+00')"
+        )
+        month = following
+
+    op.execute(f"INSERT INTO weather_hourly ({COLUMNS}) SELECT {COLUMNS} FROM weather_hourly_unpartitioned")
+    op.drop_table('weather_hourly_unpartitioned')
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql' or not _is_partitioned(bind):
+        return
+
+    # Las particiones ya desadjuntadas (archivo) no se recuperan
+    _rename_weather_hourly('partitioned')
+    _create_weather_hourly(partitioned=False)
+    op.execute(f"INSERT INTO weather_hourly ({COLUMNS}) SELECT {COLUMNS} FROM weather_hourly_partitioned")
+    op.drop_table('weather_hourly_partitioned')
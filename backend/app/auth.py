@@ -1,6 +1,8 @@
 """
 Sistema de autenticación JWT para WeatherHub
 """
+import hashlib
+import time
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
@@ -9,9 +11,11 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from app.config import settings
-from app.database import get_db
+from app.database import SessionLocal, get_db
 from app.models import User
 from app.schemas import TokenData
+from app.services.password_pool import password_pool
+from app.utils.ttl_cache import TTLCache
 
 # Configuración de encriptación
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -19,6 +23,17 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 # Configuración de JWT
 security = HTTPBearer()
 
+# Usuarios autenticados por sujeto del token (email), desacoplados de la sesión
+_user_cache = TTLCache(settings.auth_user_cache_max_entries, settings.auth_user_cache_ttl_seconds)
+
+# Tokens con firma ya verificada (hash SHA-256 -> sujeto) hasta su expiración
+_token_cache = TTLCache(settings.auth_token_cache_max_entries, settings.jwt_expire_minutes * 60)
+
+
+def invalidate_cached_user(email: str):
+    """Olvidar el usuario cacheado (cambio de contraseña, borrado o cambios de cuenta)"""
+    _user_cache.pop(email)
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verificar contraseña"""
@@ -30,6 +45,16 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verificar contraseña en el pool de bcrypt (no bloquea el event loop)"""
+    return await password_pool.run(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """Generar hash de contraseña en el pool de bcrypt (no bloquea el event loop)"""
+    return await password_pool.run(get_password_hash, password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Crear token JWT"""
     to_encode = data.copy()
@@ -45,6 +70,11 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 
 def verify_token(token: str, credentials_exception):
     """Verificar token JWT"""
+    token_key = hashlib.sha256(token.encode()).hexdigest()
+    email = _token_cache.get(token_key)
+    if email is not None:
+        return TokenData(email=email)
+    
     try:
         payload = jwt.decode(token, settings.jwt_secret_key, algorithms=[settings.jwt_algorithm])
         email: str = payload.get("sub")
@@ -53,6 +83,11 @@ def verify_token(token: str, credentials_exception):
         token_data = TokenData(email=email)
     except JWTError:
         raise credentials_exception
+    
+    # Recordar la verificación solo hasta la expiración del token
+    expires_in = payload.get("exp", 0) - time.time()
+    if expires_in > 0:
+        _token_cache.set(token_key, email, ttl=expires_in)
     return token_data
 
 
@@ -66,6 +101,16 @@ def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
     return user
 
 
+async def authenticate_user_async(db: Session, email: str, password: str) -> Optional[User]:
+    """Autenticar usuario verificando la contraseña en el pool de bcrypt"""
+    user = db.query(User).filter(User.email == email).first()
+    if not user:
+        return None
+    if not await verify_password_async(password, user.password_hash):
+        return None
+    return user
+
+
 def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
@@ -80,12 +125,36 @@ def get_current_user(
     token = credentials.credentials
     token_data = verify_token(token, credentials_exception)
     
+    user = _user_cache.get(token_data.email)
+    if user is not None:
+        return user
+    
     user = db.query(User).filter(User.email == token_data.email).first()
     if user is None:
         raise credentials_exception
+    
+    # Copia de solo lectura compartida entre peticiones: para modificar el usuario
+    # hay que cargarlo en la sesión de la petición e invalidar la caché
+    db.expunge(user)
+    _user_cache.set(token_data.email, user)
     return user
 
 
+def get_current_user_for_stream(
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+) -> User:
+    """Obtener usuario actual con una sesión propia que se cierra al resolverlo.
+
+    Para respuestas de larga duración (streaming): la sesión de get_db no se cierra
+    hasta que termina la respuesta y retendría una conexión del pool todo ese tiempo.
+    """
+    db = SessionLocal()
+    try:
+        return get_current_user(credentials, db)
+    finally:
+        db.close()
+
+
 def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
     """Obtener usuario activo actual"""
     # Aquí podrías agregar lógica adicional para verificar si el usuario está activo
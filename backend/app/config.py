@@ -15,6 +15,15 @@ class Settings(BaseSettings):
     
     # Base de datos - URL completa con credenciales
     database_url: str
+    # URL para el engine async (vacía = database_url con driver asyncpg / aiosqlite)
+    async_database_url: str = ""
+    # Pool de conexiones (por engine y proceso); espera máxima por conexión en segundos
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = 300
+    # Límite por sentencia del engine async en PostgreSQL (segundos)
+    db_statement_timeout: float = 30.0
     
     # PostgreSQL Admin Configuration (para scripts de setup)
     postgres_user: str
@@ -25,11 +34,21 @@ class Settings(BaseSettings):
     # OpenWeatherMap API - Credenciales
     openweather_api_key: str
     openweather_base_url: str = "https://api.openweathermap.org/data/2.5"
+    # Cuota por API key (plan gratuito: 60 llamadas/minuto)
+    openweather_calls_per_minute: int = 60
+    openweather_burst: int = 10
     
     # JWT - Clave secreta (generada automáticamente si no se proporciona)
     jwt_secret_key: str = ""
     jwt_algorithm: str = "HS256"
     jwt_expire_minutes: int = 30
+    # Caché de usuarios autenticados (por email del token) y de tokens ya verificados
+    auth_user_cache_ttl_seconds: int = 60
+    auth_user_cache_max_entries: int = 10000
+    auth_token_cache_max_entries: int = 10000
+    # bcrypt en hilos dedicados: tamaño del pool y operaciones pendientes antes de responder 429
+    password_hash_workers: int = 4
+    password_hash_max_pending: int = 64
     
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -57,10 +76,56 @@ class Settings(BaseSettings):
     etl_batch_size: int = 10
     etl_retry_attempts: int = 3
     etl_retry_delay: int = 5
+    etl_retry_max_delay: int = 60
+    # Extracción concurrente (peticiones HTTP en vuelo y timeout por ciudad en segundos)
+    etl_concurrency: int = 10
+    etl_request_timeout: float = 30.0
+    # Ciudades con openweather_id se piden en bloques al endpoint /group (máx. 20)
+    etl_use_group_endpoint: bool = True
+    etl_group_size: int = 20
     # ETL scheduler (desde .env)
     etl_enabled: bool = False
     etl_interval_minutes: int = 60
     
+    # Caché en proceso de la última observación por ciudad (weather_latest)
+    latest_cache_ttl_seconds: int = 300
+    latest_cache_max_entries: int = 10000
+    
+    # Con resolution=auto, /weather/history sirve desde weather_daily los rangos de más días que este umbral
+    history_daily_threshold_days: int = 30
+    
+    # Recarga periódica del índice de nombres de ciudad (0 = solo al crear ciudades)
+    city_resolver_refresh_seconds: int = 300
+    
+    # Recompilación periódica del índice de reglas de alerta (cambios hechos por otros procesos)
+    alert_rules_refresh_seconds: int = 300
+    
+    # Antirrebote de alertas (valores por defecto si la alerta no define los suyos):
+    # margen bajo/sobre el umbral para darla por despejada y minutos entre activaciones
+    alert_default_hysteresis: float = 0.0
+    alert_default_cooldown_minutes: int = 60
+    
+    # Stream de activaciones (/alerts/stream): eventos en cola por cliente (se descartan
+    # los más antiguos si no los lee), clientes por proceso y latido en segundos
+    alert_stream_queue_size: int = 100
+    alert_stream_max_subscribers: int = 10000
+    alert_stream_heartbeat_seconds: float = 15.0
+    
+    # Particionado mensual de weather_hourly (solo PostgreSQL; lo aplica la migración 005
+    # si está activado al migrar). Meses creados por adelantado y meses conservados por
+    # scripts/maintain_partitions.py (0 = sin caducidad)
+    weather_hourly_partitioning: bool = False
+    weather_hourly_partition_months_ahead: int = 3
+    weather_hourly_retention_months: int = 0
+    
+    # Exportaciones en segundo plano (/export/jobs)
+    export_job_workers: int = 2
+    export_job_max_per_user: int = 2
+    export_job_max_pending: int = 20
+    export_job_ttl_seconds: int = 3600
+    # Directorio de resultados (vacío = <tmp>/weatherhub-exports)
+    export_job_dir: str = ""
+    
     # Logging
     log_level: str = "INFO"
     log_format: str = "json"
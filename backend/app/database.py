@@ -2,21 +2,69 @@
 Configuración de la base de datos PostgreSQL
 """
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
 
+# Drivers async equivalentes a los de DATABASE_URL
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def async_database_url(url: str) -> str:
+    """URL con driver async (postgresql:// -> postgresql+asyncpg://, sqlite -> aiosqlite)"""
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        raise RuntimeError(f"No hay driver async configurado para '{parsed.drivername}': define ASYNC_DATABASE_URL")
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+def _pool_options(url: str) -> dict:
+    """Tamaño, desbordamiento y timeouts del pool (SQLite usa su pool por defecto)"""
+    options = {"pool_recycle": settings.db_pool_recycle}
+    if make_url(url).get_backend_name() != "sqlite":
+        options.update(
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout
+        )
+    return options
+
+
 # Crear engine de SQLAlchemy
 engine = create_engine(
     settings.database_url,
     pool_pre_ping=True,
-    pool_recycle=300,
-    echo=settings.debug
+    echo=settings.debug,
+    **_pool_options(settings.database_url)
 )
 
 # Crear sesión de base de datos
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Engine async para los routers de lectura (weather, cities, alerts)
+ASYNC_DATABASE_URL = settings.async_database_url or async_database_url(settings.database_url)
+_async_connect_args = {}
+if make_url(ASYNC_DATABASE_URL).get_backend_name() == "postgresql":
+    # Timeout por sentencia de asyncpg (segundos)
+    _async_connect_args["command_timeout"] = settings.db_statement_timeout
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_pre_ping=True,
+    echo=settings.debug,
+    connect_args=_async_connect_args,
+    **_pool_options(ASYNC_DATABASE_URL)
+)
+
+# expire_on_commit=False: los objetos siguen legibles tras commit sin E/S implícita
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 # Base para modelos
 Base = declarative_base()
 
@@ -28,3 +76,21 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """Dependency para obtener sesión async (no bloquea el event loop en la E/S)"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def dialect_insert(db):
+    """insert() con soporte ON CONFLICT del motor de la sesión (None si no lo hay)"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    return None
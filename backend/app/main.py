@@ -9,9 +9,15 @@ import asyncio
 from concurrent.futures import ThreadPoolExecutor
 from app.database import SessionLocal
 from app.services.etl_service import ETLService
+from app.services.latest_weather import backfill_weather_latest
+from app.services.daily_service import DailyWeatherService
+from app.services.weather_partitions import WeatherPartitionService
+from app.services.export_jobs import export_job_manager
+from app.services.password_pool import password_pool
+from app.services.alert_stream import alert_broadcaster
 import structlog
 from app.config import settings
-from app.database import engine, Base
+from app.database import engine, async_engine, Base
 from app.routers import auth, weather, cities, alerts, export, etl
 
 # Configurar logging estructurado
@@ -45,6 +51,36 @@ async def lifespan(app: FastAPI):
     # Crear tablas si no existen
     Base.metadata.create_all(bind=engine)
     logger.info("Base de datos inicializada")
+    
+    # Proyección weather_latest para bases creadas antes de existir la tabla
+    db = SessionLocal()
+    try:
+        backfill_weather_latest(db)
+    finally:
+        db.close()
+    
+    # Agregados diarios para bases con historial anterior a weather_daily
+    db = SessionLocal()
+    try:
+        days = DailyWeatherService(db).backfill_if_empty()
+        if days:
+            logger.info("weather_daily rellenada desde weather_hourly", days=days)
+    finally:
+        db.close()
+    
+    # Particiones de weather_hourly de los próximos meses (no-op sin particionado);
+    # la retirada de meses caducados queda para scripts/maintain_partitions.py
+    db = SessionLocal()
+    try:
+        WeatherPartitionService(db).ensure_upcoming()
+    except Exception as e:
+        logger.warning("No se pudieron crear las particiones de weather_hourly", error=str(e))
+    finally:
+        db.close()
+    
+    # Resultados de exportación caducados de ejecuciones anteriores
+    export_job_manager.cleanup_storage()
+    
     # Iniciar scheduler ETL si está habilitado
     stop_event = asyncio.Event()
     etl_task = None
@@ -67,8 +103,9 @@ async def lifespan(app: FastAPI):
                             finally:
                                 db.close()
                         loop = asyncio.get_running_loop()
-                        await loop.run_in_executor(executor, run_job)
-                        logger.info("ETL programado: fin")
+                        result = await loop.run_in_executor(executor, run_job)
+                        # El limitador por API key se comparte con /etl/run dentro del proceso
+                        logger.info("ETL programado: fin", quota_remaining=result.get("quota_remaining"))
                     except Exception as e:
                         logger.error("Error en ETL programado", error=str(e), exc_info=True)
                     # esperar intervalo o hasta stop
@@ -92,6 +129,11 @@ async def lifespan(app: FastAPI):
             await asyncio.wait([etl_task], timeout=5)
     except Exception:
         pass
+    # Cancelar exportaciones en cola y operaciones bcrypt pendientes
+    export_job_manager.shutdown()
+    password_pool.shutdown()
+    # Cerrar conexiones del pool async
+    await async_engine.dispose()
 
 
 # Crear aplicación FastAPI
@@ -161,7 +203,9 @@ async def health_check():
     return {
         "status": "healthy",
         "service": "weatherhub-api",
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "password_pool": password_pool.snapshot(),
+        "alert_stream": alert_broadcaster.snapshot()
     }
 
 
@@ -176,7 +220,8 @@ async def http_exception_handler(request, exc):
     
     return JSONResponse(
         status_code=exc.status_code,
-        content={"detail": exc.detail, "success": False}
+        content={"detail": exc.detail, "success": False},
+        headers=getattr(exc, "headers", None)
     )
 
 
@@ -105,6 +105,7 @@ class WeatherHourly(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Constraint único para ciudad y timestamp
+    # (en PostgreSQL con particionado mensual la clave primaria real es (id, ts); ver migración 005)
     __table_args__ = (
         UniqueConstraint('city_id', 'ts', name='unique_city_timestamp'),
         Index('idx_weather_hourly_city_ts', 'city_id', 'ts'),
@@ -115,6 +116,32 @@ class WeatherHourly(Base):
     raw_data = relationship("WeatherRaw", back_populates="weather_hourly")
 
 
+class WeatherLatest(Base):
+    """Proyección con la última observación de cada ciudad (la mantiene el ETL)"""
+    __tablename__ = "weather_latest"
+    
+    city_id = Column(Integer, ForeignKey("cities.id", ondelete="CASCADE"), primary_key=True)
+    ts = Column(DateTime(timezone=True), nullable=False)
+    
+    # Mismas columnas que weather_hourly
+    temp_c = Column(Float)
+    feels_like_c = Column(Float)
+    humidity = Column(Integer)
+    pressure = Column(Integer)
+    wind_speed = Column(Float)
+    wind_deg = Column(Integer)
+    clouds = Column(Integer)
+    visibility = Column(Integer)
+    weather_main = Column(String(255))
+    weather_description = Column(String(255))
+    
+    raw_id = Column(Integer, ForeignKey("weather_raw.id"))
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # Relaciones
+    city = relationship("City")
+
+
 class WeatherDaily(Base):
     """Modelo de agregados diarios"""
     __tablename__ = "weather_daily"
@@ -159,12 +186,25 @@ class Alert(Base):
     active = Column(Boolean, default=True)
     paused = Column(Boolean, default=False)
     
+    # Antirrebote: margen para despejar y mínimo entre activaciones (null = valores por defecto)
+    hysteresis = Column(Float)
+    cooldown_minutes = Column(Integer)
+    
+    # Máquina de estados armed -> firing -> cleared; solo la transición a firing va a alert_history
+    state = Column(String(10), nullable=False, default="armed", server_default="armed")
+    state_changed_at = Column(DateTime(timezone=True))
+    last_fired_at = Column(DateTime(timezone=True))
+    
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
-    # Constraint único para evitar duplicados
+    # Constraint único para evitar duplicados (sirve también para listar por usuario)
+    # e índice parcial por ciudad de las alertas evaluables (estado de la evaluación del ETL)
     __table_args__ = (
         UniqueConstraint('user_id', 'city_id', 'metric', 'operator', 'threshold', 
                         name='unique_user_city_metric_alert'),
+        Index('idx_alerts_city_evaluable', 'city_id', 'state',
+              postgresql_where=(active == True) & (paused == False),
+              sqlite_where=(active == True) & (paused == False)),
     )
     
     # Relaciones
@@ -190,9 +230,12 @@ class AlertHistory(Base):
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
-    # Índice para consultas por timestamp
+    # Índices: por timestamp, por usuario en orden descendente (historial, activas y
+    # exportación) y por ciudad y timestamp (exportación por ciudad y borrado en cascada)
     __table_args__ = (
         Index('idx_alert_history_ts', 'ts'),
+        Index('idx_alert_history_user_ts', 'user_id', ts.desc()),
+        Index('idx_alert_history_city_ts', 'city_id', 'ts'),
     )
     
     # Relaciones
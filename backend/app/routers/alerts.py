@@ -1,51 +1,65 @@
 """
 Router de alertas meteorológicas
 """
+import json
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from typing import List, Optional
-from datetime import datetime, timedelta
-from app.database import get_db
+from datetime import datetime, timedelta, timezone
+from app.database import get_async_db
 from app.models import Alert, AlertHistory, City
 from app.schemas import (
     AlertCreate, 
     AlertUpdate, 
     AlertResponse, 
     AlertHistoryResponse,
+    AlertState,
     MessageResponse
 )
-from app.auth import get_current_active_user
+from app.auth import get_current_active_user, get_current_user_for_stream
+from app.config import settings
+from app.services.alert_rules import alert_rule_engine
+from app.services.alert_stream import AlertStreamFullError, alert_broadcaster
 
 router = APIRouter()
 
 
+def _user_alerts(user_id: int):
+    """Alertas del usuario con la ciudad precargada (la sesión async no carga relaciones perezosamente)"""
+    return select(Alert).options(selectinload(Alert.city)).where(Alert.user_id == user_id)
+
+
 @router.get("/", response_model=List[AlertResponse])
 async def get_user_alerts(
     active_only: bool = Query(True, description="Solo alertas activas"),
     current_user = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obtener alertas del usuario"""
     
-    query = db.query(Alert).filter(Alert.user_id == current_user.id)
+    stmt = _user_alerts(current_user.id)
     
     if active_only:
-        query = query.filter(Alert.active == True, Alert.paused == False)
+        stmt = stmt.where(Alert.active == True, Alert.paused == False)
     
-    alerts = query.all()
-    return alerts
+    alerts = await db.scalars(stmt)
+    return alerts.all()
 
 
 @router.post("/", response_model=AlertResponse, status_code=status.HTTP_201_CREATED)
 async def create_alert(
     alert_data: AlertCreate,
     current_user = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Crear nueva alerta"""
     
     # Verificar que la ciudad existe
-    city = db.query(City).filter(City.id == alert_data.city_id).first()
+    city = await db.get(City, alert_data.city_id)
     if not city:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -53,13 +67,13 @@ async def create_alert(
         )
     
     # Verificar si ya existe una alerta similar
-    existing_alert = db.query(Alert).filter(
+    existing_alert = await db.scalar(select(Alert).where(
         Alert.user_id == current_user.id,
         Alert.city_id == alert_data.city_id,
         Alert.metric == alert_data.metric,
         Alert.operator == alert_data.operator,
         Alert.threshold == alert_data.threshold
-    ).first()
+    ).limit(1))
     
     if existing_alert:
         raise HTTPException(
@@ -73,28 +87,69 @@ async def create_alert(
         metric=alert_data.metric,
         operator=alert_data.operator,
         threshold=alert_data.threshold,
-        unit=alert_data.unit
+        unit=alert_data.unit,
+        hysteresis=alert_data.hysteresis,
+        cooldown_minutes=alert_data.cooldown_minutes,
+        city=city
     )
     
     db.add(db_alert)
-    db.commit()
-    db.refresh(db_alert)
+    await db.commit()
+    # Solo la columna con valor por defecto del servidor; la ciudad ya está asignada
+    await db.refresh(db_alert, ["created_at"])
+    alert_rule_engine.invalidate()
     
     return db_alert
 
 
+@router.get("/stream")
+async def stream_alerts(current_user = Depends(get_current_user_for_stream)):
+    """Activaciones de alertas del usuario en tiempo real (Server-Sent Events).
+
+    Eventos `alert` con la fila de historial (el id es el de alert_history), un
+    comentario de latido periódico y un evento `overflow` si el cliente no lee a
+    tiempo y se descartaron activaciones (recuperarlas con /alerts/history/).
+    """
+    
+    try:
+        subscription = alert_broadcaster.subscribe(current_user.id)
+    except AlertStreamFullError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "30"}
+        )
+    
+    async def events():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                frames = await subscription.next_frames(settings.alert_stream_heartbeat_seconds)
+                dropped = subscription.take_dropped()
+                if dropped:
+                    yield f"event: overflow\ndata: {json.dumps({'dropped': dropped})}\n\n"
+                yield "".join(frames) if frames else ": keepalive\n\n"
+        finally:
+            alert_broadcaster.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # También si la conexión se cierra antes de empezar a iterar el generador
+        background=BackgroundTask(alert_broadcaster.unsubscribe, subscription)
+    )
+
+
 @router.get("/{alert_id}", response_model=AlertResponse)
 async def get_alert(
     alert_id: int,
     current_user = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obtener alerta específica"""
     
-    alert = db.query(Alert).filter(
-        Alert.id == alert_id,
-        Alert.user_id == current_user.id
-    ).first()
+    alert = await db.scalar(_user_alerts(current_user.id).where(Alert.id == alert_id))
     
     if not alert:
         raise HTTPException(
@@ -110,14 +165,11 @@ async def update_alert(
     alert_id: int,
     alert_update: AlertUpdate,
     current_user = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Actualizar alerta"""
     
-    alert = db.query(Alert).filter(
-        Alert.id == alert_id,
-        Alert.user_id == current_user.id
-    ).first()
+    alert = await db.scalar(_user_alerts(current_user.id).where(Alert.id == alert_id))
     
     if not alert:
         raise HTTPException(
@@ -132,9 +184,18 @@ async def update_alert(
         alert.paused = alert_update.paused
     if alert_update.threshold is not None:
         alert.threshold = alert_update.threshold
+    if alert_update.hysteresis is not None:
+        alert.hysteresis = alert_update.hysteresis
+    if alert_update.cooldown_minutes is not None:
+        alert.cooldown_minutes = alert_update.cooldown_minutes
+    
+    # Una condición distinta vuelve a evaluarse desde cero (el cooldown se mantiene)
+    if alert_update.threshold is not None or alert_update.hysteresis is not None:
+        alert.state = AlertState.ARMED.value
+        alert.state_changed_at = datetime.now(timezone.utc)
     
-    db.commit()
-    db.refresh(alert)
+    await db.commit()
+    alert_rule_engine.invalidate()
     
     return alert
 
@@ -143,14 +204,11 @@ async def update_alert(
 async def delete_alert(
     alert_id: int,
     current_user = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Eliminar alerta"""
     
-    alert = db.query(Alert).filter(
-        Alert.id == alert_id,
-        Alert.user_id == current_user.id
-    ).first()
+    alert = await db.scalar(_user_alerts(current_user.id).where(Alert.id == alert_id))
     
     if not alert:
         raise HTTPException(
@@ -158,8 +216,9 @@ async def delete_alert(
             detail="Alerta no encontrada"
         )
     
-    db.delete(alert)
-    db.commit()
+    await db.delete(alert)
+    await db.commit()
+    alert_rule_engine.invalidate()
     
     return {"message": "Alerta eliminada exitosamente"}
 
@@ -172,40 +231,37 @@ async def get_alert_history(
     metric: Optional[str] = Query(None, description="Tipo de métrica"),
     limit: int = Query(100, ge=1, le=1000, description="Límite de registros"),
     current_user = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obtener historial de activaciones de alertas"""
     
-    from sqlalchemy.orm import selectinload
-    
-    query = db.query(AlertHistory).options(selectinload(AlertHistory.city)).filter(AlertHistory.user_id == current_user.id)
+    stmt = select(AlertHistory).options(selectinload(AlertHistory.city)).where(AlertHistory.user_id == current_user.id)
     
     if from_date:
-        query = query.filter(AlertHistory.ts >= from_date)
+        stmt = stmt.where(AlertHistory.ts >= from_date)
     if to_date:
-        query = query.filter(AlertHistory.ts <= to_date)
+        stmt = stmt.where(AlertHistory.ts <= to_date)
     if city_id:
-        query = query.filter(AlertHistory.city_id == city_id)
+        stmt = stmt.where(AlertHistory.city_id == city_id)
     if metric:
-        query = query.filter(AlertHistory.metric == metric)
+        stmt = stmt.where(AlertHistory.metric == metric)
     
-    history = query.order_by(AlertHistory.ts.desc()).limit(limit).all()
-    return history
+    history = await db.scalars(stmt.order_by(AlertHistory.ts.desc()).limit(limit))
+    return history.all()
 
 
 @router.get("/active/", response_model=List[AlertHistoryResponse])
 async def get_active_alerts(
     current_user = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obtener alertas activas recientes (últimas 24 horas)"""
-    from sqlalchemy.orm import selectinload
     
     from_date = datetime.utcnow() - timedelta(hours=24)
     
-    history = db.query(AlertHistory).options(selectinload(AlertHistory.city)).filter(
+    history = await db.scalars(select(AlertHistory).options(selectinload(AlertHistory.city)).where(
         AlertHistory.user_id == current_user.id,
         AlertHistory.ts >= from_date
-    ).order_by(AlertHistory.ts.desc()).all()
+    ).order_by(AlertHistory.ts.desc()))
     
-    return history
+    return history.all()
@@ -8,16 +8,27 @@ from app.database import get_db
 from app.models import User
 from app.schemas import UserCreate, UserLogin, UserResponse, Token, MessageResponse, PasswordChange
 from app.auth import (
-    authenticate_user, 
+    authenticate_user_async, 
     create_access_token, 
-    get_password_hash,
-    get_current_active_user
+    get_password_hash_async,
+    get_current_active_user,
+    invalidate_cached_user
 )
 from app.config import settings
+from app.services.password_pool import PasswordPoolBusyError
 
 router = APIRouter()
 
 
+def _busy_exception(error: PasswordPoolBusyError) -> HTTPException:
+    """429 cuando la cola de bcrypt está llena (descarta carga en ráfagas de login)"""
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=str(error),
+        headers={"Retry-After": "1"}
+    )
+
+
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def register(user_data: UserCreate, db: Session = Depends(get_db)):
     """Registrar nuevo usuario"""
@@ -31,7 +42,10 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
         )
     
     # Crear nuevo usuario
-    hashed_password = get_password_hash(user_data.password)
+    try:
+        hashed_password = await get_password_hash_async(user_data.password)
+    except PasswordPoolBusyError as e:
+        raise _busy_exception(e)
     db_user = User(
         email=user_data.email,
         password_hash=hashed_password,
@@ -49,7 +63,10 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
 async def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
     """Iniciar sesión"""
     
-    user = authenticate_user(db, user_credentials.email, user_credentials.password)
+    try:
+        user = await authenticate_user_async(db, user_credentials.email, user_credentials.password)
+    except PasswordPoolBusyError as e:
+        raise _busy_exception(e)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -86,7 +103,11 @@ async def change_password(
     """Cambiar contraseña del usuario actual"""
     
     # Verificar que la contraseña actual sea correcta
-    if not authenticate_user(db, current_user.email, password_data.current_password):
+    try:
+        authenticated = await authenticate_user_async(db, current_user.email, password_data.current_password)
+    except PasswordPoolBusyError as e:
+        raise _busy_exception(e)
+    if not authenticated:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="La contraseña actual es incorrecta"
@@ -99,9 +120,14 @@ async def change_password(
             detail="La nueva contraseña debe ser diferente a la actual"
         )
     
-    # Actualizar la contraseña
-    new_password_hash = get_password_hash(password_data.new_password)
-    current_user.password_hash = new_password_hash
+    # Actualizar la contraseña (current_user es la copia cacheada, fuera de la sesión)
+    try:
+        new_password_hash = await get_password_hash_async(password_data.new_password)
+    except PasswordPoolBusyError as e:
+        raise _busy_exception(e)
+    user = db.get(User, current_user.id)
+    user.password_hash = new_password_hash
     db.commit()
+    invalidate_cached_user(current_user.email)
     
     return {"message": "Contraseña cambiada exitosamente"}
@@ -2,12 +2,15 @@
 Router de ciudades
 """
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from typing import List, Optional
-from app.database import get_db
+from app.database import get_async_db
 from app.models import City, Favorite
 from app.schemas import CityCreate, CityResponse, FavoriteCreate, FavoriteResponse, MessageResponse
 from app.auth import get_current_active_user
+from app.services.city_resolver import city_resolver
 
 router = APIRouter()
 
@@ -17,27 +20,27 @@ async def get_cities(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     search: Optional[str] = Query(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obtener lista de ciudades con paginación y búsqueda"""
     
-    query = db.query(City)
+    stmt = select(City)
     
     if search:
-        query = query.filter(
+        stmt = stmt.where(
             City.name.ilike(f"%{search}%") | 
             City.country.ilike(f"%{search}%")
         )
     
-    cities = query.offset(skip).limit(limit).all()
-    return cities
+    cities = await db.scalars(stmt.offset(skip).limit(limit))
+    return cities.all()
 
 
 @router.get("/{city_id}", response_model=CityResponse)
-async def get_city(city_id: int, db: Session = Depends(get_db)):
+async def get_city(city_id: int, db: AsyncSession = Depends(get_async_db)):
     """Obtener ciudad por ID"""
     
-    city = db.query(City).filter(City.id == city_id).first()
+    city = await db.get(City, city_id)
     if not city:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -50,16 +53,16 @@ async def get_city(city_id: int, db: Session = Depends(get_db)):
 @router.post("/", response_model=CityResponse, status_code=status.HTTP_201_CREATED)
 async def create_city(
     city_data: CityCreate, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(get_current_active_user)
 ):
     """Crear nueva ciudad (requiere autenticación)"""
     
     # Verificar si la ciudad ya existe
-    existing_city = db.query(City).filter(
+    existing_city = await db.scalar(select(City).where(
         City.name == city_data.name,
         City.country == city_data.country
-    ).first()
+    ).limit(1))
     
     if existing_city:
         raise HTTPException(
@@ -69,8 +72,11 @@ async def create_city(
     
     db_city = City(**city_data.dict())
     db.add(db_city)
-    db.commit()
-    db.refresh(db_city)
+    await db.commit()
+    await db.refresh(db_city)
+    
+    # Hacer resoluble la nueva ciudad por nombre sin esperar a la recarga periódica
+    city_resolver.add(db_city)
     
     return db_city
 
@@ -78,24 +84,27 @@ async def create_city(
 @router.get("/favorites/", response_model=List[FavoriteResponse])
 async def get_user_favorites(
     current_user = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obtener ciudades favoritas del usuario"""
     
-    favorites = db.query(Favorite).filter(Favorite.user_id == current_user.id).all()
-    return favorites
+    # Ciudad precargada: en una sesión async no hay carga perezosa de relaciones
+    favorites = await db.scalars(
+        select(Favorite).options(selectinload(Favorite.city)).where(Favorite.user_id == current_user.id)
+    )
+    return favorites.all()
 
 
 @router.post("/favorites/", response_model=FavoriteResponse, status_code=status.HTTP_201_CREATED)
 async def add_favorite(
     favorite_data: FavoriteCreate,
     current_user = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Añadir ciudad a favoritos"""
     
     # Verificar que la ciudad existe
-    city = db.query(City).filter(City.id == favorite_data.city_id).first()
+    city = await db.get(City, favorite_data.city_id)
     if not city:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -103,10 +112,10 @@ async def add_favorite(
         )
     
     # Verificar si ya es favorita
-    existing_favorite = db.query(Favorite).filter(
+    existing_favorite = await db.scalar(select(Favorite).where(
         Favorite.user_id == current_user.id,
         Favorite.city_id == favorite_data.city_id
-    ).first()
+    ).limit(1))
     
     if existing_favorite:
         raise HTTPException(
@@ -116,12 +125,14 @@ async def add_favorite(
     
     db_favorite = Favorite(
         user_id=current_user.id,
-        city_id=favorite_data.city_id
+        city_id=favorite_data.city_id,
+        city=city
     )
     
     db.add(db_favorite)
-    db.commit()
-    db.refresh(db_favorite)
+    await db.commit()
+    # Solo la columna con valor por defecto del servidor; la ciudad ya está asignada
+    await db.refresh(db_favorite, ["created_at"])
     
     return db_favorite
 
@@ -130,14 +141,14 @@ async def add_favorite(
 async def remove_favorite(
     city_id: int,
     current_user = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Eliminar ciudad de favoritos"""
     
-    favorite = db.query(Favorite).filter(
+    favorite = await db.scalar(select(Favorite).where(
         Favorite.user_id == current_user.id,
         Favorite.city_id == city_id
-    ).first()
+    ).limit(1))
     
     if not favorite:
         raise HTTPException(
@@ -145,7 +156,7 @@ async def remove_favorite(
             detail="La ciudad no está en favoritos"
         )
     
-    db.delete(favorite)
-    db.commit()
+    await db.delete(favorite)
+    await db.commit()
     
     return {"message": "Ciudad eliminada de favoritos"}
@@ -93,7 +93,8 @@ async def get_etl_status(
             status="success",
             message="Estado del ETL obtenido exitosamente",
             processed_cities=status_info.get("total_cities", 0),
-            errors=status_info.get("recent_errors", [])
+            errors=status_info.get("recent_errors", []),
+            quota=status_info.get("quota")
         )
     except Exception as e:
         return ETLStatusResponse(
@@ -1,22 +1,67 @@
 """
 Router de exportación de datos
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response, Header
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Iterator, List, Optional, Tuple
 from datetime import datetime, timedelta
 import csv
 import io
+import os
 from app.database import get_db
 from app.models import WeatherHourly, AlertHistory, City
-from app.schemas import ExportRequest, ExportResponse, TemperatureUnit
+from app.schemas import (
+    ExportFormat,
+    ExportJobResponse,
+    ExportJobStatus,
+    ExportRequest,
+    ExportResponse,
+    TemperatureUnit
+)
 from app.auth import get_current_active_user
 from app.services.weather_service import WeatherService
+from app.services.city_resolver import city_resolver
+from app.services.aggregate_service import AggregateService
+from app.services.export_service import build_custom_export, has_rows, load_city_map, stream_csv, stream_rows
+from app.services.columnar_export import FILE_EXTENSIONS, MEDIA_TYPES, columnar_available, stream_columnar
+from app.services.export_jobs import ExportJob, ExportJobLimitError, export_job_manager
 
 router = APIRouter()
 
 
-@router.get("/history", response_class=Response)
+def _csv_response(chunks: Iterator[str], filename: str) -> StreamingResponse:
+    """Respuesta CSV enviada por bloques a medida que se generan"""
+
+    return StreamingResponse(
+        chunks,
+        media_type="text/csv",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+
+def _export_response(export_format: ExportFormat, columns, produce_rows, filename: str) -> StreamingResponse:
+    """Misma secuencia de filas servida como CSV, Parquet o Arrow IPC"""
+
+    if export_format == ExportFormat.CSV:
+        return _csv_response(stream_csv([name for name, _ in columns], produce_rows), filename)
+
+    if not columnar_available():
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail=f"Formato '{export_format.value}' no disponible en este servidor"
+        )
+
+    return StreamingResponse(
+        stream_columnar(export_format, columns, produce_rows),
+        media_type=MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+
+@router.get("/history", response_class=StreamingResponse)
 async def export_weather_history(
     city: Optional[str] = Query(None, description="Nombre de la ciudad (para vista Historial)"),
     city_ids: Optional[str] = Query(None, description="IDs de ciudades separados por coma (modo múltiple)"),
@@ -27,10 +72,11 @@ async def export_weather_history(
     days: Optional[int] = Query(7, ge=1, le=365, description="Número de días hacia atrás"),
     unit: TemperatureUnit = Query(TemperatureUnit.CELSIUS, description="Unidad de temperatura"),
     filename: Optional[str] = Query(None, description="Nombre de archivo deseado"),
+    format: ExportFormat = Query(ExportFormat.CSV, description="Formato: csv, parquet o arrow"),
     current_user = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """Exportar historial a CSV.
+    """Exportar historial a CSV (o Parquet / Arrow IPC con `format`).
     - Si se indica `city`, genera CSV tipo Historial (una ciudad) con columnas por métricas.
     - Si se indican `city_ids`, exporta en formato tabular amplio por registro.
     """
@@ -41,13 +87,11 @@ async def export_weather_history(
         to_date = to_date or datetime.utcnow()
         from_date = from_date or (to_date - timedelta(days=days or 7))
 
-    output = io.StringIO()
-    writer = csv.writer(output)
     weather_service = WeatherService()
 
     if city:
         # Vista Historial (una ciudad, columnas por métricas, encabezado 'Fecha')
-        city_obj = db.query(City).filter(City.name.ilike(f"%{city}%")).first()
+        city_obj = city_resolver.resolve(db, city)
         if not city_obj:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ciudad no encontrada")
 
@@ -64,41 +108,41 @@ async def export_weather_history(
                 headers.append("Viento (m/s)")
             else:
                 headers.append(m)
-        writer.writerow(headers)
-
-        rows = db.query(WeatherHourly).filter(
+        columns = [(headers[0], "timestamp")] + [(header, "float") for header in headers[1:]]
+
+        stmt = select(
+            WeatherHourly.ts,
+            WeatherHourly.temp_c,
+            WeatherHourly.humidity,
+            WeatherHourly.pressure,
+            WeatherHourly.wind_speed
+        ).where(
             WeatherHourly.city_id == city_obj.id,
             WeatherHourly.ts >= from_date,
             WeatherHourly.ts <= to_date
-        ).order_by(WeatherHourly.ts.asc()).all()
-
-        for r in rows:
-            values = []
-            for m in metric_list:
-                if m == "temperature":
-                    values.append(weather_service.convert_temperature(r.temp_c, unit))
-                elif m == "humidity":
-                    values.append(r.humidity)
-                elif m == "pressure":
-                    values.append(r.pressure)
-                elif m == "wind":
-                    values.append(r.wind_speed)
-                else:
-                    values.append("")
-            writer.writerow([r.ts.isoformat(), *values])
-
-        csv_content = output.getvalue()
-        output.close()
+        ).order_by(WeatherHourly.ts.asc())
+
+        def produce_rows(stream_db: Session):
+            for r in stream_rows(stream_db, stmt):
+                values = []
+                for m in metric_list:
+                    if m == "temperature":
+                        values.append(weather_service.convert_temperature(r.temp_c, unit))
+                    elif m == "humidity":
+                        values.append(r.humidity)
+                    elif m == "pressure":
+                        values.append(r.pressure)
+                    elif m == "wind":
+                        values.append(r.wind_speed)
+                    else:
+                        values.append(None)
+                yield [r.ts, *values]
 
         if not filename:
             metric_slug = "-".join(metric_list)
-            filename = f"history_{city_obj.name}_{from_date.strftime('%Y-%m-%d')}_{to_date.strftime('%Y-%m-%d')}.csv"
+            filename = f"history_{city_obj.name}_{from_date.strftime('%Y-%m-%d')}_{to_date.strftime('%Y-%m-%d')}.{FILE_EXTENSIONS[format]}"
 
-        return Response(
-            content=csv_content,
-            media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
+        return _export_response(format, columns, produce_rows, filename)
     else:
         # Modo múltiple por IDs de ciudades (formato amplio por registro)
         if city_ids:
@@ -107,57 +151,63 @@ async def export_weather_history(
             cities = db.query(City).all()
             city_id_list = [city.id for city in cities]
 
-        rows = db.query(WeatherHourly).filter(
+        stmt = select(
+            WeatherHourly.city_id,
+            City.name.label("city_name"),
+            City.country,
+            WeatherHourly.ts,
+            WeatherHourly.temp_c,
+            WeatherHourly.feels_like_c,
+            WeatherHourly.humidity,
+            WeatherHourly.pressure,
+            WeatherHourly.wind_speed,
+            WeatherHourly.wind_deg,
+            WeatherHourly.clouds,
+            WeatherHourly.visibility,
+            WeatherHourly.weather_main,
+            WeatherHourly.weather_description
+        ).join(City, City.id == WeatherHourly.city_id).where(
             WeatherHourly.city_id.in_(city_id_list),
             WeatherHourly.ts >= from_date,
             WeatherHourly.ts <= to_date
-        ).order_by(WeatherHourly.city_id, WeatherHourly.ts.asc()).all()
+        ).order_by(WeatherHourly.city_id, WeatherHourly.ts.asc())
 
-        if not rows:
+        if not has_rows(db, stmt):
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No hay datos disponibles para exportar")
 
-        headers = [
-            "city_id", "city_name", "country", "timestamp",
-            f"temperature_{unit.value}", f"feels_like_{unit.value}",
-            "humidity", "pressure", "wind_speed", "wind_deg",
-            "clouds", "visibility", "weather_main", "weather_description"
+        columns = [
+            ("city_id", "int"), ("city_name", "category"), ("country", "category"), ("timestamp", "timestamp"),
+            (f"temperature_{unit.value}", "float"), (f"feels_like_{unit.value}", "float"),
+            ("humidity", "int"), ("pressure", "int"), ("wind_speed", "float"), ("wind_deg", "int"),
+            ("clouds", "int"), ("visibility", "int"), ("weather_main", "category"), ("weather_description", "category")
         ]
-        writer.writerow(headers)
-
-        for data in rows:
-            temp = weather_service.convert_temperature(data.temp_c, unit)
-            feels_like = weather_service.convert_temperature(data.feels_like_c, unit)
-            writer.writerow([
-                data.city_id,
-                data.city.name,
-                data.city.country,
-                data.ts.isoformat(),
-                temp,
-                feels_like,
-                data.humidity,
-                data.pressure,
-                data.wind_speed,
-                data.wind_deg,
-                data.clouds,
-                data.visibility,
-                data.weather_main,
-                data.weather_description,
-            ])
-
-        csv_content = output.getvalue()
-        output.close()
+
+        def produce_rows(stream_db: Session):
+            for data in stream_rows(stream_db, stmt):
+                yield [
+                    data.city_id,
+                    data.city_name,
+                    data.country,
+                    data.ts,
+                    weather_service.convert_temperature(data.temp_c, unit),
+                    weather_service.convert_temperature(data.feels_like_c, unit),
+                    data.humidity,
+                    data.pressure,
+                    data.wind_speed,
+                    data.wind_deg,
+                    data.clouds,
+                    data.visibility,
+                    data.weather_main,
+                    data.weather_description,
+                ]
 
         if not filename:
-            filename = f"weather_history_{from_date.strftime('%Y%m%d')}_{to_date.strftime('%Y%m%d')}.csv"
+            filename = f"weather_history_{from_date.strftime('%Y%m%d')}_{to_date.strftime('%Y%m%d')}.{FILE_EXTENSIONS[format]}"
 
-        return Response(
-            content=csv_content,
-            media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
+        return _export_response(format, columns, produce_rows, filename)
 
 
-@router.get("/compare", response_class=Response)
+@router.get("/compare", response_class=StreamingResponse)
 async def export_compare(
     cities: str = Query(..., description="Nombres de ciudades separados por coma"),
     metrics: Optional[str] = Query(None, description="Métricas separadas por coma (temperature,humidity,pressure,wind)"),
@@ -179,10 +229,10 @@ async def export_compare(
         to_date = to_date or datetime.utcnow()
         from_date = from_date or (to_date - timedelta(days=days or 7))
 
-    # Resolver IDs de ciudades por nombre (ilike)
+    # Resolver ciudades por nombre (índice en memoria)
     city_objs: List[City] = []
     for name in city_names:
-        city = db.query(City).filter(City.name.ilike(f"%{name}%")).first()
+        city = city_resolver.resolve(db, name)
         if city:
             city_objs.append(city)
 
@@ -191,10 +241,6 @@ async def export_compare(
 
     weather_service = WeatherService()
 
-    # CSV en memoria
-    output = io.StringIO()
-    writer = csv.writer(output)
-
     # Encabezados: Ciudad, Fecha, columnas por cada métrica seleccionada
     headers = ["Ciudad", "Fecha"]
     for m in metric_list:
@@ -208,47 +254,49 @@ async def export_compare(
             headers.append("Viento (m/s)")
         else:
             headers.append(m)
-    writer.writerow(headers)
 
-    # Para cada ciudad, obtener datos y escribir filas
+    # Datos de cada ciudad leídos por lotes (los nombres se copian antes de cerrar la sesión del endpoint)
+    city_streams = []
     for city in city_objs:
-        q = db.query(WeatherHourly).filter(
+        stmt = select(
+            WeatherHourly.ts,
+            WeatherHourly.temp_c,
+            WeatherHourly.humidity,
+            WeatherHourly.pressure,
+            WeatherHourly.wind_speed
+        ).where(
             WeatherHourly.city_id == city.id,
             WeatherHourly.ts >= from_date,
             WeatherHourly.ts <= to_date,
         ).order_by(WeatherHourly.ts.asc())
         if limit:
-            q = q.limit(limit)
-        rows = q.all()
-        for row in rows:
-            # Convertir temperatura si corresponde
-            values = []
-            for m in metric_list:
-                if m == "temperature":
-                    values.append(weather_service.convert_temperature(row.temp_c, unit))
-                elif m == "humidity":
-                    values.append(row.humidity)
-                elif m == "pressure":
-                    values.append(row.pressure)
-                elif m == "wind":
-                    values.append(row.wind_speed)
-                else:
-                    values.append("")
-            writer.writerow([city.name, row.ts.isoformat(), *values])
-
-    csv_content = output.getvalue()
-    output.close()
+            stmt = stmt.limit(limit)
+        city_streams.append((city.name, stmt))
+
+    def produce_rows(stream_db: Session):
+        for city_name, stmt in city_streams:
+            for row in stream_rows(stream_db, stmt):
+                # Convertir temperatura si corresponde
+                values = []
+                for m in metric_list:
+                    if m == "temperature":
+                        values.append(weather_service.convert_temperature(row.temp_c, unit))
+                    elif m == "humidity":
+                        values.append(row.humidity)
+                    elif m == "pressure":
+                        values.append(row.pressure)
+                    elif m == "wind":
+                        values.append(row.wind_speed)
+                    else:
+                        values.append("")
+                yield [city_name, row.ts.isoformat(), *values]
 
     if not filename:
         city_slug = "-".join([c.name for c in city_objs])
         metric_slug = "-".join(metric_list)
         filename = f"compare_{metric_slug}_{city_slug}_{from_date.strftime('%Y-%m-%d')}_{to_date.strftime('%Y-%m-%d')}.csv"
 
-    return Response(
-        content=csv_content,
-        media_type="text/csv",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
-    )
+    return _csv_response(stream_csv(headers, produce_rows), filename)
 
 
 @router.get("/compare-summary", response_class=Response)
@@ -259,14 +307,34 @@ async def export_compare_summary(
     to_date: Optional[datetime] = Query(None, description="Fecha de fin"),
     days: Optional[int] = Query(7, ge=1, le=365, description="Número de días hacia atrás"),
     unit: TemperatureUnit = Query(TemperatureUnit.CELSIUS, description="Unidad de temperatura"),
+    percentiles: Optional[str] = Query(None, description="Percentiles separados por coma (p. ej. 50,90,99)"),
     filename: Optional[str] = Query(None, description="Nombre de archivo deseado"),
     current_user = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """Exportar resumen por ciudad (promedios por métrica) a CSV."""
+    """Exportar resumen por ciudad (promedio, mín, máx, desviación, registros y percentiles por métrica) a CSV."""
     city_names = [c.strip() for c in cities.split(",") if c.strip()]
     metric_list = [m.strip() for m in metrics.split(",") if m.strip()]
 
+    percentile_list: List[float] = []
+    for token in (percentiles or "").split(","):
+        token = token.strip()
+        if not token:
+            continue
+        try:
+            percentile = float(token)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Percentil '{token}' no válido. Debe ser un número entre 0 y 100"
+            )
+        if not 0 < percentile < 100:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Percentil '{token}' fuera de rango. Debe estar entre 0 y 100"
+            )
+        percentile_list.append(percentile)
+
     if not from_date or not to_date:
         to_date = to_date or datetime.utcnow()
         from_date = from_date or (to_date - timedelta(days=days or 7))
@@ -274,63 +342,56 @@ async def export_compare_summary(
     # Resolver ciudades
     city_objs: List[City] = []
     for name in city_names:
-        city = db.query(City).filter(City.name.ilike(f"%{name}%")).first()
+        city = city_resolver.resolve(db, name)
         if city:
             city_objs.append(city)
     if not city_objs:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ciudades no encontradas")
 
-    weather_service = WeatherService()
+    # Estadísticas de todas las ciudades en una consulta agrupada
+    summaries = AggregateService(db).summary(
+        [city.id for city in city_objs], metric_list, from_date, to_date, unit, percentile_list
+    )
 
-    # CSV en memoria
+    # CSV en memoria (una fila por ciudad)
     output = io.StringIO()
     writer = csv.writer(output)
 
+    labels = {
+        "temperature": ("Temperatura", unit.value),
+        "humidity": ("Humedad", "%"),
+        "pressure": ("Presión", "hPa"),
+        "wind": ("Viento", "m/s"),
+    }
     headers = ["Ciudad"]
     for m in metric_list:
-        if m == "temperature":
-            headers.append(f"Temperatura Promedio ({unit.value})")
-        elif m == "humidity":
-            headers.append("Humedad Promedio (%)")
-        elif m == "pressure":
-            headers.append("Presión Promedio (hPa)")
-        elif m == "wind":
-            headers.append("Viento Promedio (m/s)")
-        else:
-            headers.append(f"{m} Promedio")
+        name, suffix = labels.get(m, (m, None))
+        suffix = f" ({suffix})" if suffix else ""
+        headers += [
+            f"{name} Promedio{suffix}",
+            f"{name} Mín{suffix}",
+            f"{name} Máx{suffix}",
+            f"{name} Desv. Estándar{suffix}",
+            f"{name} Registros",
+        ]
+        headers += [f"{name} P{p:g}{suffix}" for p in percentile_list]
     writer.writerow(headers)
 
+    columns_per_metric = 5 + len(percentile_list)
     for city in city_objs:
-        q = db.query(WeatherHourly).filter(
-            WeatherHourly.city_id == city.id,
-            WeatherHourly.ts >= from_date,
-            WeatherHourly.ts <= to_date,
-        ).order_by(WeatherHourly.ts.asc())
-        rows = q.all()
-        if not rows:
-            writer.writerow([city.name] + [""] * len(metric_list))
-            continue
-        # Calcular promedios simples
+        city_summary = summaries.get(city.id, {})
         values = []
         for m in metric_list:
-            if m == "temperature":
-                temps = [weather_service.convert_temperature(r.temp_c, unit) for r in rows if r.temp_c is not None]
-                avg = round(sum(temps) / len(temps), 1) if temps else ""
-                values.append(avg)
-            elif m == "humidity":
-                vals = [r.humidity for r in rows if r.humidity is not None]
-                avg = round(sum(vals) / len(vals), 1) if vals else ""
-                values.append(avg)
-            elif m == "pressure":
-                vals = [r.pressure for r in rows if r.pressure is not None]
-                avg = round(sum(vals) / len(vals), 1) if vals else ""
-                values.append(avg)
-            elif m == "wind":
-                vals = [r.wind_speed for r in rows if r.wind_speed is not None]
-                avg = round(sum(vals) / len(vals), 1) if vals else ""
-                values.append(avg)
-            else:
-                values.append("")
+            stats = city_summary.get(m)
+            if not stats or not stats["count"]:
+                values += [""] * columns_per_metric
+                continue
+            values += [
+                round(stats[key], 1) if stats[key] is not None else ""
+                for key in ("avg", "min", "max", "stddev")
+            ]
+            values.append(stats["count"])
+            values += [round(value, 1) if value is not None else "" for value in stats["percentiles"]]
         writer.writerow([city.name, *values])
 
     csv_content = output.getvalue()
@@ -347,7 +408,7 @@ async def export_compare_summary(
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
-@router.get("/alerts", response_class=Response)
+@router.get("/alerts", response_class=StreamingResponse)
 async def export_alert_history(
     from_date: Optional[datetime] = Query(None, description="Fecha de inicio"),
     to_date: Optional[datetime] = Query(None, description="Fecha de fin"),
@@ -366,69 +427,64 @@ async def export_alert_history(
         to_date = datetime.utcnow()
     
     # Construir query
-    query = db.query(AlertHistory).filter(
+    stmt = select(
+        AlertHistory.alert_id,
+        AlertHistory.city_id,
+        AlertHistory.ts,
+        AlertHistory.metric,
+        AlertHistory.threshold,
+        AlertHistory.observed_value,
+        AlertHistory.created_at
+    ).where(
         AlertHistory.user_id == current_user.id,
         AlertHistory.ts >= from_date,
         AlertHistory.ts <= to_date
     )
     
     if city_id:
-        query = query.filter(AlertHistory.city_id == city_id)
+        stmt = stmt.where(AlertHistory.city_id == city_id)
     if metric:
-        query = query.filter(AlertHistory.metric == metric)
+        stmt = stmt.where(AlertHistory.metric == metric)
     
-    alert_history = query.order_by(AlertHistory.ts.desc()).all()
+    stmt = stmt.order_by(AlertHistory.ts.desc())
     
-    if not alert_history:
+    if not has_rows(db, stmt):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No hay datos de alertas disponibles para exportar"
         )
     
-    # Crear CSV en memoria
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Escribir encabezados
+    # Encabezados
     headers = [
         "alert_id", "city_id", "city_name", "timestamp", 
         "metric", "threshold", "observed_value", "created_at"
     ]
-    writer.writerow(headers)
     
-    # Escribir datos
-    for alert in alert_history:
-        # Obtener nombre de la ciudad
-        city = db.query(City).filter(City.id == alert.city_id).first()
-        city_name = city.name if city else "Unknown"
+    def produce_rows(stream_db: Session):
+        # Nombres de las ciudades del historial cargados una sola vez
+        city_map = load_city_map(stream_db, stmt.with_only_columns(AlertHistory.city_id).order_by(None).distinct())
         
-        row = [
-            alert.alert_id,
-            alert.city_id,
-            city_name,
-            alert.ts.isoformat(),
-            alert.metric,
-            alert.threshold,
-            alert.observed_value,
-            alert.created_at.isoformat()
-        ]
-        writer.writerow(row)
-    
-    # Preparar respuesta
-    csv_content = output.getvalue()
-    output.close()
+        for alert in stream_rows(stream_db, stmt):
+            city_name = city_map.get(alert.city_id, ("Unknown",))[0]
+            
+            yield [
+                alert.alert_id,
+                alert.city_id,
+                city_name,
+                alert.ts.isoformat(),
+                alert.metric,
+                alert.threshold,
+                alert.observed_value,
+                alert.created_at.isoformat()
+            ]
     
     # Generar nombre de archivo
     filename = f"alert_history_{from_date.strftime('%Y%m%d')}_{to_date.strftime('%Y%m%d')}.csv"
     
-    return Response(
-        content=csv_content,
-        media_type="text/csv",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
-    )
+    return _csv_response(stream_csv(headers, produce_rows), filename)
 
 
-@router.post("/custom", response_class=Response)
+@router.post("/custom", response_class=StreamingResponse)
 async def export_custom_data(
     export_request: ExportRequest,
     current_user = Depends(get_current_active_user),
@@ -436,93 +492,170 @@ async def export_custom_data(
 ):
     """Exportar datos personalizados según filtros"""
     
-    # Si no se especifican ciudades, usar todas
-    if not export_request.city_ids:
-        cities = db.query(City).all()
-        city_ids = [city.id for city in cities]
-    else:
-        city_ids = export_request.city_ids
+    try:
+        columns, produce_rows, filename = build_custom_export(db, export_request, current_user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
     
-    # Determinar rango de fechas
-    from_date = export_request.from_date or (datetime.utcnow() - timedelta(days=30))
-    to_date = export_request.to_date or datetime.utcnow()
-    
-    # Obtener datos meteorológicos
-    weather_data = db.query(WeatherHourly).filter(
-        WeatherHourly.city_id.in_(city_ids),
-        WeatherHourly.ts >= from_date,
-        WeatherHourly.ts <= to_date
-    ).order_by(WeatherHourly.city_id, WeatherHourly.ts.asc()).all()
+    return _export_response(export_request.format, columns, produce_rows, filename)
+
+
+# =============================================================================
+# EXPORTACIONES EN SEGUNDO PLANO
+# =============================================================================
+
+# Tamaño de lectura al servir archivos de exportación
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+def _job_response(job: ExportJob) -> ExportJobResponse:
+    return ExportJobResponse(
+        id=job.id,
+        status=job.status,
+        format=job.format,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        expires_at=job.expires_at,
+        filename=job.filename,
+        size_bytes=job.size_bytes,
+        error=job.error,
+        download_url=f"/export/jobs/{job.id}/download" if job.status == ExportJobStatus.DONE else None
+    )
+
+
+def _parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Rango único `bytes=inicio-fin` (inclusivo). None = servir el archivo completo;
+    ValueError si el rango no es satisfacible"""
+
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        # Otras unidades o varios rangos: se ignora la cabecera
+        return None
+
+    first, _, last = spec.strip().partition("-")
+    first, last = first.strip(), last.strip()
+    if (first and not first.isdigit()) or (last and not last.isdigit()) or not (first or last):
+        # Sintaxis no válida: se ignora la cabecera
+        return None
+
+    if not first:
+        # Sufijo: los últimos N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError("Rango vacío")
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("Rango fuera del archivo")
+    return start, end
+
+
+def _iter_file(path: str, start: int, length: int) -> Iterator[bytes]:
+    with open(path, "rb") as source:
+        source.seek(start)
+        remaining = length
+        while remaining > 0:
+            data = source.read(min(DOWNLOAD_CHUNK_SIZE, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
+
+@router.post("/jobs", response_model=ExportJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_export_job(
+    export_request: ExportRequest,
+    current_user = Depends(get_current_active_user)
+):
+    """Encolar una exportación personalizada (mismos filtros que /export/custom)"""
     
-    if not weather_data:
+    if export_request.format != ExportFormat.CSV and not columnar_available():
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="No hay datos disponibles para exportar"
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail=f"Formato '{export_request.format.value}' no disponible en este servidor"
         )
     
-    # Crear CSV en memoria
-    output = io.StringIO()
-    writer = csv.writer(output)
+    try:
+        job = export_job_manager.submit(current_user.id, export_request)
+    except ExportJobLimitError as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
     
-    # Escribir encabezados
-    headers = [
-        "city_id", "city_name", "country", "timestamp", 
-        f"temperature_{export_request.unit.value}", f"feels_like_{export_request.unit.value}",
-        "humidity", "pressure", "wind_speed", "wind_deg",
-        "clouds", "visibility", "weather_main", "weather_description"
-    ]
+    return _job_response(job)
+
+
+@router.get("/jobs/{job_id}", response_model=ExportJobResponse)
+async def get_export_job(
+    job_id: str,
+    current_user = Depends(get_current_active_user)
+):
+    """Estado de una exportación en segundo plano"""
     
-    # Añadir columna de alertas si se solicita
-    if export_request.include_alerts:
-        headers.append("alert_triggered")
+    job = export_job_manager.get(job_id, current_user.id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Exportación no encontrada")
     
-    writer.writerow(headers)
+    return _job_response(job)
+
+
+@router.get("/jobs/{job_id}/download")
+async def download_export_job(
+    job_id: str,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    current_user = Depends(get_current_active_user)
+):
+    """Descargar el resultado de una exportación (admite `Range: bytes=` para reanudar)"""
     
-    # Escribir datos
-    weather_service = WeatherService()
-    for data in weather_data:
-        # Convertir temperaturas
-        temp = weather_service.convert_temperature(data.temp_c, export_request.unit)
-        feels_like = weather_service.convert_temperature(data.feels_like_c, export_request.unit)
-        
-        row = [
-            data.city_id,
-            data.city.name,
-            data.city.country,
-            data.ts.isoformat(),
-            temp,
-            feels_like,
-            data.humidity,
-            data.pressure,
-            data.wind_speed,
-            data.wind_deg,
-            data.clouds,
-            data.visibility,
-            data.weather_main,
-            data.weather_description
-        ]
-        
-        # Añadir información de alertas si se solicita
-        if export_request.include_alerts:
-            # Verificar si hay alertas activas para este timestamp
-            alert_count = db.query(AlertHistory).filter(
-                AlertHistory.user_id == current_user.id,
-                AlertHistory.city_id == data.city_id,
-                AlertHistory.ts == data.ts
-            ).count()
-            row.append("1" if alert_count > 0 else "0")
-        
-        writer.writerow(row)
+    job = export_job_manager.get(job_id, current_user.id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Exportación no encontrada")
+    if job.status != ExportJobStatus.DONE:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=job.error or "La exportación aún no ha terminado"
+        )
     
-    # Preparar respuesta
-    csv_content = output.getvalue()
-    output.close()
+    size = job.size_bytes
+    disposition = f"attachment; filename={job.filename}"
     
-    # Generar nombre de archivo
-    filename = f"custom_export_{from_date.strftime('%Y%m%d')}_{to_date.strftime('%Y%m%d')}.csv"
+    byte_range = None
+    if range_header:
+        try:
+            byte_range = _parse_range(range_header, size)
+        except ValueError:
+            return Response(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                headers={"Content-Range": f"bytes */{size}"}
+            )
     
-    return Response(
-        content=csv_content,
-        media_type="text/csv",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    # El barrido de caducados no borra el archivo mientras se esté descargando
+    if not export_job_manager.acquire_download(job):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="El resultado de la exportación ha caducado")
+    if not os.path.exists(job.path):
+        export_job_manager.release_download(job)
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="El resultado de la exportación ha caducado")
+    release = BackgroundTask(export_job_manager.release_download, job)
+    
+    if byte_range is None:
+        return FileResponse(
+            job.path,
+            media_type=job.media_type,
+            headers={"Content-Disposition": disposition, "Accept-Ranges": "bytes"},
+            background=release
+        )
+    
+    start, end = byte_range
+    return StreamingResponse(
+        _iter_file(job.path, start, end - start + 1),
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type=job.media_type,
+        headers={
+            "Content-Disposition": disposition,
+            "Accept-Ranges": "bytes",
+            "Content-Range": f"bytes {start}-{end}/{size}",
+            "Content-Length": str(end - start + 1)
+        },
+        background=release
     )
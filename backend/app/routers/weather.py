@@ -2,30 +2,48 @@
 Router de datos meteorológicos
 """
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Union
 from datetime import datetime, timedelta
-from app.database import get_db
-from app.models import City, WeatherHourly, Favorite
+from app.config import settings
+from app.database import get_async_db
+from app.models import City, WeatherHourly, WeatherLatest, Favorite
 from app.schemas import (
     WeatherCurrentResponse, 
+    WeatherFavoriteResponse,
     WeatherHistoryResponse, 
     WeatherCompareResponse,
+    WeatherAggregateResponse,
+    WeatherDailyHistoryResponse,
     WeatherData,
-    TemperatureUnit
+    TemperatureUnit,
+    AggregateBucket,
+    DownsampleMethod,
+    HistoryResolution
 )
 from app.auth import get_current_active_user
 from app.services.weather_service import WeatherService
+from app.services.latest_weather import latest_weather_cache
+from app.services.city_resolver import city_resolver
+from app.services.compare_service import CompareService
+from app.services.series_service import SeriesService, METRIC_COLUMNS, columns_for_metrics
+from app.services.aggregate_service import AggregateService, AGGREGATE_METRICS
+from app.services.daily_service import DailyWeatherService
 from app.utils.city_normalizer import normalize_city_name, normalize_city_list
+from app.utils.downsampling import downsample_rows
 
 router = APIRouter()
 
+# Los servicios de lectura son síncronos sobre una Session: AsyncSession.run_sync los
+# ejecuta con el driver async, de modo que la E/S de base de datos no bloquea el event loop
+
 
 @router.get("/current", response_model=WeatherCurrentResponse)
 async def get_current_weather(
     city: str = Query(..., description="Nombre de la ciudad"),
     unit: TemperatureUnit = Query(TemperatureUnit.CELSIUS, description="Unidad de temperatura"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(get_current_active_user)
 ):
     """Obtener clima actual de una ciudad"""
@@ -34,17 +52,15 @@ async def get_current_weather(
     normalized_city = normalize_city_name(city)
     
     # Buscar la ciudad
-    city_obj = db.query(City).filter(City.name.ilike(f"%{normalized_city}%")).first()
+    city_obj = await db.run_sync(city_resolver.resolve, normalized_city)
     if not city_obj:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Ciudad no encontrada"
         )
     
-    # Obtener datos meteorológicos más recientes
-    weather_data = db.query(WeatherHourly).filter(
-        WeatherHourly.city_id == city_obj.id
-    ).order_by(WeatherHourly.ts.desc()).first()
+    # Última observación (weather_latest por clave primaria, con caché en proceso)
+    weather_data = await db.run_sync(latest_weather_cache.get, city_obj.id)
     
     if not weather_data:
         raise HTTPException(
@@ -63,7 +79,7 @@ async def get_current_weather(
     )
 
 
-@router.get("/history", response_model=WeatherHistoryResponse)
+@router.get("/history", response_model=Union[WeatherHistoryResponse, WeatherDailyHistoryResponse])
 async def get_weather_history(
     city: str = Query(..., description="Nombre de la ciudad"),
     from_date: Optional[datetime] = Query(None, description="Fecha de inicio"),
@@ -71,13 +87,19 @@ async def get_weather_history(
     days: int = Query(7, ge=1, le=365, description="Número de días hacia atrás"),
     unit: TemperatureUnit = Query(TemperatureUnit.CELSIUS, description="Unidad de temperatura"),
     limit: int = Query(1000, ge=1, le=10000, description="Límite de registros"),
-    db: Session = Depends(get_db),
+    max_points: Optional[int] = Query(None, ge=4, le=10000, description="Máximo de puntos por serie (reducción para gráficas)"),
+    downsample: DownsampleMethod = Query(DownsampleMethod.LTTB, description="Reducción: lttb (forma) o minmax (conserva picos)"),
+    resolution: HistoryResolution = Query(
+        HistoryResolution.HOURLY,
+        description="hourly (por defecto), daily o auto (daily para rangos largos si hay agregados)"
+    ),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(get_current_active_user)
 ):
     """Obtener historial meteorológico de una ciudad"""
     
     # Buscar la ciudad
-    city_obj = db.query(City).filter(City.name.ilike(f"%{city}%")).first()
+    city_obj = await db.run_sync(city_resolver.resolve, city)
     if not city_obj:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -90,12 +112,33 @@ async def get_weather_history(
     if not to_date:
         to_date = datetime.utcnow()
     
+    # Rangos largos desde weather_daily en lugar de recorrer filas horarias (solo si se pide)
+    daily = resolution == HistoryResolution.DAILY or (
+        resolution == HistoryResolution.AUTO
+        and (to_date - from_date).days > settings.history_daily_threshold_days
+    )
+    
+    if daily:
+        daily_data = await db.run_sync(
+            lambda session: DailyWeatherService(session).fetch(city_obj.id, from_date, to_date, limit)
+        )
+        if daily_data:
+            weather_service = WeatherService()
+            return WeatherDailyHistoryResponse(
+                city=city_obj,
+                data=[weather_service.convert_daily_data(data, unit) for data in daily_data],
+                from_date=from_date,
+                to_date=to_date,
+                unit=unit
+            )
+        # Sin agregados para el rango (weather_daily aún sin rellenar): se sirve el historial horario
+    
     # Obtener datos históricos
-    weather_data = db.query(WeatherHourly).filter(
-        WeatherHourly.city_id == city_obj.id,
-        WeatherHourly.ts >= from_date,
-        WeatherHourly.ts <= to_date
-    ).order_by(WeatherHourly.ts.asc()).limit(limit).all()
+    weather_data = await db.run_sync(
+        lambda session: SeriesService(session).fetch(city_obj.id, METRIC_COLUMNS["temperature"], from_date, to_date, limit)
+    )
+    # Reducir a max_points para gráficas (sin efecto si no se indica)
+    weather_data = downsample_rows(weather_data, AGGREGATE_METRICS["temperature"], max_points, downsample)
     
     if not weather_data:
         raise HTTPException(
@@ -116,6 +159,65 @@ async def get_weather_history(
     )
 
 
+@router.get("/aggregate", response_model=WeatherAggregateResponse)
+async def get_weather_aggregate(
+    city: str = Query(..., description="Nombre de la ciudad"),
+    bucket: AggregateBucket = Query(AggregateBucket.DAY, description="Tamaño del intervalo (1h, 3h, 1d, 1w)"),
+    metrics: str = Query("temperature,humidity,pressure,wind", description="Métricas separadas por coma"),
+    from_date: Optional[datetime] = Query(None, description="Fecha de inicio"),
+    to_date: Optional[datetime] = Query(None, description="Fecha de fin"),
+    days: int = Query(7, ge=1, le=365, description="Número de días hacia atrás"),
+    unit: TemperatureUnit = Query(TemperatureUnit.CELSIUS, description="Unidad de temperatura"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user = Depends(get_current_active_user)
+):
+    """Obtener min/max/avg/count por intervalo de tiempo (agregado en la base de datos)"""
+    
+    # Parsear métricas
+    metric_list = [m.strip() for m in metrics.split(",") if m.strip()]
+    for metric in metric_list:
+        if metric not in AGGREGATE_METRICS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Métrica '{metric}' no válida. Métricas válidas: {', '.join(AGGREGATE_METRICS)}"
+            )
+    
+    # Buscar la ciudad
+    city_obj = await db.run_sync(city_resolver.resolve, city)
+    if not city_obj:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Ciudad no encontrada"
+        )
+    
+    # Determinar rango de fechas
+    if not from_date:
+        from_date = datetime.utcnow() - timedelta(days=days)
+    if not to_date:
+        to_date = datetime.utcnow()
+    
+    points = await db.run_sync(
+        lambda session: AggregateService(session).aggregate(city_obj.id, bucket, metric_list, from_date, to_date, unit)
+    )
+    
+    if not points:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No hay datos históricos disponibles para el rango especificado"
+        )
+    
+    return WeatherAggregateResponse(
+        city=city_obj,
+        bucket=bucket,
+        metrics=metric_list,
+        data=points,
+        from_date=from_date,
+        to_date=to_date,
+        unit=unit,
+        count=len(points)
+    )
+
+
 @router.get("/compare", response_model=WeatherCompareResponse)
 async def compare_weather(
     cities: str = Query(..., description="Nombres de ciudades separados por coma"),
@@ -124,7 +226,9 @@ async def compare_weather(
     days: int = Query(7, ge=1, le=365, description="Número de días hacia atrás"),
     unit: TemperatureUnit = Query(TemperatureUnit.CELSIUS, description="Unidad de temperatura"),
     limit: int = Query(1000, ge=1, le=10000, description="Límite de registros por ciudad"),
-    db: Session = Depends(get_db),
+    max_points: Optional[int] = Query(None, ge=4, le=10000, description="Máximo de puntos por serie (reducción para gráficas)"),
+    downsample: DownsampleMethod = Query(DownsampleMethod.LTTB, description="Reducción: lttb (forma) o minmax (conserva picos)"),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(get_current_active_user)
 ):
     """Comparar datos meteorológicos de múltiples ciudades"""
@@ -138,16 +242,14 @@ async def compare_weather(
             detail="Debe especificar al menos 2 ciudades para comparar"
         )
     
-    # Buscar ciudades
-    city_objects = []
-    for city_name in normalized_cities:
-        city_obj = db.query(City).filter(City.name.ilike(f"%{city_name}%")).first()
+    # Buscar ciudades (una sola consulta para todas)
+    city_objects = await db.run_sync(lambda session: CompareService(session).resolve_cities(normalized_cities))
+    for city_name, city_obj in zip(normalized_cities, city_objects):
         if not city_obj:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Ciudad '{city_name}' no encontrada"
             )
-        city_objects.append(city_obj)
     
     # Determinar rango de fechas
     if not from_date:
@@ -159,12 +261,12 @@ async def compare_weather(
     weather_service = WeatherService()
     cities_data = {}
     
+    series = await db.run_sync(
+        lambda session: CompareService(session).fetch_series([city.id for city in city_objects], from_date, to_date, limit)
+    )
+    
     for city_obj in city_objects:
-        weather_data = db.query(WeatherHourly).filter(
-            WeatherHourly.city_id == city_obj.id,
-            WeatherHourly.ts >= from_date,
-            WeatherHourly.ts <= to_date
-        ).order_by(WeatherHourly.ts.asc()).limit(limit).all()
+        weather_data = downsample_rows(series.get(city_obj.id, []), AGGREGATE_METRICS["temperature"], max_points, downsample)
         
         if weather_data:
             converted_data = [weather_service.convert_weather_data(data, unit) for data in weather_data]
@@ -185,36 +287,46 @@ async def compare_weather(
     )
 
 
-@router.get("/favorites/current", response_model=List[WeatherCurrentResponse])
+@router.get("/favorites/current", response_model=List[WeatherFavoriteResponse])
 async def get_favorites_current_weather(
     unit: TemperatureUnit = Query(TemperatureUnit.CELSIUS, description="Unidad de temperatura"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(get_current_active_user)
 ):
     """Obtener clima actual de todas las ciudades favoritas"""
     
-    # Obtener ciudades favoritas
-    favorites = db.query(Favorite).filter(Favorite.user_id == current_user.id).all()
-    
-    if not favorites:
-        return []
+    # Favoritas con su última observación en una sola consulta (outer join: también sin datos)
+    result = await db.execute(select(City, WeatherLatest).join(
+        Favorite, Favorite.city_id == City.id
+    ).outerjoin(
+        WeatherLatest, WeatherLatest.city_id == City.id
+    ).where(
+        Favorite.user_id == current_user.id
+    ).order_by(Favorite.id))
+    rows = result.all()
     
     weather_service = WeatherService()
     results = []
     
-    for favorite in favorites:
-        # Obtener datos más recientes
-        weather_data = db.query(WeatherHourly).filter(
-            WeatherHourly.city_id == favorite.city_id
-        ).order_by(WeatherHourly.ts.desc()).first()
+    for city_obj, weather_data in rows:
+        if weather_data is None:
+            # Sin fila en weather_latest: la observación más reciente del histórico, si existe
+            weather_data = (await db.execute(
+                select(WeatherHourly).where(
+                    WeatherHourly.city_id == city_obj.id
+                ).order_by(WeatherHourly.ts.desc()).limit(1)
+            )).scalar_one_or_none()
         
-        if weather_data:
-            converted_data = weather_service.convert_weather_data(weather_data, unit)
-            results.append(WeatherCurrentResponse(
-                city=favorite.city,
-                data=converted_data,
-                timestamp=weather_data.ts
-            ))
+        if weather_data is None:
+            results.append(WeatherFavoriteResponse(city=city_obj))
+            continue
+        
+        converted_data = weather_service.convert_weather_data(weather_data, unit)
+        results.append(WeatherFavoriteResponse(
+            city=city_obj,
+            data=converted_data,
+            timestamp=weather_data.ts
+        ))
     
     return results
 
@@ -231,7 +343,9 @@ async def get_temperature_history(
     days: int = Query(7, ge=1, le=365, description="Número de días hacia atrás"),
     unit: TemperatureUnit = Query(TemperatureUnit.CELSIUS, description="Unidad de temperatura"),
     limit: int = Query(1000, ge=1, le=10000, description="Límite de registros"),
-    db: Session = Depends(get_db),
+    max_points: Optional[int] = Query(None, ge=4, le=10000, description="Máximo de puntos por serie (reducción para gráficas)"),
+    downsample: DownsampleMethod = Query(DownsampleMethod.LTTB, description="Reducción: lttb (forma) o minmax (conserva picos)"),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(get_current_active_user)
 ):
     """Obtener historial de temperatura de una ciudad"""
@@ -240,7 +354,7 @@ async def get_temperature_history(
     normalized_city = normalize_city_name(city)
     
     # Buscar la ciudad
-    city_obj = db.query(City).filter(City.name.ilike(f"%{normalized_city}%")).first()
+    city_obj = await db.run_sync(city_resolver.resolve, normalized_city)
     if not city_obj:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -254,11 +368,11 @@ async def get_temperature_history(
         to_date = datetime.utcnow()
     
     # Obtener datos de temperatura
-    weather_data = db.query(WeatherHourly).filter(
-        WeatherHourly.city_id == city_obj.id,
-        WeatherHourly.ts >= from_date,
-        WeatherHourly.ts <= to_date
-    ).order_by(WeatherHourly.ts.asc()).limit(limit).all()
+    weather_data = await db.run_sync(
+        lambda session: SeriesService(session).fetch(city_obj.id, METRIC_COLUMNS["temperature"], from_date, to_date, limit)
+    )
+    # Reducir a max_points para gráficas (sin efecto si no se indica)
+    weather_data = downsample_rows(weather_data, AGGREGATE_METRICS["temperature"], max_points, downsample)
     
     if not weather_data:
         raise HTTPException(
@@ -288,7 +402,9 @@ async def get_humidity_history(
     to_date: Optional[datetime] = Query(None, description="Fecha de fin"),
     days: int = Query(7, ge=1, le=365, description="Número de días hacia atrás"),
     limit: int = Query(1000, ge=1, le=10000, description="Límite de registros"),
-    db: Session = Depends(get_db),
+    max_points: Optional[int] = Query(None, ge=4, le=10000, description="Máximo de puntos por serie (reducción para gráficas)"),
+    downsample: DownsampleMethod = Query(DownsampleMethod.LTTB, description="Reducción: lttb (forma) o minmax (conserva picos)"),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(get_current_active_user)
 ):
     """Obtener historial de humedad de una ciudad"""
@@ -297,7 +413,7 @@ async def get_humidity_history(
     normalized_city = normalize_city_name(city)
     
     # Buscar la ciudad
-    city_obj = db.query(City).filter(City.name.ilike(f"%{normalized_city}%")).first()
+    city_obj = await db.run_sync(city_resolver.resolve, normalized_city)
     if not city_obj:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -311,11 +427,11 @@ async def get_humidity_history(
         to_date = datetime.utcnow()
     
     # Obtener datos de humedad
-    weather_data = db.query(WeatherHourly).filter(
-        WeatherHourly.city_id == city_obj.id,
-        WeatherHourly.ts >= from_date,
-        WeatherHourly.ts <= to_date
-    ).order_by(WeatherHourly.ts.asc()).limit(limit).all()
+    weather_data = await db.run_sync(
+        lambda session: SeriesService(session).fetch(city_obj.id, METRIC_COLUMNS["humidity"], from_date, to_date, limit)
+    )
+    # Reducir a max_points para gráficas (sin efecto si no se indica)
+    weather_data = downsample_rows(weather_data, AGGREGATE_METRICS["humidity"], max_points, downsample)
     
     if not weather_data:
         raise HTTPException(
@@ -329,7 +445,7 @@ async def get_humidity_history(
         humidity_data.append({
             "timestamp": data.ts,
             "humidity": data.humidity,
-            "city_id": data.city_id,
+            "city_id": city_obj.id,
             "city_name": city_obj.name
         })
     
@@ -351,7 +467,9 @@ async def get_pressure_history(
     to_date: Optional[datetime] = Query(None, description="Fecha de fin"),
     days: int = Query(7, ge=1, le=365, description="Número de días hacia atrás"),
     limit: int = Query(1000, ge=1, le=10000, description="Límite de registros"),
-    db: Session = Depends(get_db),
+    max_points: Optional[int] = Query(None, ge=4, le=10000, description="Máximo de puntos por serie (reducción para gráficas)"),
+    downsample: DownsampleMethod = Query(DownsampleMethod.LTTB, description="Reducción: lttb (forma) o minmax (conserva picos)"),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(get_current_active_user)
 ):
     """Obtener historial de presión de una ciudad"""
@@ -360,7 +478,7 @@ async def get_pressure_history(
     normalized_city = normalize_city_name(city)
     
     # Buscar la ciudad
-    city_obj = db.query(City).filter(City.name.ilike(f"%{normalized_city}%")).first()
+    city_obj = await db.run_sync(city_resolver.resolve, normalized_city)
     if not city_obj:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -374,11 +492,11 @@ async def get_pressure_history(
         to_date = datetime.utcnow()
     
     # Obtener datos de presión
-    weather_data = db.query(WeatherHourly).filter(
-        WeatherHourly.city_id == city_obj.id,
-        WeatherHourly.ts >= from_date,
-        WeatherHourly.ts <= to_date
-    ).order_by(WeatherHourly.ts.asc()).limit(limit).all()
+    weather_data = await db.run_sync(
+        lambda session: SeriesService(session).fetch(city_obj.id, METRIC_COLUMNS["pressure"], from_date, to_date, limit)
+    )
+    # Reducir a max_points para gráficas (sin efecto si no se indica)
+    weather_data = downsample_rows(weather_data, AGGREGATE_METRICS["pressure"], max_points, downsample)
     
     if not weather_data:
         raise HTTPException(
@@ -392,7 +510,7 @@ async def get_pressure_history(
         pressure_data.append({
             "timestamp": data.ts,
             "pressure": data.pressure,
-            "city_id": data.city_id,
+            "city_id": city_obj.id,
             "city_name": city_obj.name
         })
     
@@ -414,7 +532,9 @@ async def get_wind_history(
     to_date: Optional[datetime] = Query(None, description="Fecha de fin"),
     days: int = Query(7, ge=1, le=365, description="Número de días hacia atrás"),
     limit: int = Query(1000, ge=1, le=10000, description="Límite de registros"),
-    db: Session = Depends(get_db),
+    max_points: Optional[int] = Query(None, ge=4, le=10000, description="Máximo de puntos por serie (reducción para gráficas)"),
+    downsample: DownsampleMethod = Query(DownsampleMethod.LTTB, description="Reducción: lttb (forma) o minmax (conserva picos)"),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(get_current_active_user)
 ):
     """Obtener historial de viento de una ciudad"""
@@ -423,7 +543,7 @@ async def get_wind_history(
     normalized_city = normalize_city_name(city)
     
     # Buscar la ciudad
-    city_obj = db.query(City).filter(City.name.ilike(f"%{normalized_city}%")).first()
+    city_obj = await db.run_sync(city_resolver.resolve, normalized_city)
     if not city_obj:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -437,11 +557,11 @@ async def get_wind_history(
         to_date = datetime.utcnow()
     
     # Obtener datos de viento
-    weather_data = db.query(WeatherHourly).filter(
-        WeatherHourly.city_id == city_obj.id,
-        WeatherHourly.ts >= from_date,
-        WeatherHourly.ts <= to_date
-    ).order_by(WeatherHourly.ts.asc()).limit(limit).all()
+    weather_data = await db.run_sync(
+        lambda session: SeriesService(session).fetch(city_obj.id, METRIC_COLUMNS["wind"], from_date, to_date, limit)
+    )
+    # Reducir a max_points para gráficas (sin efecto si no se indica)
+    weather_data = downsample_rows(weather_data, AGGREGATE_METRICS["wind"], max_points, downsample)
     
     if not weather_data:
         raise HTTPException(
@@ -456,7 +576,7 @@ async def get_wind_history(
             "timestamp": data.ts,
             "wind_speed": data.wind_speed,
             "wind_deg": data.wind_deg,
-            "city_id": data.city_id,
+            "city_id": city_obj.id,
             "city_name": city_obj.name
         })
     
@@ -483,7 +603,9 @@ async def compare_temperature(
     days: int = Query(7, ge=1, le=365, description="Número de días hacia atrás"),
     unit: TemperatureUnit = Query(TemperatureUnit.CELSIUS, description="Unidad de temperatura"),
     limit: int = Query(1000, ge=1, le=10000, description="Límite de registros por ciudad"),
-    db: Session = Depends(get_db),
+    max_points: Optional[int] = Query(None, ge=4, le=10000, description="Máximo de puntos por serie (reducción para gráficas)"),
+    downsample: DownsampleMethod = Query(DownsampleMethod.LTTB, description="Reducción: lttb (forma) o minmax (conserva picos)"),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(get_current_active_user)
 ):
     """Comparar temperatura de múltiples ciudades"""
@@ -497,16 +619,14 @@ async def compare_temperature(
             detail="Debe especificar al menos 2 ciudades para comparar"
         )
     
-    # Buscar ciudades
-    city_objects = []
-    for city_name in normalized_cities:
-        city_obj = db.query(City).filter(City.name.ilike(f"%{city_name}%")).first()
+    # Buscar ciudades (una sola consulta para todas)
+    city_objects = await db.run_sync(lambda session: CompareService(session).resolve_cities(normalized_cities))
+    for city_name, city_obj in zip(normalized_cities, city_objects):
         if not city_obj:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Ciudad '{city_name}' no encontrada"
             )
-        city_objects.append(city_obj)
     
     # Determinar rango de fechas
     if not from_date:
@@ -518,12 +638,12 @@ async def compare_temperature(
     weather_service = WeatherService()
     cities_data = {}
     
+    series = await db.run_sync(
+        lambda session: CompareService(session).fetch_series([city.id for city in city_objects], from_date, to_date, limit)
+    )
+    
     for city_obj in city_objects:
-        weather_data = db.query(WeatherHourly).filter(
-            WeatherHourly.city_id == city_obj.id,
-            WeatherHourly.ts >= from_date,
-            WeatherHourly.ts <= to_date
-        ).order_by(WeatherHourly.ts.asc()).limit(limit).all()
+        weather_data = downsample_rows(series.get(city_obj.id, []), AGGREGATE_METRICS["temperature"], max_points, downsample)
         
         if weather_data:
             converted_data = [weather_service.convert_weather_data(data, unit) for data in weather_data]
@@ -553,7 +673,9 @@ async def compare_humidity(
     to_date: Optional[datetime] = Query(None, description="Fecha de fin"),
     days: int = Query(7, ge=1, le=365, description="Número de días hacia atrás"),
     limit: int = Query(1000, ge=1, le=10000, description="Límite de registros por ciudad"),
-    db: Session = Depends(get_db),
+    max_points: Optional[int] = Query(None, ge=4, le=10000, description="Máximo de puntos por serie (reducción para gráficas)"),
+    downsample: DownsampleMethod = Query(DownsampleMethod.LTTB, description="Reducción: lttb (forma) o minmax (conserva picos)"),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(get_current_active_user)
 ):
     """Comparar humedad de múltiples ciudades"""
@@ -567,16 +689,14 @@ async def compare_humidity(
             detail="Debe especificar al menos 2 ciudades para comparar"
         )
     
-    # Buscar ciudades
-    city_objects = []
-    for city_name in normalized_cities:
-        city_obj = db.query(City).filter(City.name.ilike(f"%{city_name}%")).first()
+    # Buscar ciudades (una sola consulta para todas)
+    city_objects = await db.run_sync(lambda session: CompareService(session).resolve_cities(normalized_cities))
+    for city_name, city_obj in zip(normalized_cities, city_objects):
         if not city_obj:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Ciudad '{city_name}' no encontrada"
             )
-        city_objects.append(city_obj)
     
     # Determinar rango de fechas
     if not from_date:
@@ -587,12 +707,14 @@ async def compare_humidity(
     # Obtener datos de humedad para cada ciudad
     cities_data = {}
     
+    series = await db.run_sync(
+        lambda session: CompareService(session).fetch_series(
+            [city.id for city in city_objects], from_date, to_date, limit, columns=METRIC_COLUMNS["humidity"]
+        )
+    )
+    
     for city_obj in city_objects:
-        weather_data = db.query(WeatherHourly).filter(
-            WeatherHourly.city_id == city_obj.id,
-            WeatherHourly.ts >= from_date,
-            WeatherHourly.ts <= to_date
-        ).order_by(WeatherHourly.ts.asc()).limit(limit).all()
+        weather_data = downsample_rows(series.get(city_obj.id, []), AGGREGATE_METRICS["humidity"], max_points, downsample)
         
         if weather_data:
             humidity_data = []
@@ -629,7 +751,9 @@ async def compare_pressure(
     to_date: Optional[datetime] = Query(None, description="Fecha de fin"),
     days: int = Query(7, ge=1, le=365, description="Número de días hacia atrás"),
     limit: int = Query(1000, ge=1, le=10000, description="Límite de registros por ciudad"),
-    db: Session = Depends(get_db),
+    max_points: Optional[int] = Query(None, ge=4, le=10000, description="Máximo de puntos por serie (reducción para gráficas)"),
+    downsample: DownsampleMethod = Query(DownsampleMethod.LTTB, description="Reducción: lttb (forma) o minmax (conserva picos)"),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(get_current_active_user)
 ):
     """Comparar presión de múltiples ciudades"""
@@ -643,16 +767,14 @@ async def compare_pressure(
             detail="Debe especificar al menos 2 ciudades para comparar"
         )
     
-    # Buscar ciudades
-    city_objects = []
-    for city_name in normalized_cities:
-        city_obj = db.query(City).filter(City.name.ilike(f"%{city_name}%")).first()
+    # Buscar ciudades (una sola consulta para todas)
+    city_objects = await db.run_sync(lambda session: CompareService(session).resolve_cities(normalized_cities))
+    for city_name, city_obj in zip(normalized_cities, city_objects):
         if not city_obj:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Ciudad '{city_name}' no encontrada"
             )
-        city_objects.append(city_obj)
     
     # Determinar rango de fechas
     if not from_date:
@@ -663,12 +785,14 @@ async def compare_pressure(
     # Obtener datos de presión para cada ciudad
     cities_data = {}
     
+    series = await db.run_sync(
+        lambda session: CompareService(session).fetch_series(
+            [city.id for city in city_objects], from_date, to_date, limit, columns=METRIC_COLUMNS["pressure"]
+        )
+    )
+    
     for city_obj in city_objects:
-        weather_data = db.query(WeatherHourly).filter(
-            WeatherHourly.city_id == city_obj.id,
-            WeatherHourly.ts >= from_date,
-            WeatherHourly.ts <= to_date
-        ).order_by(WeatherHourly.ts.asc()).limit(limit).all()
+        weather_data = downsample_rows(series.get(city_obj.id, []), AGGREGATE_METRICS["pressure"], max_points, downsample)
         
         if weather_data:
             pressure_data = []
@@ -705,7 +829,9 @@ async def compare_wind(
     to_date: Optional[datetime] = Query(None, description="Fecha de fin"),
     days: int = Query(7, ge=1, le=365, description="Número de días hacia atrás"),
     limit: int = Query(1000, ge=1, le=10000, description="Límite de registros por ciudad"),
-    db: Session = Depends(get_db),
+    max_points: Optional[int] = Query(None, ge=4, le=10000, description="Máximo de puntos por serie (reducción para gráficas)"),
+    downsample: DownsampleMethod = Query(DownsampleMethod.LTTB, description="Reducción: lttb (forma) o minmax (conserva picos)"),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(get_current_active_user)
 ):
     """Comparar viento de múltiples ciudades"""
@@ -719,16 +845,14 @@ async def compare_wind(
             detail="Debe especificar al menos 2 ciudades para comparar"
         )
     
-    # Buscar ciudades
-    city_objects = []
-    for city_name in normalized_cities:
-        city_obj = db.query(City).filter(City.name.ilike(f"%{city_name}%")).first()
+    # Buscar ciudades (una sola consulta para todas)
+    city_objects = await db.run_sync(lambda session: CompareService(session).resolve_cities(normalized_cities))
+    for city_name, city_obj in zip(normalized_cities, city_objects):
         if not city_obj:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Ciudad '{city_name}' no encontrada"
             )
-        city_objects.append(city_obj)
     
     # Determinar rango de fechas
     if not from_date:
@@ -739,12 +863,14 @@ async def compare_wind(
     # Obtener datos de viento para cada ciudad
     cities_data = {}
     
+    series = await db.run_sync(
+        lambda session: CompareService(session).fetch_series(
+            [city.id for city in city_objects], from_date, to_date, limit, columns=METRIC_COLUMNS["wind"]
+        )
+    )
+    
     for city_obj in city_objects:
-        weather_data = db.query(WeatherHourly).filter(
-            WeatherHourly.city_id == city_obj.id,
-            WeatherHourly.ts >= from_date,
-            WeatherHourly.ts <= to_date
-        ).order_by(WeatherHourly.ts.asc()).limit(limit).all()
+        weather_data = downsample_rows(series.get(city_obj.id, []), AGGREGATE_METRICS["wind"], max_points, downsample)
         
         if weather_data:
             wind_data = []
@@ -788,7 +914,9 @@ async def get_multiple_metrics_history(
     days: int = Query(7, ge=1, le=365, description="Número de días hacia atrás"),
     unit: TemperatureUnit = Query(TemperatureUnit.CELSIUS, description="Unidad de temperatura"),
     limit: int = Query(1000, ge=1, le=10000, description="Límite de registros"),
-    db: Session = Depends(get_db),
+    max_points: Optional[int] = Query(None, ge=4, le=10000, description="Máximo de puntos por serie (reducción para gráficas)"),
+    downsample: DownsampleMethod = Query(DownsampleMethod.LTTB, description="Reducción: lttb (forma) o minmax (conserva picos)"),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(get_current_active_user)
 ):
     """Obtener múltiples métricas de historial en una sola consulta"""
@@ -808,7 +936,7 @@ async def get_multiple_metrics_history(
     normalized_city = normalize_city_name(city)
     
     # Buscar la ciudad
-    city_obj = db.query(City).filter(City.name.ilike(f"%{normalized_city}%")).first()
+    city_obj = await db.run_sync(city_resolver.resolve, normalized_city)
     if not city_obj:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -822,11 +950,9 @@ async def get_multiple_metrics_history(
         to_date = datetime.utcnow()
     
     # Obtener datos una sola vez
-    weather_data = db.query(WeatherHourly).filter(
-        WeatherHourly.city_id == city_obj.id,
-        WeatherHourly.ts >= from_date,
-        WeatherHourly.ts <= to_date
-    ).order_by(WeatherHourly.ts.asc()).limit(limit).all()
+    weather_data = await db.run_sync(
+        lambda session: SeriesService(session).fetch(city_obj.id, columns_for_metrics(metric_list), from_date, to_date, limit)
+    )
     
     if not weather_data:
         raise HTTPException(
@@ -839,25 +965,26 @@ async def get_multiple_metrics_history(
     results = {}
     
     for metric in metric_list:
+        metric_rows = downsample_rows(weather_data, AGGREGATE_METRICS[metric], max_points, downsample)
         if metric == "temperature":
-            converted_data = [weather_service.convert_weather_data(data, unit) for data in weather_data]
+            converted_data = [weather_service.convert_weather_data(data, unit) for data in metric_rows]
             results[metric] = converted_data
         else:
             # Extraer datos específicos para otras métricas
             metric_data = []
-            for data in weather_data:
+            for data in metric_rows:
                 if metric == "humidity":
                     metric_data.append({
                         "timestamp": data.ts,
                         "humidity": data.humidity,
-                        "city_id": data.city_id,
+                        "city_id": city_obj.id,
                         "city_name": city_obj.name
                     })
                 elif metric == "pressure":
                     metric_data.append({
                         "timestamp": data.ts,
                         "pressure": data.pressure,
-                        "city_id": data.city_id,
+                        "city_id": city_obj.id,
                         "city_name": city_obj.name
                     })
                 elif metric == "wind":
@@ -865,7 +992,7 @@ async def get_multiple_metrics_history(
                         "timestamp": data.ts,
                         "wind_speed": data.wind_speed,
                         "wind_deg": data.wind_deg,
-                        "city_id": data.city_id,
+                        "city_id": city_obj.id,
                         "city_name": city_obj.name
                     })
             results[metric] = metric_data
@@ -877,7 +1004,9 @@ async def get_multiple_metrics_history(
         "from_date": from_date,
         "to_date": to_date,
         "unit": unit,
-        "count": len(weather_data)
+        # Puntos devueltos por métrica (tras max_points) y filas leídas antes de reducir
+        "count": {metric: len(points) for metric, points in results.items()},
+        "raw_count": len(weather_data)
     }
 
 
@@ -890,7 +1019,9 @@ async def compare_multiple_metrics(
     days: int = Query(7, ge=1, le=365, description="Número de días hacia atrás"),
     unit: TemperatureUnit = Query(TemperatureUnit.CELSIUS, description="Unidad de temperatura"),
     limit: int = Query(1000, ge=1, le=10000, description="Límite de registros por ciudad"),
-    db: Session = Depends(get_db),
+    max_points: Optional[int] = Query(None, ge=4, le=10000, description="Máximo de puntos por serie (reducción para gráficas)"),
+    downsample: DownsampleMethod = Query(DownsampleMethod.LTTB, description="Reducción: lttb (forma) o minmax (conserva picos)"),
+    db: AsyncSession = Depends(get_async_db),
     current_user = Depends(get_current_active_user)
 ):
     """Comparar múltiples métricas de múltiples ciudades en una sola consulta"""
@@ -915,16 +1046,14 @@ async def compare_multiple_metrics(
             detail="Debe especificar al menos 2 ciudades para comparar"
         )
     
-    # Buscar ciudades
-    city_objects = []
-    for city_name in normalized_cities:
-        city_obj = db.query(City).filter(City.name.ilike(f"%{city_name}%")).first()
+    # Buscar ciudades (una sola consulta para todas)
+    city_objects = await db.run_sync(lambda session: CompareService(session).resolve_cities(normalized_cities))
+    for city_name, city_obj in zip(normalized_cities, city_objects):
         if not city_obj:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Ciudad '{city_name}' no encontrada"
             )
-        city_objects.append(city_obj)
     
     # Determinar rango de fechas
     if not from_date:
@@ -936,23 +1065,26 @@ async def compare_multiple_metrics(
     weather_service = WeatherService()
     results = {}
     
+    series = await db.run_sync(
+        lambda session: CompareService(session).fetch_series(
+            [city.id for city in city_objects], from_date, to_date, limit, columns=columns_for_metrics(metric_list)
+        )
+    )
+    
     for city_obj in city_objects:
-        weather_data = db.query(WeatherHourly).filter(
-            WeatherHourly.city_id == city_obj.id,
-            WeatherHourly.ts >= from_date,
-            WeatherHourly.ts <= to_date
-        ).order_by(WeatherHourly.ts.asc()).limit(limit).all()
+        weather_data = series.get(city_obj.id, [])
         
         if weather_data:
             city_results = {}
             for metric in metric_list:
+                metric_rows = downsample_rows(weather_data, AGGREGATE_METRICS[metric], max_points, downsample)
                 if metric == "temperature":
-                    converted_data = [weather_service.convert_weather_data(data, unit) for data in weather_data]
+                    converted_data = [weather_service.convert_weather_data(data, unit) for data in metric_rows]
                     city_results[metric] = converted_data
                 else:
                     # Extraer datos específicos para otras métricas
                     metric_data = []
-                    for data in weather_data:
+                    for data in metric_rows:
                         if metric == "humidity":
                             metric_data.append({
                                 "timestamp": data.ts,
@@ -991,5 +1123,5 @@ async def compare_multiple_metrics(
         "from_date": from_date,
         "to_date": to_date,
         "unit": unit,
-        "count": sum(len(data) for city_data in results.values() for metric_data in city_data.values() for data in metric_data)
+        "count": sum(len(metric_data) for city_data in results.values() for metric_data in city_data.values())
     }
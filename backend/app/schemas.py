@@ -14,6 +14,37 @@ class TemperatureUnit(str, Enum):
     KELVIN = "k"
 
 
+class AggregateBucket(str, Enum):
+    HOUR = "1h"
+    THREE_HOURS = "3h"
+    DAY = "1d"
+    WEEK = "1w"
+
+
+class HistoryResolution(str, Enum):
+    AUTO = "auto"
+    HOURLY = "hourly"
+    DAILY = "daily"
+
+
+class DownsampleMethod(str, Enum):
+    LTTB = "lttb"
+    MINMAX = "minmax"
+
+
+class ExportFormat(str, Enum):
+    CSV = "csv"
+    PARQUET = "parquet"
+    ARROW = "arrow"
+
+
+class ExportJobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
 class MetricType(str, Enum):
     TEMPERATURE = "temp"
     HUMIDITY = "humidity"
@@ -31,6 +62,12 @@ class OperatorType(str, Enum):
     LESS_EQUAL = "<="
 
 
+class AlertState(str, Enum):
+    ARMED = "armed"
+    FIRING = "firing"
+    CLEARED = "cleared"
+
+
 # Schemas de autenticación
 class UserCreate(BaseModel):
     email: EmailStr
@@ -139,14 +176,64 @@ class WeatherCurrentResponse(BaseModel):
     timestamp: datetime
 
 
+class WeatherFavoriteResponse(BaseModel):
+    city: CityResponse
+    # Sin datos si la ciudad aún no tiene observaciones
+    data: Optional[WeatherData] = None
+    timestamp: Optional[datetime] = None
+
+
 class WeatherHistoryResponse(BaseModel):
     city: CityResponse
+    resolution: HistoryResolution = HistoryResolution.HOURLY
     data: List[WeatherData]
     from_date: datetime
     to_date: datetime
     unit: TemperatureUnit
 
 
+class WeatherDailyData(BaseModel):
+    day: date
+    temp_min: Optional[float]
+    temp_max: Optional[float]
+    temp_avg: Optional[float]
+    humidity_avg: Optional[float]
+    precip_total: Optional[float]
+    unit: TemperatureUnit
+
+
+class WeatherDailyHistoryResponse(BaseModel):
+    city: CityResponse
+    resolution: HistoryResolution = HistoryResolution.DAILY
+    data: List[WeatherDailyData]
+    from_date: datetime
+    to_date: datetime
+    unit: TemperatureUnit
+
+
+class MetricAggregate(BaseModel):
+    min: Optional[float]
+    max: Optional[float]
+    avg: Optional[float]
+    count: int
+
+
+class WeatherAggregatePoint(BaseModel):
+    bucket_start: datetime
+    values: Dict[str, MetricAggregate]  # metric -> min/max/avg/count
+
+
+class WeatherAggregateResponse(BaseModel):
+    city: CityResponse
+    bucket: AggregateBucket
+    metrics: List[str]
+    data: List[WeatherAggregatePoint]
+    from_date: datetime
+    to_date: datetime
+    unit: TemperatureUnit
+    count: int
+
+
 class WeatherCompareResponse(BaseModel):
     cities: List[CityResponse]
     data: Dict[str, List[WeatherData]]  # city_name -> weather_data_list
@@ -162,6 +249,8 @@ class AlertCreate(BaseModel):
     operator: OperatorType
     threshold: float
     unit: Optional[TemperatureUnit] = None
+    hysteresis: Optional[float] = None  # Margen para despejar la alerta (vacío = valor por defecto)
+    cooldown_minutes: Optional[int] = None  # Mínimo entre activaciones registradas
     
     @validator('unit')
     def validate_unit_for_metric(cls, v, values):
@@ -171,12 +260,26 @@ class AlertCreate(BaseModel):
         if metric != MetricType.TEMPERATURE and v:
             raise ValueError('La unidad solo es válida para alertas de temperatura')
         return v
+    
+    @validator('hysteresis', 'cooldown_minutes')
+    def validate_non_negative(cls, v):
+        if v is not None and v < 0:
+            raise ValueError('El valor no puede ser negativo')
+        return v
 
 
 class AlertUpdate(BaseModel):
     active: Optional[bool] = None
     paused: Optional[bool] = None
     threshold: Optional[float] = None
+    hysteresis: Optional[float] = None
+    cooldown_minutes: Optional[int] = None
+    
+    @validator('hysteresis', 'cooldown_minutes')
+    def validate_non_negative(cls, v):
+        if v is not None and v < 0:
+            raise ValueError('El valor no puede ser negativo')
+        return v
 
 
 class AlertResponse(BaseModel):
@@ -190,6 +293,11 @@ class AlertResponse(BaseModel):
     unit: Optional[str]
     active: bool
     paused: bool
+    hysteresis: Optional[float] = None
+    cooldown_minutes: Optional[int] = None
+    state: AlertState = AlertState.ARMED
+    state_changed_at: Optional[datetime] = None
+    last_fired_at: Optional[datetime] = None
     created_at: datetime
     
     class Config:
@@ -218,7 +326,7 @@ class ExportRequest(BaseModel):
     from_date: Optional[datetime] = None
     to_date: Optional[datetime] = None
     unit: TemperatureUnit = TemperatureUnit.CELSIUS
-    format: str = "csv"
+    format: ExportFormat = ExportFormat.CSV
     include_alerts: bool = False
 
 
@@ -228,6 +336,20 @@ class ExportResponse(BaseModel):
     record_count: int
 
 
+class ExportJobResponse(BaseModel):
+    id: str
+    status: ExportJobStatus
+    format: ExportFormat
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = None
+    filename: Optional[str] = None
+    size_bytes: Optional[int] = None
+    error: Optional[str] = None
+    download_url: Optional[str] = None
+
+
 # Schemas de ETL
 class ETLRunRequest(BaseModel):
     city_id: Optional[int] = None
@@ -239,6 +361,7 @@ class ETLStatusResponse(BaseModel):
     message: str
     processed_cities: int
     errors: List[str] = []
+    quota: Optional[Dict[str, Any]] = None  # Estado del limitador de OpenWeatherMap
 
 
 # Schemas de respuesta general
@@ -0,0 +1,240 @@
+"""
+Agregación por intervalos de tiempo (min/max/avg/count) y resúmenes por ciudad calculados en SQL
+"""
+import math
+from datetime import datetime, timezone
+from itertools import groupby
+from typing import Any, Dict, List, Sequence
+from sqlalchemy import Integer, cast, extract, func, select
+from sqlalchemy.orm import Session
+from app.models import WeatherHourly
+from app.schemas import AggregateBucket, TemperatureUnit
+from app.services.weather_service import WeatherService
+
+# Métrica de la API -> columna de weather_hourly
+AGGREGATE_METRICS: Dict[str, str] = {
+    "temperature": "temp_c",
+    "humidity": "humidity",
+    "pressure": "pressure",
+    "wind": "wind_speed",
+}
+
+# Tamaño de cada intervalo en segundos (agrupación por epoch en SQLite)
+BUCKET_SECONDS: Dict[AggregateBucket, int] = {
+    AggregateBucket.HOUR: 3600,
+    AggregateBucket.THREE_HOURS: 3 * 3600,
+    AggregateBucket.DAY: 86400,
+    AggregateBucket.WEEK: 7 * 86400,
+}
+
+# El epoch 0 fue jueves: desplazar 4 días para que las semanas empiecen en lunes (como date_trunc)
+WEEK_OFFSET_SECONDS = 4 * 86400
+
+
+def _percentile_cont(values: Sequence[float], fraction: float) -> float:
+    """Percentil con interpolación lineal (misma definición que percentile_cont)"""
+
+    position = fraction * (len(values) - 1)
+    lower = math.floor(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class AggregateService:
+    """Series agregadas por intervalo y resúmenes de rango completo"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.dialect = db.get_bind().dialect.name
+
+    def _bucket_expression(self, bucket: AggregateBucket):
+        """Inicio del intervalo de cada fila (datetime en PostgreSQL, epoch en el resto)"""
+
+        if self.dialect == "postgresql":
+            ts_utc = func.timezone("UTC", WeatherHourly.ts)
+            if bucket == AggregateBucket.THREE_HOURS:
+                hour = func.date_trunc("hour", ts_utc)
+                return hour - func.make_interval(0, 0, 0, 0, cast(extract("hour", ts_utc), Integer) % 3)
+            field = {AggregateBucket.HOUR: "hour", AggregateBucket.DAY: "day", AggregateBucket.WEEK: "week"}[bucket]
+            return func.date_trunc(field, ts_utc)
+
+        # Alternativa SQLite: división entera sobre el epoch
+        size = BUCKET_SECONDS[bucket]
+        offset = WEEK_OFFSET_SECONDS if bucket == AggregateBucket.WEEK else 0
+        epoch = cast(func.strftime("%s", WeatherHourly.ts), Integer)
+        return (epoch - offset) // size * size + offset
+
+    @staticmethod
+    def _bucket_start(value) -> datetime:
+        if isinstance(value, datetime):
+            return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+        return datetime.fromtimestamp(int(value), tz=timezone.utc)
+
+    def aggregate(
+        self,
+        city_id: int,
+        bucket: AggregateBucket,
+        metrics: Sequence[str],
+        from_date: datetime,
+        to_date: datetime,
+        unit: TemperatureUnit = TemperatureUnit.CELSIUS
+    ) -> List[Dict[str, Any]]:
+        """Un punto por intervalo con min/max/avg/count de cada métrica"""
+
+        bucket_start = self._bucket_expression(bucket).label("bucket_start")
+        columns = [bucket_start]
+        for metric in metrics:
+            column = getattr(WeatherHourly, AGGREGATE_METRICS[metric])
+            columns += [
+                func.min(column).label(f"{metric}_min"),
+                func.max(column).label(f"{metric}_max"),
+                func.avg(column).label(f"{metric}_avg"),
+                func.count(column).label(f"{metric}_count"),
+            ]
+
+        stmt = select(*columns).where(
+            WeatherHourly.city_id == city_id,
+            WeatherHourly.ts >= from_date,
+            WeatherHourly.ts <= to_date
+        ).group_by(bucket_start).order_by(bucket_start)
+
+        points = []
+        for row in self.db.execute(stmt):
+            values = {}
+            for metric in metrics:
+                stats = {
+                    "min": getattr(row, f"{metric}_min"),
+                    "max": getattr(row, f"{metric}_max"),
+                    "avg": getattr(row, f"{metric}_avg"),
+                }
+                for key, value in stats.items():
+                    if value is None:
+                        continue
+                    value = float(value)
+                    # Conversión lineal: se puede aplicar a min/max/avg ya agregados
+                    stats[key] = WeatherService.convert_temperature(value, unit) if metric == "temperature" else round(value, 2)
+                stats["count"] = getattr(row, f"{metric}_count")
+                values[metric] = stats
+            points.append({"bucket_start": self._bucket_start(row.bucket_start), "values": values})
+        return points
+
+    @staticmethod
+    def _convert(metric: str, value: float, unit: TemperatureUnit, delta: bool = False) -> float:
+        if metric != "temperature":
+            return value
+        if delta:
+            return WeatherService.convert_temperature_delta(value, unit)
+        return WeatherService.convert_temperature(value, unit)
+
+    def _percentiles_fallback(
+        self,
+        city_ids: Sequence[int],
+        metric: str,
+        from_date: datetime,
+        to_date: datetime,
+        percentiles: Sequence[float]
+    ) -> Dict[int, List[float]]:
+        """Percentiles sin percentile_cont (SQLite): una columna ordenada por ciudad"""
+
+        column = getattr(WeatherHourly, AGGREGATE_METRICS[metric])
+        stmt = select(WeatherHourly.city_id, column).where(
+            WeatherHourly.city_id.in_(city_ids),
+            WeatherHourly.ts >= from_date,
+            WeatherHourly.ts <= to_date,
+            column.isnot(None)
+        ).order_by(WeatherHourly.city_id, column)
+
+        result = {}
+        for city_id, rows in groupby(self.db.execute(stmt), key=lambda row: row[0]):
+            values = [row[1] for row in rows]
+            result[city_id] = [_percentile_cont(values, p / 100) for p in percentiles]
+        return result
+
+    def summary(
+        self,
+        city_ids: Sequence[int],
+        metrics: Sequence[str],
+        from_date: datetime,
+        to_date: datetime,
+        unit: TemperatureUnit = TemperatureUnit.CELSIUS,
+        percentiles: Sequence[float] = ()
+    ) -> Dict[int, Dict[str, Dict[str, Any]]]:
+        """avg/min/max/stddev/count (y percentiles) por ciudad y métrica en una consulta agrupada.
+
+        Devuelve {city_id: {metric: {"avg", "min", "max", "stddev", "count", "percentiles"}}};
+        las ciudades sin datos no aparecen.
+        """
+
+        metrics = [metric for metric in metrics if metric in AGGREGATE_METRICS]
+        postgres = self.dialect == "postgresql"
+
+        columns = [WeatherHourly.city_id]
+        for metric in metrics:
+            column = getattr(WeatherHourly, AGGREGATE_METRICS[metric])
+            columns += [
+                func.avg(column).label(f"{metric}_avg"),
+                func.min(column).label(f"{metric}_min"),
+                func.max(column).label(f"{metric}_max"),
+                func.count(column).label(f"{metric}_count"),
+            ]
+            if postgres:
+                columns.append(func.stddev_samp(column).label(f"{metric}_stddev"))
+                columns += [
+                    func.percentile_cont(p / 100).within_group(column).label(f"{metric}_p{index}")
+                    for index, p in enumerate(percentiles)
+                ]
+            else:
+                # SQLite no tiene stddev: suma y suma de cuadrados para derivarla
+                columns += [
+                    func.sum(column).label(f"{metric}_sum"),
+                    func.sum(column * column).label(f"{metric}_sumsq"),
+                ]
+
+        stmt = select(*columns).where(
+            WeatherHourly.city_id.in_(city_ids),
+            WeatherHourly.ts >= from_date,
+            WeatherHourly.ts <= to_date
+        ).group_by(WeatherHourly.city_id)
+        rows = self.db.execute(stmt).all()
+
+        fallback = {}
+        if percentiles and not postgres:
+            fallback = {
+                metric: self._percentiles_fallback(city_ids, metric, from_date, to_date, percentiles)
+                for metric in metrics
+            }
+
+        summaries = {}
+        for row in rows:
+            values = row._mapping
+            city_summary = {}
+            for metric in metrics:
+                count = values[f"{metric}_count"]
+                stats = {
+                    "avg": values[f"{metric}_avg"],
+                    "min": values[f"{metric}_min"],
+                    "max": values[f"{metric}_max"],
+                    "count": count,
+                }
+                if postgres:
+                    stats["stddev"] = values[f"{metric}_stddev"]
+                    stats["percentiles"] = [values[f"{metric}_p{index}"] for index in range(len(percentiles))]
+                else:
+                    stddev = None
+                    if count > 1:
+                        total, squares = float(values[f"{metric}_sum"]), float(values[f"{metric}_sumsq"])
+                        stddev = math.sqrt(max(squares - total * total / count, 0.0) / (count - 1))
+                    stats["stddev"] = stddev
+                    stats["percentiles"] = fallback[metric].get(row.city_id, [None] * len(percentiles)) if percentiles else []
+
+                # Conversión de unidad sobre los agregados (lineal; la desviación solo escala)
+                for key in ("avg", "min", "max", "stddev"):
+                    if stats[key] is not None:
+                        stats[key] = self._convert(metric, float(stats[key]), unit, delta=key == "stddev")
+                stats["percentiles"] = [
+                    None if value is None else self._convert(metric, float(value), unit)
+                    for value in stats["percentiles"]
+                ]
+                city_summary[metric] = stats
+            summaries[row.city_id] = city_summary
+        return summaries
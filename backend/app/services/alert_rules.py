@@ -0,0 +1,187 @@
+"""
+Índice compilado de reglas de alerta: umbrales ordenados y búsqueda binaria por observación
+"""
+import bisect
+import threading
+import time
+import structlog
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models import Alert
+from app.schemas import MetricType, OperatorType
+
+logger = structlog.get_logger()
+
+# Tolerancia del operador "=" (en la unidad de la alerta)
+EQUAL_TOLERANCE = 0.1
+
+# Regla compilada: (alert_id, user_id, threshold, hysteresis, cooldown_minutes)
+Rule = Tuple[int, int, float, Optional[float], Optional[int]]
+
+# Columna de weather_hourly de cada métrica (la temperatura se convierte según la unidad)
+METRIC_COLUMNS = {
+    MetricType.HUMIDITY: "humidity",
+    MetricType.WIND: "wind_speed",
+    MetricType.PRESSURE: "pressure",
+    MetricType.CLOUDS: "clouds",
+    MetricType.VISIBILITY: "visibility",
+}
+
+
+def observed_value(metric: str, row: Mapping[str, Any], unit: Optional[str]) -> Optional[float]:
+    """Valor observado de una fila de weather_hourly (dict) en la unidad de la alerta"""
+
+    if metric == MetricType.TEMPERATURE:
+        temp_c = row["temp_c"]
+        if temp_c is None:
+            return None
+        if unit == "f":
+            return (temp_c * 9/5) + 32
+        if unit == "k":
+            return temp_c + 273.15
+        return temp_c
+
+    column = METRIC_COLUMNS.get(metric)
+    if column is None:
+        return None
+    value = row[column]
+    # Visibilidad 0 equivale a dato ausente (igual que la evaluación anterior)
+    if value is None or (metric == MetricType.VISIBILITY and not value):
+        return None
+    return float(value)
+
+
+def _matching_range(operator: str, thresholds: List[float], value: float) -> Tuple[int, int]:
+    """Intervalo [inicio, fin) de umbrales (orden ascendente) que cumplen la condición"""
+
+    if operator == OperatorType.GREATER_THAN:
+        return 0, bisect.bisect_left(thresholds, value)
+    if operator == OperatorType.GREATER_EQUAL:
+        return 0, bisect.bisect_right(thresholds, value)
+    if operator == OperatorType.LESS_THAN:
+        return bisect.bisect_right(thresholds, value), len(thresholds)
+    if operator == OperatorType.LESS_EQUAL:
+        return bisect.bisect_left(thresholds, value), len(thresholds)
+    if operator == OperatorType.EQUAL:
+        # Candidatos en [valor - tolerancia, valor + tolerancia]; se filtran con la condición exacta
+        return (
+            bisect.bisect_left(thresholds, value - EQUAL_TOLERANCE),
+            bisect.bisect_right(thresholds, value + EQUAL_TOLERANCE)
+        )
+    return 0, 0
+
+
+def is_cleared(operator: str, value: float, threshold: float, hysteresis: float) -> bool:
+    """Si el valor ha salido de la condición con margen suficiente para despejar la alerta.
+
+    Con histéresis 0 equivale a que la condición deje de cumplirse.
+    """
+
+    if operator == OperatorType.GREATER_THAN:
+        return value <= threshold - hysteresis
+    if operator == OperatorType.GREATER_EQUAL:
+        return value < threshold - hysteresis
+    if operator == OperatorType.LESS_THAN:
+        return value >= threshold + hysteresis
+    if operator == OperatorType.LESS_EQUAL:
+        return value > threshold + hysteresis
+    if operator == OperatorType.EQUAL:
+        return abs(value - threshold) >= EQUAL_TOLERANCE + hysteresis
+    return True
+
+
+class AlertRuleIndex:
+    """Reglas agrupadas por ciudad y (métrica, unidad), con umbrales ordenados por operador.
+
+    Cada observación convierte su valor una vez por (métrica, unidad) y obtiene las
+    alertas que se cumplen con una búsqueda binaria por operador: O(log n + k).
+    """
+
+    def __init__(self, rows: Iterable[Tuple[int, int, int, str, str, float, Optional[str], Optional[float], Optional[int]]]):
+        groups: Dict[int, Dict[Tuple[str, Optional[str]], Dict[str, List[Rule]]]] = {}
+        count = 0
+        for alert_id, user_id, city_id, metric, operator, threshold, unit, hysteresis, cooldown_minutes in rows:
+            # La unidad solo distingue reglas de temperatura (None y "c" son Celsius)
+            if metric == MetricType.TEMPERATURE:
+                unit = unit if unit in ("f", "k") else "c"
+            else:
+                unit = None
+            operators = groups.setdefault(city_id, {}).setdefault((metric, unit), {})
+            operators.setdefault(operator, []).append((alert_id, user_id, threshold, hysteresis, cooldown_minutes))
+            count += 1
+
+        # {city_id: [(métrica, unidad, [(operador, umbrales, reglas)])]}
+        self._by_city: Dict[int, List[Tuple[str, Optional[str], List[Tuple[str, List[float], List[Rule]]]]]] = {}
+        for city_id, metrics in groups.items():
+            compiled = []
+            for (metric, unit), operators in metrics.items():
+                by_operator = []
+                for operator, rules in operators.items():
+                    rules.sort(key=lambda rule: rule[2])
+                    by_operator.append((operator, [rule[2] for rule in rules], rules))
+                compiled.append((metric, unit, by_operator))
+            self._by_city[city_id] = compiled
+        self.size = count
+
+    def match(self, row: Mapping[str, Any]) -> Iterator[Tuple[str, Optional[str], str, Rule, float]]:
+        """(métrica, unidad, operador, regla, valor observado) de las alertas que cumple la fila"""
+
+        for metric, unit, by_operator in self._by_city.get(row["city_id"], ()):
+            value = observed_value(metric, row, unit)
+            if value is None:
+                continue
+            for operator, thresholds, rules in by_operator:
+                start, end = _matching_range(operator, thresholds, value)
+                for position in range(start, end):
+                    if operator == OperatorType.EQUAL and not abs(value - thresholds[position]) < EQUAL_TOLERANCE:
+                        continue
+                    yield metric, unit, operator, rules[position], value
+
+
+class AlertRuleEngine:
+    """Índice de reglas cacheado en proceso (invalidado al modificar alertas)"""
+
+    def __init__(self, refresh_seconds: Optional[float] = None):
+        self.refresh_seconds = settings.alert_rules_refresh_seconds if refresh_seconds is None else refresh_seconds
+        self._index: Optional[AlertRuleIndex] = None
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+
+    def build(self, db: Session) -> AlertRuleIndex:
+        """Compilar el índice con las alertas activas y no pausadas (solo columnas)"""
+
+        start = time.perf_counter()
+        rows = db.execute(
+            select(
+                Alert.id, Alert.user_id, Alert.city_id, Alert.metric,
+                Alert.operator, Alert.threshold, Alert.unit, Alert.hysteresis, Alert.cooldown_minutes
+            ).where(Alert.active == True, Alert.paused == False)
+        ).all()
+        index = AlertRuleIndex(rows)
+        with self._lock:
+            self._index = index
+            self._built_at = time.monotonic()
+        logger.info("Índice de alertas compilado", rules=index.size,
+                    elapsed_ms=round((time.perf_counter() - start) * 1000, 1))
+        return index
+
+    def index(self, db: Session) -> AlertRuleIndex:
+        """Índice vigente; se recompila si no existe o superó refresh_seconds"""
+
+        index = self._index
+        stale = self.refresh_seconds and time.monotonic() - self._built_at > self.refresh_seconds
+        if index is None or stale:
+            index = self.build(db)
+        return index
+
+    def invalidate(self):
+        """Forzar recompilación en la próxima evaluación"""
+
+        with self._lock:
+            self._index = None
+
+
+# Instancia global: la usa el ETL y la invalidan los endpoints de alertas
+alert_rule_engine = AlertRuleEngine()
@@ -2,124 +2,183 @@
 Servicio para evaluación de alertas meteorológicas
 """
 import structlog
-from datetime import datetime
-from typing import Optional
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set
+from sqlalchemy import insert, select, update
 from sqlalchemy.orm import Session
-from app.models import Alert, AlertHistory, WeatherHourly
-from app.schemas import MetricType, OperatorType
+from app.config import settings
+from app.models import Alert, AlertHistory
+from app.schemas import AlertState
+from app.services.alert_rules import alert_rule_engine, is_cleared, observed_value
+from app.services.alert_stream import alert_broadcaster
 
 logger = structlog.get_logger()
 
 
+def _as_utc(ts: Optional[datetime]) -> Optional[datetime]:
+    """Normalizar timestamps sin zona (SQLite) a UTC"""
+    if ts is not None and ts.tzinfo is None:
+        return ts.replace(tzinfo=timezone.utc)
+    return ts
+
+
+class _TrackedAlert:
+    """Estado en memoria de una alerta no armada durante una evaluación"""
+    
+    __slots__ = ("id", "city_id", "metric", "unit", "operator", "threshold", "hysteresis",
+                 "cooldown_minutes", "state", "state_changed_at", "last_fired_at")
+    
+    def __init__(self, id: int, city_id: int, metric: str, unit: Optional[str], operator: str,
+                 threshold: float, hysteresis: Optional[float], cooldown_minutes: Optional[int],
+                 state: str = AlertState.ARMED.value, state_changed_at: Optional[datetime] = None,
+                 last_fired_at: Optional[datetime] = None):
+        self.id = id
+        self.city_id = city_id
+        self.metric = metric
+        self.unit = unit
+        self.operator = operator
+        self.threshold = threshold
+        self.hysteresis = settings.alert_default_hysteresis if hysteresis is None else hysteresis
+        self.cooldown_minutes = settings.alert_default_cooldown_minutes if cooldown_minutes is None else cooldown_minutes
+        self.state = state
+        self.state_changed_at = _as_utc(state_changed_at)
+        self.last_fired_at = _as_utc(last_fired_at)
+    
+    def cooldown_elapsed(self, ts: datetime) -> bool:
+        return self.last_fired_at is None or ts - self.last_fired_at >= timedelta(minutes=self.cooldown_minutes)
+    
+    def transition(self, state: AlertState, ts: datetime):
+        self.state = state.value
+        self.state_changed_at = ts
+
+
 class AlertService:
     """Servicio para evaluación de alertas"""
     
     def __init__(self, db: Session):
         self.db = db
     
-    async def evaluate_alert(self, alert: Alert, weather_data: WeatherHourly):
-        """Evaluar si una alerta se debe activar"""
+    def _tracked_alerts(self, city_ids: Set[int]) -> Dict[int, _TrackedAlert]:
+        """Alertas activas en estado firing/cleared de las ciudades observadas.
+
+        Las armadas no se leen: se disparan en cuanto el índice las encuentra.
+        """
         
-        try:
-            # Obtener valor observado según la métrica
-            observed_value = self._get_observed_value(alert.metric, weather_data, alert.unit)
-            
-            if observed_value is None:
-                logger.warning("No se pudo obtener valor observado", 
-                             alert_id=alert.id, metric=alert.metric)
-                return
-            
-            # Evaluar condición
-            condition_met = self._evaluate_condition(
-                observed_value, alert.operator, alert.threshold
+        rows = self.db.execute(
+            select(
+                Alert.id, Alert.city_id, Alert.metric, Alert.unit, Alert.operator, Alert.threshold,
+                Alert.hysteresis, Alert.cooldown_minutes, Alert.state, Alert.state_changed_at, Alert.last_fired_at
+            ).where(
+                Alert.city_id.in_(city_ids),
+                Alert.state != AlertState.ARMED.value,
+                Alert.active == True,
+                Alert.paused == False
             )
-            
-            if condition_met:
-                # Crear nuevo registro de alerta activada (sin verificar duplicados)
-                alert_history = AlertHistory(
-                    alert_id=alert.id,
-                    user_id=alert.user_id,
-                    city_id=alert.city_id,
-                    ts=weather_data.ts,
-                    metric=alert.metric,
-                    operator=alert.operator,  # Agregar operador
-                    threshold=alert.threshold,
-                    observed_value=observed_value
-                )
-                
-                self.db.add(alert_history)
-                self.db.commit()
-                
-                logger.info("Alerta activada", 
-                          alert_id=alert.id, 
-                          user_id=alert.user_id,
-                          city_id=alert.city_id,
-                          metric=alert.metric,
-                          operator=alert.operator,
-                          threshold=alert.threshold,
-                          observed_value=observed_value)
-            
-        except Exception as e:
-            logger.error("Error evaluando alerta", alert_id=alert.id, error=str(e))
-            self.db.rollback()
+        ).all()
+        return {row.id: _TrackedAlert(*row) for row in rows}
     
-    def _get_observed_value(self, metric: str, weather_data: WeatherHourly, unit: Optional[str]) -> Optional[float]:
-        """Obtener valor observado según la métrica"""
-        
-        if metric == MetricType.TEMPERATURE:
-            if unit == "c":
-                return weather_data.temp_c
-            elif unit == "f":
-                return (weather_data.temp_c * 9/5) + 32
-            elif unit == "k":
-                return weather_data.temp_c + 273.15
-            else:
-                return weather_data.temp_c
-        
-        elif metric == MetricType.HUMIDITY:
-            return float(weather_data.humidity)
-        
-        elif metric == MetricType.WIND:
-            return weather_data.wind_speed
-        
-        elif metric == MetricType.PRESSURE:
-            return float(weather_data.pressure)
-        
-        elif metric == MetricType.CLOUDS:
-            return float(weather_data.clouds)
+    def evaluate_observations(self, rows: Iterable[Mapping[str, Any]]) -> int:
+        """Evaluar todas las alertas contra observaciones nuevas (dicts de weather_hourly).
+
+        Cada alerta sigue la máquina de estados armed -> firing -> cleared y en
+        alert_history solo se registra la transición a firing (si ya pasó el cooldown
+        desde la anterior). Mientras sigue disparada no escribe nada; se despeja cuando
+        el valor sale del umbral más la histéresis y vuelve a armarse tras el cooldown.
+
+        Las reglas se buscan en el índice compilado, el estado se lee solo de las alertas
+        no armadas de las ciudades observadas y los cambios se escriben con un UPDATE y
+        un INSERT masivos en un único commit. Tras el commit las activaciones se publican
+        a los clientes de /alerts/stream. Devuelve las activaciones registradas.
+        """
         
-        elif metric == MetricType.VISIBILITY:
-            return float(weather_data.visibility) if weather_data.visibility else None
-        
-        else:
-            logger.warning("Métrica no reconocida", metric=metric)
-            return None
-    
-    def _evaluate_condition(self, observed_value: float, operator: str, threshold: float) -> bool:
-        """Evaluar condición de alerta"""
+        rows = sorted(rows, key=lambda row: _as_utc(row["ts"]))
+        if not rows:
+            return 0
         
         try:
-            if operator == OperatorType.GREATER_THAN:
-                return observed_value > threshold
-            elif operator == OperatorType.LESS_THAN:
-                return observed_value < threshold
-            elif operator == OperatorType.EQUAL:
-                return abs(observed_value - threshold) < 0.1  # Tolerancia para igualdad
-            elif operator == OperatorType.GREATER_EQUAL:
-                return observed_value >= threshold
-            elif operator == OperatorType.LESS_EQUAL:
-                return observed_value <= threshold
-            else:
-                logger.warning("Operador no reconocido", operator=operator)
-                return False
+            index = alert_rule_engine.index(self.db)
+            tracked = self._tracked_alerts({row["city_id"] for row in rows})
+            by_city: Dict[int, List[_TrackedAlert]] = {}
+            for alert in tracked.values():
+                by_city.setdefault(alert.city_id, []).append(alert)
+            
+            history = []
+            changed: Set[int] = set()
+            for row in rows:
+                city_id = row["city_id"]
+                ts = _as_utc(row["ts"])
+                matched = set()
                 
+                for metric, unit, operator, (alert_id, user_id, threshold, hysteresis, cooldown), value in index.match(row):
+                    matched.add(alert_id)
+                    alert = tracked.get(alert_id)
+                    if alert is None:
+                        alert = _TrackedAlert(alert_id, city_id, metric, unit, operator, threshold, hysteresis, cooldown)
+                        tracked[alert_id] = alert
+                        by_city.setdefault(city_id, []).append(alert)
+                    elif alert.state == AlertState.FIRING:
+                        continue
+                    
+                    # Dentro del cooldown vuelve a firing sin registrar otra activación
+                    if alert.cooldown_elapsed(ts):
+                        history.append({
+                            "alert_id": alert_id,
+                            "user_id": user_id,
+                            "city_id": city_id,
+                            "ts": ts,
+                            "metric": metric,
+                            "operator": operator,
+                            "threshold": threshold,
+                            "observed_value": value
+                        })
+                        alert.last_fired_at = ts
+                    alert.transition(AlertState.FIRING, ts)
+                    changed.add(alert_id)
+                
+                for alert in by_city.get(city_id, ()):
+                    if alert.id in matched:
+                        continue
+                    if alert.state == AlertState.FIRING:
+                        value = observed_value(alert.metric, row, alert.unit)
+                        if value is not None and is_cleared(alert.operator, value, alert.threshold, alert.hysteresis):
+                            alert.transition(AlertState.CLEARED, ts)
+                            changed.add(alert.id)
+                    elif alert.state == AlertState.CLEARED and alert.cooldown_elapsed(ts):
+                        alert.transition(AlertState.ARMED, ts)
+                        changed.add(alert.id)
+            
+            if not changed:
+                return 0
+            
+            self.db.execute(update(Alert), [
+                {
+                    "id": alert_id,
+                    "state": tracked[alert_id].state,
+                    "state_changed_at": tracked[alert_id].state_changed_at,
+                    "last_fired_at": tracked[alert_id].last_fired_at
+                }
+                for alert_id in changed
+            ])
+            if history:
+                # Los ids identifican cada evento del stream (Last-Event-ID en el cliente)
+                ids = self.db.execute(
+                    insert(AlertHistory).returning(AlertHistory.id, sort_by_parameter_order=True), history
+                ).scalars().all()
+                for row, history_id in zip(history, ids):
+                    row["id"] = history_id
+            self.db.commit()
+            alert_broadcaster.publish(history)
+            
+            logger.info("Estados de alerta actualizados",
+                        activations=len(history),
+                        transitions=len(changed),
+                        cities=len({row["city_id"] for row in history}))
+            return len(history)
+            
         except Exception as e:
-            logger.error("Error evaluando condición", 
-                        observed_value=observed_value, 
-                        operator=operator, 
-                        threshold=threshold, 
-                        error=str(e))
-            return False
+            logger.error("Error evaluando alertas", error=str(e))
+            self.db.rollback()
+            return 0
     
     async def get_active_alerts_for_user(self, user_id: int, city_id: Optional[int] = None) -> list:
         """Obtener alertas activas para un usuario"""
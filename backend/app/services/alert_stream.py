@@ -0,0 +1,184 @@
+"""
+Difusión en proceso de activaciones de alertas a los clientes de /alerts/stream (SSE)
+"""
+import asyncio
+import json
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+from app.config import settings
+
+# Campos de alert_history que se envían en cada evento
+EVENT_FIELDS = ("id", "alert_id", "city_id", "ts", "metric", "operator", "threshold", "observed_value")
+
+
+class AlertStreamFullError(RuntimeError):
+    """Límite de clientes conectados alcanzado: la conexión debe rechazarse (503)"""
+
+
+def format_event(row: Mapping[str, Any]) -> str:
+    """Trama SSE de una activación (se serializa una vez y se comparte entre suscriptores)"""
+
+    data = {
+        field: value.isoformat() if isinstance(value, datetime) else value
+        for field, value in ((field, row.get(field)) for field in EVENT_FIELDS)
+    }
+    frame = f"event: alert\ndata: {json.dumps(data)}\n\n"
+    if data["id"] is not None:
+        frame = f"id: {data['id']}\n{frame}"
+    return frame
+
+
+class AlertSubscription:
+    """Cola acotada de tramas de un cliente conectado.
+
+    Solo se usa desde el event loop que atiende la conexión: los publicadores de
+    otros hilos entregan con call_soon_threadsafe. Un cliente en espera solo ocupa
+    un future y un temporizador del loop (sin tareas adicionales).
+    """
+
+    def __init__(self, user_id: int, loop: asyncio.AbstractEventLoop, max_queue: int):
+        self.user_id = user_id
+        self.loop = loop
+        self.max_queue = max(1, max_queue)
+        self.dropped = 0
+        self._frames: Deque[str] = deque()
+        self._waiter: Optional[asyncio.Future] = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._frames)
+
+    def deliver(self, frames: List[str]):
+        """Encolar tramas; con la cola llena se descartan las más antiguas (el ETL nunca espera)"""
+
+        for frame in frames:
+            if len(self._frames) >= self.max_queue:
+                self._frames.popleft()
+                self.dropped += 1
+            self._frames.append(frame)
+        self._wake()
+
+    def _wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def next_frames(self, timeout: float) -> List[str]:
+        """Tramas pendientes (espera hasta `timeout` segundos; lista vacía si no llega nada)"""
+
+        if not self._frames:
+            self._waiter = self.loop.create_future()
+            timer = self.loop.call_later(timeout, self._wake)
+            try:
+                await self._waiter
+            finally:
+                timer.cancel()
+                self._waiter = None
+        frames = list(self._frames)
+        self._frames.clear()
+        return frames
+
+    def take_dropped(self) -> int:
+        """Tramas descartadas desde la última llamada"""
+
+        dropped, self.dropped = self.dropped, 0
+        return dropped
+
+
+def _deliver_batch(batch: List[Tuple[AlertSubscription, List[str]]]):
+    for subscription, frames in batch:
+        subscription.deliver(frames)
+
+
+class AlertBroadcaster:
+    """Suscriptores por usuario y entrega de las activaciones que registra el ETL.
+
+    La difusión es en proceso: solo reciben eventos los clientes conectados al
+    mismo worker que ejecuta el ETL (scheduler interno o /etl/run).
+    """
+
+    def __init__(self, queue_size: int, max_subscribers: int):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._subscribers: Dict[int, Set[AlertSubscription]] = {}
+        self._count = 0
+        self._lock = threading.Lock()
+
+        # Métricas
+        self.published = 0
+        self.rejected = 0
+
+    def subscribe(self, user_id: int) -> AlertSubscription:
+        """Registrar un cliente desde el event loop que atiende su conexión"""
+
+        subscription = AlertSubscription(user_id, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                self.rejected += 1
+                raise AlertStreamFullError("Demasiados clientes conectados al stream de alertas, inténtalo más tarde")
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+            self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: AlertSubscription):
+        """Dar de baja un cliente (idempotente)"""
+
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.user_id)
+            if subscriptions is None or subscription not in subscriptions:
+                return
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscribers[subscription.user_id]
+            self._count -= 1
+
+    def publish(self, rows: Iterable[Mapping[str, Any]]) -> int:
+        """Enviar activaciones (dicts de alert_history) a los clientes de cada usuario.
+
+        Seguro desde cualquier hilo; no bloquea aunque haya clientes lentos.
+        Devuelve el número de entregas (suscriptor, lote).
+        """
+
+        frames_by_user: Dict[int, List[str]] = {}
+        for row in rows:
+            frames_by_user.setdefault(row["user_id"], []).append(format_event(row))
+        if not frames_by_user:
+            return 0
+
+        with self._lock:
+            self.published += sum(len(frames) for frames in frames_by_user.values())
+            # Un solo aviso por event loop (normalmente uno por worker) para todos sus clientes
+            batches: Dict[asyncio.AbstractEventLoop, List[Tuple[AlertSubscription, List[str]]]] = {}
+            for user_id, frames in frames_by_user.items():
+                for subscription in self._subscribers.get(user_id, ()):
+                    batches.setdefault(subscription.loop, []).append((subscription, frames))
+
+        deliveries = 0
+        for loop, batch in batches.items():
+            try:
+                loop.call_soon_threadsafe(_deliver_batch, batch)
+                deliveries += len(batch)
+            except RuntimeError:
+                # Event loop cerrado: sus clientes ya no pueden recibir nada
+                for subscription, _ in batch:
+                    self.unsubscribe(subscription)
+        return deliveries
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Estado de los suscriptores para /health y logs"""
+
+        with self._lock:
+            subscriptions = [s for group in self._subscribers.values() for s in group]
+            return {
+                "subscribers": self._count,
+                "users": len(self._subscribers),
+                "max_subscribers": self.max_subscribers,
+                "queued": sum(s.pending for s in subscriptions),
+                "published": self.published,
+                "rejected": self.rejected
+            }
+
+
+# Instancia global: publica el servicio de alertas y consume /alerts/stream
+alert_broadcaster = AlertBroadcaster(settings.alert_stream_queue_size, settings.alert_stream_max_subscribers)
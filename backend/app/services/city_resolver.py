@@ -0,0 +1,211 @@
+"""
+Resolución de nombres de ciudad con índice en memoria (exacto + prefijo)
+"""
+import bisect
+import copy
+import threading
+import time
+import unicodedata
+import structlog
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models import City
+from app.utils.city_normalizer import CITY_ALIASES
+
+logger = structlog.get_logger()
+
+
+def fold_city_name(name: str) -> str:
+    """Clave de búsqueda: sin acentos, minúsculas y espacios normalizados"""
+
+    if not name:
+        return ""
+    if not name.isascii():
+        decomposed = unicodedata.normalize("NFKD", name)
+        name = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(name.replace("_", " ").casefold().split())
+
+
+def _word_keys(key: str) -> List[str]:
+    """Claves de prefijo de un nombre: cada palabra inicia una ("york" -> "new york")"""
+
+    words = key.split(" ")
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+
+def _fold_aliases() -> Dict[str, List[str]]:
+    """Alias de CITY_ALIASES agrupados por nombre oficial plegado"""
+
+    aliases: Dict[str, List[str]] = {}
+    for alias, official in CITY_ALIASES.items():
+        alias_key, official_key = fold_city_name(alias), fold_city_name(official)
+        if alias_key != official_key and alias_key not in aliases.setdefault(official_key, []):
+            aliases[official_key].append(alias_key)
+    return aliases
+
+
+_ALIASES_BY_NAME = _fold_aliases()
+
+
+class _CityIndex:
+    """Instantánea inmutable del catálogo: se reemplaza entera al refrescar"""
+
+    def __init__(self, rows: Iterable[Tuple[int, str, Optional[str]]]):
+        rows = sorted(rows, key=lambda row: row[0])
+        self.countries: Dict[int, str] = {}
+        self.exact: Dict[str, List[int]] = {}
+        self.aliases: Dict[str, str] = {}
+        prefix: set = set()
+        folded_countries: Dict[Optional[str], str] = {}
+
+        for city_id, name, country in rows:
+            if country not in folded_countries:
+                folded_countries[country] = fold_city_name(country or "")
+            self.countries[city_id] = folded_countries[country]
+            key = fold_city_name(name)
+            if not key:
+                continue
+            self.exact.setdefault(key, []).append(city_id)
+            prefix.update((search_key, city_id) for search_key in self._search_keys(key))
+
+        # Orden (clave, id): la primera coincidencia de un prefijo es determinista
+        self.prefix_keys: List[str] = []
+        self.prefix_ids: List[int] = []
+        for key, city_id in sorted(prefix):
+            self.prefix_keys.append(key)
+            self.prefix_ids.append(city_id)
+
+    def with_city(self, city_id: int, name: str, country: Optional[str]) -> "_CityIndex":
+        """Copia del índice con una ciudad más (sin reconstruir el catálogo)"""
+
+        index = copy.copy(self)
+        index.countries = dict(self.countries)
+        index.countries[city_id] = fold_city_name(country or "")
+        key = fold_city_name(name)
+        if not key:
+            return index
+
+        index.exact = dict(self.exact)
+        index.exact[key] = sorted(self.exact.get(key, []) + [city_id])
+        index.aliases = dict(self.aliases)
+        index.prefix_keys = list(self.prefix_keys)
+        index.prefix_ids = list(self.prefix_ids)
+        for word_key in index._search_keys(key):
+            # Mantener el orden (clave, id) de la construcción completa
+            position = bisect.bisect_left(index.prefix_keys, word_key)
+            end = bisect.bisect_right(index.prefix_keys, word_key)
+            position += bisect.bisect_left(index.prefix_ids[position:end], city_id)
+            index.prefix_keys.insert(position, word_key)
+            index.prefix_ids.insert(position, city_id)
+        return index
+
+    def _search_keys(self, key: str) -> List[str]:
+        """Claves de prefijo de un nombre más sus alias (registrados en self.aliases)"""
+
+        search_keys = _word_keys(key)
+        for alias_key in _ALIASES_BY_NAME.get(key, ()):
+            self.aliases[alias_key] = key
+            search_keys.append(alias_key)
+        return search_keys
+
+    def lookup(self, key: str, country: str = "") -> Optional[int]:
+        """Coincidencia exacta (O(1)) y, si no hay, por prefijo (O(log n))"""
+
+        # Un nombre real tiene prioridad sobre un alias con la misma grafía
+        city_ids = self.exact.get(key) or self.exact.get(self.aliases.get(key), ())
+        for city_id in city_ids:
+            if not country or self.countries.get(city_id) == country:
+                return city_id
+
+        start = bisect.bisect_left(self.prefix_keys, key)
+        for position in range(start, len(self.prefix_keys)):
+            if not self.prefix_keys[position].startswith(key):
+                break
+            city_id = self.prefix_ids[position]
+            if not country or self.countries.get(city_id) == country:
+                return city_id
+        return None
+
+
+class CityResolver:
+    """Resolver nombres de ciudad (con alias y acentos) a filas de cities"""
+
+    def __init__(self, refresh_seconds: Optional[float] = None):
+        self.refresh_seconds = settings.city_resolver_refresh_seconds if refresh_seconds is None else refresh_seconds
+        self._index: Optional[_CityIndex] = None
+        self._signature: Optional[Tuple[int, Optional[int]]] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def build(self, rows: Iterable[Tuple[int, str, Optional[str]]]):
+        """Construir el índice a partir de tuplas (id, nombre, país)"""
+
+        rows = list(rows)
+        index = _CityIndex(rows)
+        with self._lock:
+            self._index = index
+            self._signature = (len(rows), max((row[0] for row in rows), default=None))
+            self._checked_at = time.monotonic()
+        logger.info("Índice de ciudades construido", cities=len(rows), keys=len(index.prefix_keys))
+
+    def refresh(self, db: Session):
+        """Recargar el catálogo completo desde la base de datos"""
+
+        self.build(db.query(City.id, City.name, City.country).all())
+
+    def add(self, city: City):
+        """Incorporar una ciudad recién creada sin recargar el catálogo"""
+
+        with self._lock:
+            if self._index is None:
+                return
+            self._index = self._index.with_city(city.id, city.name, city.country)
+            count, max_id = self._signature
+            self._signature = (count + 1, max(max_id or 0, city.id))
+
+    def invalidate(self):
+        """Forzar recarga en la próxima resolución"""
+
+        with self._lock:
+            self._index = None
+
+    def _current_index(self, db: Session) -> _CityIndex:
+        if self._index is None:
+            self.refresh(db)
+        elif self.refresh_seconds and time.monotonic() - self._checked_at > self.refresh_seconds:
+            # Ciudades creadas o borradas por otros procesos: comprobar con count/max(id)
+            self._checked_at = time.monotonic()
+            count, max_id = db.query(func.count(City.id), func.max(City.id)).one()
+            if (count, max_id) != self._signature:
+                self.refresh(db)
+        return self._index
+
+    def resolve_id(self, db: Session, name: str, country: Optional[str] = None) -> Optional[int]:
+        """ID de la ciudad para un nombre ("Madrid", "madrid, es", "nueva_york")"""
+
+        if country is None and "," in (name or ""):
+            name, country = name.rsplit(",", 1)
+        key = fold_city_name(name)
+        if not key:
+            return None
+        return self._current_index(db).lookup(key, fold_city_name(country or ""))
+
+    def resolve(self, db: Session, name: str, country: Optional[str] = None) -> Optional[City]:
+        """Ciudad para un nombre; None si no existe"""
+
+        city_id = self.resolve_id(db, name, country)
+        if city_id is None:
+            return None
+
+        city = db.get(City, city_id)
+        if city is None:
+            # Ciudad borrada desde la última carga: reconstruir y reintentar una vez
+            self.refresh(db)
+            city_id = self.resolve_id(db, name, country)
+            city = db.get(City, city_id) if city_id is not None else None
+        return city
+
+
+city_resolver = CityResolver()
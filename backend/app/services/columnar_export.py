@@ -0,0 +1,136 @@
+"""
+Exportación columnar (Parquet / Arrow IPC) construida por lotes desde el cursor
+"""
+from typing import Any, Callable, Iterable, Iterator, List, Sequence, Tuple
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.schemas import ExportFormat
+
+# Filas por row group / record batch (memoria acotada durante la exportación)
+ROW_GROUP_SIZE = 32_768
+
+MEDIA_TYPES = {
+    ExportFormat.PARQUET: "application/vnd.apache.parquet",
+    ExportFormat.ARROW: "application/vnd.apache.arrow.stream",
+}
+
+FILE_EXTENSIONS = {
+    ExportFormat.CSV: "csv",
+    ExportFormat.PARQUET: "parquet",
+    ExportFormat.ARROW: "arrow",
+}
+
+
+def _pyarrow():
+    """Importar pyarrow bajo demanda (dependencia opcional)"""
+
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as exc:
+        raise RuntimeError("pyarrow no está instalado: exportación parquet/arrow no disponible") from exc
+    return pyarrow
+
+
+def columnar_available() -> bool:
+    """Indicar si los formatos parquet/arrow pueden servirse"""
+
+    try:
+        _pyarrow()
+    except RuntimeError:
+        return False
+    return True
+
+
+class _ChunkSink:
+    """Destino de escritura que acumula bytes hasta que el generador los envía"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _arrow_schema(pa, columns: Sequence[Tuple[str, str]]):
+    types = {
+        "int": pa.int32(),
+        "float": pa.float32(),
+        "string": pa.string(),
+        # Valores muy repetidos (weather_main, descripción, ciudad): codificación por diccionario
+        "category": pa.dictionary(pa.int32(), pa.string()),
+        "timestamp": pa.timestamp("us", tz="UTC"),
+        "bool": pa.bool_(),
+    }
+    return pa.schema([pa.field(name, types[kind]) for name, kind in columns])
+
+
+def _record_batch(pa, schema, values: List[List[Any]]):
+    arrays = []
+    for field, column in zip(schema, values):
+        if pa.types.is_dictionary(field.type):
+            arrays.append(pa.array(column, type=pa.string()).dictionary_encode())
+        else:
+            arrays.append(pa.array(column, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def stream_columnar(
+    export_format: ExportFormat,
+    columns: Sequence[Tuple[str, str]],
+    produce_rows: Callable[[Session], Iterable[Sequence[Any]]]
+) -> Iterator[bytes]:
+    """Generador de bloques Parquet o Arrow IPC (stream) para StreamingResponse.
+
+    `columns` son pares (nombre, tipo lógico) en el orden de las filas de `produce_rows`;
+    tipos: int, float, string, category, timestamp, bool. Cada lote de ROW_GROUP_SIZE
+    filas es un row group (Parquet) o un record batch (Arrow) y se envía al cerrarse.
+    """
+
+    pa = _pyarrow()
+    schema = _arrow_schema(pa, columns)
+    sink = _ChunkSink()
+    if export_format == ExportFormat.PARQUET:
+        writer = pa.parquet.ParquetWriter(sink, schema, compression="snappy")
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+
+    db = SessionLocal()
+    try:
+        values: List[List[Any]] = [[] for _ in columns]
+        pending = 0
+        for row in produce_rows(db):
+            for column, value in zip(values, row):
+                column.append(value)
+            pending += 1
+            if pending >= ROW_GROUP_SIZE:
+                writer.write_batch(_record_batch(pa, schema, values))
+                values = [[] for _ in columns]
+                pending = 0
+                yield sink.drain()
+
+        if pending:
+            writer.write_batch(_record_batch(pa, schema, values))
+        writer.close()
+        yield sink.drain()
+    finally:
+        db.close()
@@ -0,0 +1,47 @@
+"""
+Motor de datos para comparaciones multi-ciudad (/weather/compare*)
+"""
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+from app.models import City
+from app.services.city_resolver import city_resolver
+from app.services.series_service import SeriesService, WEATHER_DATA_COLUMNS
+
+
+class CompareService:
+    """Resuelve ciudades y series de todas ellas en dos consultas en total"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def resolve_cities(self, names: List[str]) -> List[Optional[City]]:
+        """Ciudades para cada nombre (None si no existe) con una sola consulta"""
+
+        city_ids = [city_resolver.resolve_id(self.db, name) for name in names]
+        wanted = {city_id for city_id in city_ids if city_id is not None}
+        if not wanted:
+            return [None] * len(names)
+
+        cities = {
+            city.id: city
+            for city in self.db.query(City).filter(City.id.in_(wanted)).all()
+        }
+        if len(cities) != len(wanted):
+            # Alguna ciudad se borró tras cargar el índice: recargarlo en la próxima resolución
+            city_resolver.invalidate()
+
+        return [cities.get(city_id) if city_id is not None else None for city_id in city_ids]
+
+    def fetch_series(
+        self,
+        city_ids: List[int],
+        from_date: datetime,
+        to_date: datetime,
+        limit: int,
+        columns: Sequence[str] = WEATHER_DATA_COLUMNS
+    ) -> Dict[int, List[Row]]:
+        """Series por ciudad (orden ascendente, máx. `limit` filas por ciudad) en una consulta"""
+
+        return SeriesService(self.db).fetch_many(city_ids, columns, from_date, to_date, limit)
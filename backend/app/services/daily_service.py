@@ -0,0 +1,164 @@
+"""
+Agregados diarios (weather_daily): rollup incremental, backfill y lectura
+"""
+import structlog
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import Date, cast, func, select
+from sqlalchemy.orm import Session
+from app.database import dialect_insert
+from app.models import WeatherHourly, WeatherDaily
+
+logger = structlog.get_logger()
+
+# Columnas recalculadas en cada rollup
+DAILY_COLUMNS = ["temp_min", "temp_max", "temp_avg", "humidity_avg", "precip_total"]
+
+# Filas por sentencia INSERT (límite de parámetros de SQLite/PostgreSQL)
+UPSERT_CHUNK_SIZE = 1000
+
+
+def _day_start(day: date) -> datetime:
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+
+class DailyWeatherService:
+    """Rollup de weather_hourly a weather_daily por (ciudad, día UTC)"""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.dialect = db.get_bind().dialect.name
+
+    def _day_expression(self):
+        """Día UTC de cada observación"""
+
+        if self.dialect == "postgresql":
+            return cast(func.timezone("UTC", WeatherHourly.ts), Date)
+        return func.date(WeatherHourly.ts)
+
+    def _aggregate(
+        self,
+        city_ids: Optional[Iterable[int]] = None,
+        from_day: Optional[date] = None,
+        to_day: Optional[date] = None
+    ) -> List[Dict[str, Any]]:
+        """Agregados por (ciudad, día) calculados en SQL"""
+
+        day = self._day_expression().label("day")
+        stmt = select(
+            WeatherHourly.city_id,
+            day,
+            func.min(WeatherHourly.temp_c).label("temp_min"),
+            func.max(WeatherHourly.temp_c).label("temp_max"),
+            func.avg(WeatherHourly.temp_c).label("temp_avg"),
+            func.avg(WeatherHourly.humidity).label("humidity_avg"),
+        ).group_by(WeatherHourly.city_id, day)
+
+        if city_ids is not None:
+            stmt = stmt.where(WeatherHourly.city_id.in_(set(city_ids)))
+        if from_day is not None:
+            stmt = stmt.where(WeatherHourly.ts >= _day_start(from_day))
+        if to_day is not None:
+            stmt = stmt.where(WeatherHourly.ts < _day_start(to_day + timedelta(days=1)))
+
+        rows = []
+        for row in self.db.execute(stmt):
+            rows.append({
+                "city_id": row.city_id,
+                # SQLite devuelve date() como texto ISO
+                "day": date.fromisoformat(row.day) if isinstance(row.day, str) else row.day,
+                "temp_min": row.temp_min,
+                "temp_max": row.temp_max,
+                "temp_avg": float(row.temp_avg) if row.temp_avg is not None else None,
+                "humidity_avg": float(row.humidity_avg) if row.humidity_avg is not None else None,
+                # weather_hourly no guarda precipitación
+                "precip_total": None,
+            })
+        return rows
+
+    def _upsert(self, rows: List[Dict[str, Any]]):
+        """UPSERT de weather_daily sobre la restricción unique_city_day"""
+
+        if not rows:
+            return
+
+        upsert_insert = dialect_insert(self.db)
+        if upsert_insert is None:
+            for row in rows:
+                existing = self.db.query(WeatherDaily).filter(
+                    WeatherDaily.city_id == row["city_id"],
+                    WeatherDaily.day == row["day"]
+                ).first()
+                if existing:
+                    for column in DAILY_COLUMNS:
+                        setattr(existing, column, row[column])
+                else:
+                    self.db.add(WeatherDaily(**row))
+            self.db.flush()
+            return
+
+        for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+            stmt = upsert_insert(WeatherDaily.__table__).values(rows[start:start + UPSERT_CHUNK_SIZE])
+            set_ = {column: stmt.excluded[column] for column in DAILY_COLUMNS}
+            if self.dialect == "postgresql":
+                stmt = stmt.on_conflict_do_update(constraint="unique_city_day", set_=set_)
+            else:
+                stmt = stmt.on_conflict_do_update(index_elements=["city_id", "day"], set_=set_)
+            self.db.execute(stmt)
+
+    def rollup(self, pairs: Iterable[Tuple[int, date]]) -> int:
+        """Recalcular solo los pares (ciudad, día) tocados por una carga (sin commit)"""
+
+        pairs: Set[Tuple[int, date]] = set(pairs)
+        if not pairs:
+            return 0
+
+        days = [day for _, day in pairs]
+        rows = [
+            row for row in self._aggregate({city_id for city_id, _ in pairs}, min(days), max(days))
+            if (row["city_id"], row["day"]) in pairs
+        ]
+        self._upsert(rows)
+        return len(rows)
+
+    def backfill(
+        self,
+        city_ids: Optional[Iterable[int]] = None,
+        from_day: Optional[date] = None,
+        to_day: Optional[date] = None
+    ) -> int:
+        """Recalcular el histórico (o un rango) ciudad a ciudad, con un commit por ciudad"""
+
+        if city_ids is None:
+            city_ids = [
+                city_id for (city_id,) in
+                self.db.query(WeatherHourly.city_id).distinct().order_by(WeatherHourly.city_id)
+            ]
+
+        total = 0
+        for city_id in city_ids:
+            rows = self._aggregate([city_id], from_day, to_day)
+            self._upsert(rows)
+            self.db.commit()
+            total += len(rows)
+            logger.info("Backfill de weather_daily", city_id=city_id, days=len(rows))
+
+        return total
+
+    def backfill_if_empty(self) -> int:
+        """Rellenar weather_daily desde weather_hourly si está vacía (arranque)"""
+
+        if self.db.query(WeatherDaily.id).first() is not None:
+            return 0
+        if self.db.query(WeatherHourly.id).first() is None:
+            return 0
+        return self.backfill()
+
+    def fetch(self, city_id: int, from_date: datetime, to_date: datetime, limit: int) -> List[WeatherDaily]:
+        """Días de una ciudad dentro del rango, en orden ascendente"""
+
+        return self.db.query(WeatherDaily).filter(
+            WeatherDaily.city_id == city_id,
+            WeatherDaily.day >= from_date.date(),
+            WeatherDaily.day <= to_date.date()
+        ).order_by(WeatherDaily.day.asc()).limit(limit).all()
@@ -1,20 +1,30 @@
 """
 Servicio ETL para extracción de datos de OpenWeatherMap
 """
-import requests
-import json
+import httpx
 import structlog
+import time
 from datetime import datetime, timedelta, timezone
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
 from app.config import settings
-from app.models import City, WeatherRaw, WeatherHourly, Alert, AlertHistory
+from app.models import City, WeatherHourly
 from app.services.alert_service import AlertService
+from app.services.openweather_client import OpenWeatherClient
+from app.services.rate_limiter import get_rate_limiter
+from app.services.weather_loader import WeatherLoader
+from app.services.latest_weather import get_latest_timestamps
 
 logger = structlog.get_logger()
 
 
+def _as_utc(ts: Optional[datetime]) -> Optional[datetime]:
+    """Normalizar timestamps sin zona (SQLite) a UTC"""
+    if ts is not None and ts.tzinfo is None:
+        return ts.replace(tzinfo=timezone.utc)
+    return ts
+
+
 class ETLService:
     """Servicio para operaciones ETL"""
     
@@ -33,22 +43,51 @@ class ETLService:
         processed = 0
         errors = []
         
-        for city in cities:
-            try:
-                await self.run_etl_for_city(city.id, force_update)
-                processed += 1
-                logger.info("ETL completado para ciudad", city_id=city.id, city_name=city.name)
-            except Exception as e:
-                error_msg = f"Error procesando ciudad {city.name} (ID: {city.id}): {str(e)}"
-                errors.append(error_msg)
-                logger.error("Error en ETL de ciudad", city_id=city.id, error=str(e))
+        # Planificar: descartar ciudades con datos recientes antes de ir a la red
+        pending = self._plan_run(cities, force_update)
+        skipped = len(cities) - len(pending)
+        logger.info("Plan de ETL calculado", pending=len(pending), skipped=skipped)
         
-        logger.info("ETL completado", processed=processed, errors=len(errors))
+        # Extraer en paralelo con un único cliente HTTP compartido
+        async with OpenWeatherClient(self.base_url, self.api_key) as client:
+            if settings.etl_use_group_endpoint:
+                fetched = await client.fetch_cities_batched(pending)
+            else:
+                fetched = await client.fetch_cities(pending)
+            quota = client.limiter.snapshot()
+        
+        records = []
+        city_names = {}
+        for city, weather_data, error in fetched:
+            if error is not None or not weather_data:
+                reason = (str(error) or type(error).__name__) if error is not None else "No se pudieron obtener datos de OpenWeatherMap"
+                errors.append(f"Error procesando ciudad {city.name} (ID: {city.id}): {reason}")
+                continue
+            records.append((city.id, weather_data))
+            city_names[city.id] = city.name
+        
+        # Cargar por lotes (settings.etl_batch_size) con UPSERT masivo
+        load_result = WeatherLoader(self.db).load(records)
+        for city_id, error in load_result["errors"]:
+            errors.append(f"Error procesando ciudad {city_names[city_id]} (ID: {city_id}): {error}")
+            logger.error("Error en ETL de ciudad", city_id=city_id, error=error)
+        
+        # Alertas de todas las observaciones cargadas en una sola pasada
+        self._evaluate_alerts(load_result["loaded"])
+        
+        for city_id in dict.fromkeys(row["city_id"] for row in load_result["loaded"]):
+            processed += 1
+            logger.info("ETL completado para ciudad", city_id=city_id, city_name=city_names[city_id])
+        
+        logger.info("ETL completado", processed=processed + skipped, skipped=skipped, errors=len(errors),
+                    quota_remaining=quota["quota_remaining"])
         
         return {
-            "processed": processed,
+            "processed": processed + skipped,
+            "skipped": skipped,
             "errors": errors,
-            "total_cities": len(cities)
+            "total_cities": len(cities),
+            "quota_remaining": quota["quota_remaining"]
         }
     
     async def run_etl_for_city(self, city_id: int, force_update: bool = False) -> Dict[str, Any]:
@@ -61,14 +100,9 @@ class ETLService:
         logger.info("Iniciando ETL para ciudad", city_id=city_id, city_name=city.name)
         
         # Verificar si necesitamos actualizar (última actualización hace más de 1 hora)
-        if not force_update:
-            last_update = self.db.query(WeatherHourly).filter(
-                WeatherHourly.city_id == city_id
-            ).order_by(WeatherHourly.ts.desc()).first()
-            
-            if last_update and last_update.ts > datetime.now(timezone.utc) - timedelta(hours=1):
-                logger.info("Datos recientes encontrados, saltando ETL", city_id=city_id)
-                return {"status": "skipped", "reason": "recent_data_available"}
+        if not self._plan_run([city], force_update):
+            logger.info("Datos recientes encontrados, saltando ETL", city_id=city_id)
+            return {"status": "skipped", "reason": "recent_data_available"}
         
         # Extraer datos de OpenWeatherMap
         weather_data = await self._extract_weather_data(city)
@@ -77,161 +111,83 @@ class ETLService:
             raise ValueError("No se pudieron obtener datos de OpenWeatherMap")
         
         # Transformar y cargar datos
-        result = await self._transform_and_load(city, weather_data)
+        result, loaded_row = await self._transform_and_load(city, weather_data)
         
         # Evaluar alertas
-        await self._evaluate_alerts(city_id)
+        self._evaluate_alerts([loaded_row])
         
         logger.info("ETL completado para ciudad", city_id=city_id, result=result)
         
         return result
     
+    def _latest_timestamps(self, city_ids: Optional[List[int]] = None) -> Dict[int, datetime]:
+        """Último ts por ciudad (una fila por ciudad en weather_latest)"""
+        
+        latest = get_latest_timestamps(self.db, city_ids)
+        
+        return {city_id: _as_utc(ts) for city_id, ts in latest.items()}
+    
+    def _plan_run(self, cities: List[City], force_update: bool = False) -> List[City]:
+        """Ciudades sin datos de la última hora (las que hay que extraer)"""
+        
+        if force_update:
+            return list(cities)
+        
+        city_ids = [city.id for city in cities] if len(cities) == 1 else None
+        latest = self._latest_timestamps(city_ids)
+        threshold = datetime.now(timezone.utc) - timedelta(hours=1)
+        
+        return [
+            city for city in cities
+            if latest.get(city.id) is None or latest[city.id] <= threshold
+        ]
+    
     async def _extract_weather_data(self, city: City) -> Optional[Dict[str, Any]]:
         """Extraer datos de OpenWeatherMap API"""
         
         try:
-            # Construir URL para Current Weather API
-            url = f"{self.base_url}/weather"
-            params = {
-                "q": f"{city.name},{city.country}" if city.country else city.name,
-                "appid": self.api_key,
-                "units": "metric"  # Obtener en Celsius
-            }
-            
-            # Si tenemos coordenadas, usarlas para mayor precisión
-            if city.lat and city.lon:
-                params = {
-                    "lat": city.lat,
-                    "lon": city.lon,
-                    "appid": self.api_key,
-                    "units": "metric"
-                }
+            logger.info("Solicitando datos de OpenWeatherMap", city_id=city.id)
             
-            logger.info("Solicitando datos de OpenWeatherMap", url=url, params=params)
+            async with OpenWeatherClient(self.base_url, self.api_key, concurrency=1) as client:
+                data = await client.fetch_city(city)
             
-            response = requests.get(url, params=params, timeout=30)
-            response.raise_for_status()
-            
-            data = response.json()
             logger.info("Datos obtenidos de OpenWeatherMap", city_id=city.id, data_keys=list(data.keys()))
             
             return data
             
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error("Error en request a OpenWeatherMap", city_id=city.id, error=str(e))
             raise
         except Exception as e:
             logger.error("Error extrayendo datos meteorológicos", city_id=city.id, error=str(e))
             raise
     
-    async def _transform_and_load(self, city: City, raw_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Transformar y cargar datos en la base de datos"""
+    async def _transform_and_load(self, city: City, raw_data: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Transformar y cargar datos en la base de datos (resultado y fila cargada)"""
         
-        try:
-            # Guardar datos raw
-            raw_record = WeatherRaw(
-                city_id=city.id,
-                fetched_at=datetime.now(timezone.utc),
-                data=json.dumps(raw_data)
-            )
-            self.db.add(raw_record)
-            self.db.flush()  # Para obtener el ID
-            
-            # Extraer y transformar datos meteorológicos
-            main_data = raw_data.get("main", {})
-            wind_data = raw_data.get("wind", {})
-            clouds_data = raw_data.get("clouds", {})
-            weather_data = raw_data.get("weather", [{}])[0]
-            
-            # Crear timestamp (usar timestamp de la API si está disponible)
-            api_timestamp = raw_data.get("dt")
-            if api_timestamp:
-                ts = datetime.fromtimestamp(api_timestamp, tz=timezone.utc)
-            else:
-                ts = datetime.now(timezone.utc)
-            
-            # Crear registro de weather_hourly
-            weather_hourly = WeatherHourly(
-                city_id=city.id,
-                ts=ts,
-                temp_c=main_data.get("temp"),
-                feels_like_c=main_data.get("feels_like"),
-                humidity=main_data.get("humidity"),
-                pressure=main_data.get("pressure"),
-                wind_speed=wind_data.get("speed"),
-                wind_deg=wind_data.get("deg"),
-                clouds=clouds_data.get("all"),
-                visibility=raw_data.get("visibility"),
-                weather_main=weather_data.get("main"),
-                weather_description=weather_data.get("description"),
-                raw_id=raw_record.id
-            )
-            
-            # UPSERT: actualizar si existe, insertar si no
-            existing = self.db.query(WeatherHourly).filter(
-                and_(
-                    WeatherHourly.city_id == city.id,
-                    WeatherHourly.ts == ts
-                )
-            ).first()
-            
-            if existing:
-                # Actualizar registro existente
-                for key, value in weather_hourly.__dict__.items():
-                    if key not in ['id', 'created_at']:
-                        setattr(existing, key, value)
-                existing.raw_id = raw_record.id
-            else:
-                # Insertar nuevo registro
-                self.db.add(weather_hourly)
-            
-            self.db.commit()
-            
-            logger.info("Datos transformados y cargados", city_id=city.id, timestamp=ts)
-            
-            return {
-                "status": "success",
-                "timestamp": ts.isoformat(),
-                "raw_id": raw_record.id
-            }
-            
-        except Exception as e:
-            self.db.rollback()
-            logger.error("Error transformando y cargando datos", city_id=city.id, error=str(e))
-            raise
+        result = WeatherLoader(self.db).load([(city.id, raw_data)])
+        if result["errors"]:
+            _, error = result["errors"][0]
+            raise ValueError(f"Error transformando y cargando datos: {error}")
+        
+        row = result["loaded"][0]
+        return {
+            "status": "success",
+            "timestamp": row["ts"].isoformat(),
+            "raw_id": row["raw_id"]
+        }, row
     
-    async def _evaluate_alerts(self, city_id: int):
-        """Evaluar alertas para una ciudad"""
+    def _evaluate_alerts(self, rows: List[Dict[str, Any]]) -> int:
+        """Evaluar alertas contra las observaciones recién cargadas"""
         
-        try:
-            # Obtener alertas activas para la ciudad
-            alerts = self.db.query(Alert).filter(
-                and_(
-                    Alert.city_id == city_id,
-                    Alert.active == True,
-                    Alert.paused == False
-                )
-            ).all()
-            
-            if not alerts:
-                return
-            
-            # Obtener datos meteorológicos más recientes
-            latest_weather = self.db.query(WeatherHourly).filter(
-                WeatherHourly.city_id == city_id
-            ).order_by(WeatherHourly.ts.desc()).first()
-            
-            if not latest_weather:
-                return
-            
-            # Evaluar cada alerta
-            for alert in alerts:
-                await self.alert_service.evaluate_alert(alert, latest_weather)
-            
-            logger.info("Alertas evaluadas", city_id=city_id, alert_count=len(alerts))
-            
-        except Exception as e:
-            logger.error("Error evaluando alertas", city_id=city_id, error=str(e))
+        if not rows:
+            return 0
+        
+        start = time.perf_counter()
+        activations = self.alert_service.evaluate_observations(rows)
+        logger.info("Alertas evaluadas", observations=len(rows), activations=activations,
+                    elapsed_ms=round((time.perf_counter() - start) * 1000, 1))
+        return activations
     
     async def get_etl_status(self) -> Dict[str, Any]:
         """Obtener estado del ETL"""
@@ -253,7 +209,8 @@ class ETLService:
                 "total_cities": total_cities,
                 "cities_with_recent_data": cities_with_recent_data,
                 "last_update": datetime.now(timezone.utc).isoformat(),
-                "recent_errors": recent_errors
+                "recent_errors": recent_errors,
+                "quota": get_rate_limiter(self.api_key).snapshot()
             }
             
         except Exception as e:
@@ -264,20 +221,19 @@ class ETLService:
         """Obtener lista de ciudades configuradas para ETL"""
         
         cities = self.db.query(City).all()
+        latest = self._latest_timestamps()
+        recent_threshold = datetime.now(timezone.utc) - timedelta(hours=2)
         
         result = []
         for city in cities:
-            # Obtener última actualización
-            last_update = self.db.query(WeatherHourly).filter(
-                WeatherHourly.city_id == city.id
-            ).order_by(WeatherHourly.ts.desc()).first()
+            last_update = latest.get(city.id)
             
             result.append({
                 "id": city.id,
                 "name": city.name,
                 "country": city.country,
-                "last_update": last_update.ts.isoformat() if last_update else None,
-                "has_recent_data": last_update and last_update.ts > datetime.now(timezone.utc) - timedelta(hours=2)
+                "last_update": last_update.isoformat() if last_update else None,
+                "has_recent_data": bool(last_update and last_update > recent_threshold)
             })
         
         return result
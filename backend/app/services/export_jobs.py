@@ -0,0 +1,224 @@
+"""
+Cola de exportaciones en segundo plano con resultados en disco
+"""
+import os
+import tempfile
+import threading
+import time
+import uuid
+import structlog
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional
+from app.config import settings
+from app.database import SessionLocal
+from app.schemas import ExportFormat, ExportJobStatus, ExportRequest
+from app.services.columnar_export import MEDIA_TYPES, stream_columnar
+from app.services.export_service import RowProducer, build_custom_export, stream_csv
+
+logger = structlog.get_logger()
+
+
+class ExportJobLimitError(RuntimeError):
+    """Límite de trabajos en cola (por usuario o global) alcanzado"""
+
+
+class ExportJob:
+    """Estado de un trabajo de exportación (en memoria del proceso)"""
+
+    def __init__(self, user_id: int, export_request: ExportRequest):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.request = export_request
+        self.format = export_request.format
+        self.status = ExportJobStatus.QUEUED
+        self.created_at = datetime.now(timezone.utc)
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.expires_at: Optional[datetime] = None
+        self.filename: Optional[str] = None
+        self.path: Optional[str] = None
+        self.size_bytes: Optional[int] = None
+        self.error: Optional[str] = None
+        # Descargas en curso; el archivo de un trabajo caducado se borra al cerrar la última
+        self.downloads = 0
+        self.evicted = False
+
+    @property
+    def active(self) -> bool:
+        return self.status in (ExportJobStatus.QUEUED, ExportJobStatus.RUNNING)
+
+    @property
+    def media_type(self) -> str:
+        return MEDIA_TYPES.get(self.format, "text/csv")
+
+
+def _export_chunks(export_format: ExportFormat, columns, produce_rows: RowProducer) -> Iterator[bytes]:
+    if export_format == ExportFormat.CSV:
+        for chunk in stream_csv([name for name, _ in columns], produce_rows):
+            yield chunk.encode("utf-8")
+    else:
+        yield from stream_columnar(export_format, columns, produce_rows)
+
+
+class ExportJobManager:
+    """Pool acotado de hilos que escribe exportaciones en un directorio local.
+
+    Los trabajos viven en memoria del proceso; los archivos se borran al
+    expirar (TTL) y, al arrancar, los de ejecuciones anteriores ya caducados.
+    """
+
+    def __init__(self):
+        self._jobs: Dict[str, ExportJob] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def storage_dir(self) -> str:
+        return settings.export_job_dir or os.path.join(tempfile.gettempdir(), "weatherhub-exports")
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=max(1, settings.export_job_workers),
+                thread_name_prefix="export-job"
+            )
+        return self._executor
+
+    def submit(self, user_id: int, export_request: ExportRequest) -> ExportJob:
+        """Encolar una exportación; ExportJobLimitError si se superan los límites"""
+
+        self.evict_expired()
+        with self._lock:
+            active = [job for job in self._jobs.values() if job.active]
+            if sum(1 for job in active if job.user_id == user_id) >= settings.export_job_max_per_user:
+                raise ExportJobLimitError(
+                    f"Máximo {settings.export_job_max_per_user} exportaciones en curso por usuario"
+                )
+            if len(active) >= settings.export_job_max_pending:
+                raise ExportJobLimitError("Cola de exportaciones llena, inténtalo más tarde")
+
+            job = ExportJob(user_id, export_request)
+            self._jobs[job.id] = job
+
+        self._pool().submit(self._run, job)
+        logger.info("Exportación encolada", job_id=job.id, user_id=user_id, format=job.format.value)
+        return job
+
+    def get(self, job_id: str, user_id: int) -> Optional[ExportJob]:
+        """Trabajo del usuario (None si no existe, expiró o es de otro usuario)"""
+
+        self.evict_expired()
+        job = self._jobs.get(job_id)
+        if job is None or job.user_id != user_id:
+            return None
+        return job
+
+    def _finish(self, job: ExportJob, status: ExportJobStatus, **fields):
+        """Publicar el resultado: caducidad y campos antes que el estado, bajo el lock"""
+
+        finished_at = datetime.now(timezone.utc)
+        with self._lock:
+            job.finished_at = finished_at
+            job.expires_at = finished_at + timedelta(seconds=settings.export_job_ttl_seconds)
+            for name, value in fields.items():
+                setattr(job, name, value)
+            job.status = status
+
+    def _run(self, job: ExportJob):
+        job.status = ExportJobStatus.RUNNING
+        job.started_at = datetime.now(timezone.utc)
+        os.makedirs(self.storage_dir, exist_ok=True)
+        path = os.path.join(self.storage_dir, job.id)
+        partial = path + ".part"
+
+        try:
+            # Sesión solo para validar filtros; las filas se leen con la sesión del streaming
+            db = SessionLocal()
+            try:
+                columns, produce_rows, filename = build_custom_export(db, job.request, job.user_id)
+            finally:
+                db.close()
+
+            with open(partial, "wb") as output:
+                for chunk in _export_chunks(job.format, columns, produce_rows):
+                    output.write(chunk)
+            os.replace(partial, path)
+
+            self._finish(job, ExportJobStatus.DONE, filename=filename, path=path, size_bytes=os.path.getsize(path))
+            logger.info("Exportación completada", job_id=job.id, size_bytes=job.size_bytes)
+        except Exception as e:
+            if os.path.exists(partial):
+                os.remove(partial)
+            # ValueError: sin datos para los filtros; el resto se registra con traza
+            if not isinstance(e, ValueError):
+                logger.error("Error en exportación", job_id=job.id, error=str(e), exc_info=True)
+            self._finish(
+                job, ExportJobStatus.FAILED,
+                error=str(e) if isinstance(e, ValueError) else "Error generando la exportación"
+            )
+
+    def acquire_download(self, job: ExportJob) -> bool:
+        """Registrar una descarga; False si el trabajo ya caducó (el archivo puede no existir)"""
+
+        with self._lock:
+            if job.evicted:
+                return False
+            job.downloads += 1
+            return True
+
+    def release_download(self, job: ExportJob):
+        """Cerrar una descarga; borra el archivo si el trabajo caducó mientras tanto"""
+
+        with self._lock:
+            job.downloads -= 1
+            remove = job.evicted and job.downloads == 0
+        if remove:
+            self._remove_file(job)
+
+    @staticmethod
+    def _remove_file(job: ExportJob):
+        if job.path and os.path.exists(job.path):
+            os.remove(job.path)
+
+    def evict_expired(self) -> int:
+        """Eliminar trabajos terminados cuyo TTL venció; sus archivos, al terminar las descargas en curso"""
+
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            expired: List[ExportJob] = [
+                job for job in self._jobs.values()
+                if job.expires_at is not None and job.expires_at <= now
+            ]
+            for job in expired:
+                del self._jobs[job.id]
+                job.evicted = True
+            removable = [job for job in expired if job.downloads == 0]
+
+        for job in removable:
+            self._remove_file(job)
+        return len(expired)
+
+    def cleanup_storage(self) -> int:
+        """Borrar archivos de ejecuciones anteriores más viejos que el TTL"""
+
+        if not os.path.isdir(self.storage_dir):
+            return 0
+
+        removed = 0
+        limit = time.time() - settings.export_job_ttl_seconds
+        for name in os.listdir(self.storage_dir):
+            path = os.path.join(self.storage_dir, name)
+            if os.path.isfile(path) and os.path.getmtime(path) < limit:
+                os.remove(path)
+                removed += 1
+        return removed
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Instancia global compartida por el router de exportación
+export_job_manager = ExportJobManager()
@@ -0,0 +1,185 @@
+"""
+Exportación en streaming: filas leídas por lotes (cursor de servidor) y CSV escrito por bloques
+"""
+import csv
+import io
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Sequence, Set, Tuple
+from sqlalchemy import select
+from sqlalchemy.engine import Result
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models import AlertHistory, City, WeatherHourly
+from app.schemas import ExportRequest
+from app.services.columnar_export import FILE_EXTENSIONS
+from app.services.weather_service import WeatherService
+
+# Filas por lote leídas del cursor (yield_per activa stream_results en PostgreSQL)
+EXPORT_BATCH_SIZE = 2000
+
+# Tamaño aproximado (caracteres) de cada bloque de texto enviado al cliente
+CSV_CHUNK_SIZE = 64 * 1024
+
+# Productor de filas: recibe la sesión del streaming y genera listas de valores
+RowProducer = Callable[[Session], Iterable[Sequence[Any]]]
+
+
+def stream_rows(db: Session, stmt, batch_size: int = EXPORT_BATCH_SIZE) -> Result:
+    """Ejecutar `stmt` leyendo por lotes en lugar de cargar todo el resultado"""
+
+    return db.execute(stmt.execution_options(yield_per=batch_size))
+
+
+def has_rows(db: Session, stmt) -> bool:
+    """Comprobar si `stmt` devuelve alguna fila (para el 404 previo al streaming)"""
+
+    return db.execute(stmt.limit(1)).first() is not None
+
+
+def load_city_map(db: Session, city_ids) -> Dict[int, Tuple[str, str]]:
+    """{city_id: (nombre, país)} en una consulta (`city_ids` puede ser una subconsulta)"""
+
+    stmt = select(City.id, City.name, City.country).where(City.id.in_(city_ids))
+    return {row.id: (row.name, row.country) for row in db.execute(stmt)}
+
+
+def load_alert_hits(
+    db: Session,
+    user_id: int,
+    city_ids: Sequence[int],
+    from_date: datetime,
+    to_date: datetime
+) -> Set[Tuple[int, datetime]]:
+    """Pares (city_id, ts) con alguna activación del usuario en el rango, en una consulta"""
+
+    stmt = select(AlertHistory.city_id, AlertHistory.ts).where(
+        AlertHistory.user_id == user_id,
+        AlertHistory.city_id.in_(city_ids),
+        AlertHistory.ts >= from_date,
+        AlertHistory.ts <= to_date
+    ).distinct()
+    return {(row.city_id, row.ts) for row in db.execute(stmt)}
+
+
+def stream_csv(
+    header: Sequence[str],
+    produce_rows: RowProducer
+) -> Iterator[str]:
+    """Generador de bloques CSV para StreamingResponse.
+
+    `produce_rows` recibe una sesión propia del streaming: la respuesta se envía
+    después de que el endpoint termine y su sesión no debe usarse aquí.
+    """
+
+    db = SessionLocal()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    try:
+        writer.writerow(header)
+        for row in produce_rows(db):
+            # Las fechas se escriben en ISO 8601 (las filas llevan datetime sin formatear)
+            writer.writerow([value.isoformat() if isinstance(value, datetime) else value for value in row])
+            if buffer.tell() >= CSV_CHUNK_SIZE:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+        yield buffer.getvalue()
+    finally:
+        buffer.close()
+        db.close()
+
+
+def build_custom_export(
+    db: Session,
+    export_request: ExportRequest,
+    user_id: int
+) -> Tuple[List[Tuple[str, str]], RowProducer, str]:
+    """Columnas (nombre, tipo), productor de filas y nombre de archivo de /export/custom.
+
+    Compartido por la descarga directa y los trabajos en segundo plano.
+    """
+
+    # Si no se especifican ciudades, usar todas
+    if not export_request.city_ids:
+        city_ids = [city_id for (city_id,) in db.query(City.id).all()]
+    else:
+        city_ids = export_request.city_ids
+
+    # Determinar rango de fechas
+    from_date = export_request.from_date or (datetime.utcnow() - timedelta(days=30))
+    to_date = export_request.to_date or datetime.utcnow()
+
+    # Consulta de datos meteorológicos (se lee por lotes al generar el archivo)
+    stmt = select(
+        WeatherHourly.city_id,
+        WeatherHourly.ts,
+        WeatherHourly.temp_c,
+        WeatherHourly.feels_like_c,
+        WeatherHourly.humidity,
+        WeatherHourly.pressure,
+        WeatherHourly.wind_speed,
+        WeatherHourly.wind_deg,
+        WeatherHourly.clouds,
+        WeatherHourly.visibility,
+        WeatherHourly.weather_main,
+        WeatherHourly.weather_description
+    ).where(
+        WeatherHourly.city_id.in_(city_ids),
+        WeatherHourly.ts >= from_date,
+        WeatherHourly.ts <= to_date
+    ).order_by(WeatherHourly.city_id, WeatherHourly.ts.asc())
+
+    if not has_rows(db, stmt):
+        raise ValueError("No hay datos disponibles para exportar")
+
+    # Columnas (nombre y tipo para los formatos columnares)
+    unit = export_request.unit
+    columns = [
+        ("city_id", "int"), ("city_name", "category"), ("country", "category"), ("timestamp", "timestamp"),
+        (f"temperature_{unit.value}", "float"), (f"feels_like_{unit.value}", "float"),
+        ("humidity", "int"), ("pressure", "int"), ("wind_speed", "float"), ("wind_deg", "int"),
+        ("clouds", "int"), ("visibility", "int"), ("weather_main", "category"), ("weather_description", "category")
+    ]
+
+    # Añadir columna de alertas si se solicita
+    include_alerts = export_request.include_alerts
+    if include_alerts:
+        columns.append(("alert_triggered", "int"))
+
+    weather_service = WeatherService()
+
+    def produce_rows(stream_db: Session):
+        # Ciudades y activaciones de alertas precargadas: dos consultas en total en lugar de una por fila
+        city_map = load_city_map(stream_db, city_ids)
+        alert_hits = set()
+        if include_alerts:
+            alert_hits = load_alert_hits(stream_db, user_id, city_ids, from_date, to_date)
+
+        for data in stream_rows(stream_db, stmt):
+            city_name, country = city_map[data.city_id]
+
+            row = [
+                data.city_id,
+                city_name,
+                country,
+                data.ts,
+                weather_service.convert_temperature(data.temp_c, unit),
+                weather_service.convert_temperature(data.feels_like_c, unit),
+                data.humidity,
+                data.pressure,
+                data.wind_speed,
+                data.wind_deg,
+                data.clouds,
+                data.visibility,
+                data.weather_main,
+                data.weather_description
+            ]
+
+            # Añadir información de alertas si se solicita
+            if include_alerts:
+                row.append(1 if (data.city_id, data.ts) in alert_hits else 0)
+
+            yield row
+
+    filename = f"custom_export_{from_date.strftime('%Y%m%d')}_{to_date.strftime('%Y%m%d')}.{FILE_EXTENSIONS[export_request.format]}"
+    return columns, produce_rows, filename
@@ -0,0 +1,97 @@
+"""
+Última observación por ciudad: proyección weather_latest + caché en proceso
+"""
+import structlog
+from typing import Dict, Iterable, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models import WeatherLatest, WeatherHourly
+from app.utils.ttl_cache import TTLCache
+
+logger = structlog.get_logger()
+
+
+class LatestWeatherCache:
+    """Caché read-through de weather_latest, invalidada por el cargador del ETL"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, db: Session, city_id: int) -> Optional[WeatherLatest]:
+        """Última observación de una ciudad (búsqueda por clave primaria)"""
+
+        latest = self._cache.get(city_id)
+        if latest is not None:
+            return latest
+
+        latest = db.get(WeatherLatest, city_id)
+        if latest is None:
+            return None
+
+        # Objeto desacoplado de la sesión: se comparte entre peticiones en solo lectura
+        db.expunge(latest)
+        self._cache.set(city_id, latest)
+        return latest
+
+    def invalidate(self, city_ids: Optional[Iterable[int]] = None):
+        """Descartar entradas tras una ingesta (todas si no se indican ciudades)"""
+
+        if city_ids is None:
+            self._cache.clear()
+            return
+        for city_id in city_ids:
+            self._cache.pop(city_id)
+
+
+latest_weather_cache = LatestWeatherCache(
+    maxsize=settings.latest_cache_max_entries,
+    ttl=settings.latest_cache_ttl_seconds
+)
+
+
+def get_latest_timestamps(db: Session, city_ids: Optional[Iterable[int]] = None) -> Dict[int, object]:
+    """Último ts por ciudad leído de weather_latest (una fila por ciudad)"""
+
+    query = db.query(WeatherLatest.city_id, WeatherLatest.ts)
+    if city_ids is not None:
+        query = query.filter(WeatherLatest.city_id.in_(list(city_ids)))
+    return dict(query.all())
+
+
+def backfill_weather_latest(db: Session) -> int:
+    """Rellenar weather_latest desde weather_hourly si está vacía"""
+
+    if db.query(WeatherLatest.city_id).first() is not None:
+        return 0
+
+    latest_ts = db.query(
+        WeatherHourly.city_id.label("city_id"),
+        func.max(WeatherHourly.ts).label("ts")
+    ).group_by(WeatherHourly.city_id).subquery()
+
+    rows = db.query(WeatherHourly).join(
+        latest_ts,
+        (latest_ts.c.city_id == WeatherHourly.city_id) & (latest_ts.c.ts == WeatherHourly.ts)
+    ).all()
+
+    for row in rows:
+        db.add(WeatherLatest(
+            city_id=row.city_id,
+            ts=row.ts,
+            temp_c=row.temp_c,
+            feels_like_c=row.feels_like_c,
+            humidity=row.humidity,
+            pressure=row.pressure,
+            wind_speed=row.wind_speed,
+            wind_deg=row.wind_deg,
+            clouds=row.clouds,
+            visibility=row.visibility,
+            weather_main=row.weather_main,
+            weather_description=row.weather_description,
+            raw_id=row.raw_id
+        ))
+    db.commit()
+
+    logger.info("weather_latest inicializada", cities=len(rows))
+    return len(rows)
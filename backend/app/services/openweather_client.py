@@ -0,0 +1,197 @@
+"""
+Cliente HTTP asíncrono para OpenWeatherMap
+"""
+import asyncio
+import random
+import httpx
+import structlog
+from typing import Dict, List, Optional, Any, Tuple
+from app.config import settings
+from app.models import City
+from app.services.rate_limiter import TokenBucket, get_rate_limiter
+
+logger = structlog.get_logger()
+
+# Límite de IDs por llamada al endpoint /group de OpenWeatherMap
+MAX_GROUP_SIZE = 20
+
+
+class OpenWeatherClient:
+    """Cliente compartido con pool keep-alive y límite de concurrencia"""
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        limiter: Optional[TokenBucket] = None
+    ):
+        self.base_url = base_url or settings.openweather_base_url
+        self.api_key = api_key or settings.openweather_api_key
+        self.concurrency = max(1, concurrency or settings.etl_concurrency)
+        self.timeout = timeout or settings.etl_request_timeout
+        # Token bucket compartido por API key (todas las rutas del ETL)
+        self.limiter = limiter or get_rate_limiter(self.api_key)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def __aenter__(self) -> "OpenWeatherClient":
+        # El pool mantiene tantas conexiones vivas como peticiones en vuelo
+        limits = httpx.Limits(
+            max_connections=self.concurrency,
+            max_keepalive_connections=self.concurrency
+        )
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            limits=limits,
+            timeout=httpx.Timeout(self.timeout)
+        )
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self._client:
+            await self._client.aclose()
+        self._client = None
+        self._semaphore = None
+
+    def _params_for_city(self, city: City) -> Dict[str, Any]:
+        """Parámetros de consulta para una ciudad (coordenadas si existen)"""
+
+        if city.lat and city.lon:
+            return {
+                "lat": city.lat,
+                "lon": city.lon,
+                "appid": self.api_key,
+                "units": "metric"
+            }
+
+        return {
+            "q": f"{city.name},{city.country}" if city.country else city.name,
+            "appid": self.api_key,
+            "units": "metric"  # Obtener en Celsius
+        }
+
+    async def _get(self, path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """GET con token bucket y reintentos (429, 5xx y errores de red)"""
+
+        if not self._client:
+            raise RuntimeError("OpenWeatherClient debe usarse como 'async with'")
+
+        retries = max(0, settings.etl_retry_attempts)
+        for attempt in range(retries + 1):
+            await self.limiter.acquire()
+            retry_after = None
+            rate_limited = False
+            try:
+                async with self._semaphore:
+                    # Timeout total por petición (conexión + espera + lectura)
+                    response = await asyncio.wait_for(
+                        self._client.get(path, params=params),
+                        timeout=self.timeout
+                    )
+            except (httpx.TransportError, asyncio.TimeoutError) as e:
+                if attempt == retries:
+                    raise
+                error = str(e) or type(e).__name__
+            else:
+                status_code = response.status_code
+                if status_code != 429 and status_code < 500:
+                    response.raise_for_status()
+                    return response.json()
+                if attempt == retries:
+                    response.raise_for_status()
+                error = f"HTTP {status_code}"
+                retry_after = response.headers.get("Retry-After")
+                rate_limited = status_code == 429
+
+            delay = self._backoff_delay(attempt, retry_after)
+            if rate_limited:
+                # Frenar también al resto de peticiones con la misma API key
+                self.limiter.penalize(delay)
+            logger.warning("Reintentando petición a OpenWeatherMap",
+                           path=path, attempt=attempt + 1, delay=round(delay, 2), error=error)
+            await asyncio.sleep(delay)
+
+    def _backoff_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Backoff exponencial con jitter completo; respeta Retry-After"""
+
+        base = settings.etl_retry_delay * (2 ** attempt)
+        delay = random.uniform(0, min(base, settings.etl_retry_max_delay))
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        return delay
+
+    async def fetch_city(self, city: City) -> Dict[str, Any]:
+        """Obtener el clima actual de una ciudad"""
+
+        return await self._get("/weather", self._params_for_city(city))
+
+    async def fetch_group(self, openweather_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Obtener varias ciudades en una sola llamada a /group (máx. 20 IDs)"""
+
+        params = {
+            "id": ",".join(str(openweather_id) for openweather_id in openweather_ids),
+            "appid": self.api_key,
+            "units": "metric"
+        }
+        data = await self._get("/group", params)
+
+        return {item.get("id"): item for item in data.get("list", [])}
+
+    async def fetch_cities(self, cities: List[City]) -> List[Tuple[City, Optional[Dict[str, Any]], Optional[Exception]]]:
+        """Obtener varias ciudades en paralelo; devuelve (ciudad, datos, error)"""
+
+        async def fetch_one(city: City):
+            try:
+                return city, await self.fetch_city(city), None
+            except Exception as e:
+                logger.error("Error en request a OpenWeatherMap", city_id=city.id, error=str(e) or type(e).__name__)
+                return city, None, e
+
+        return await asyncio.gather(*(fetch_one(city) for city in cities))
+
+    async def fetch_cities_batched(
+        self,
+        cities: List[City],
+        group_size: Optional[int] = None
+    ) -> List[Tuple[City, Optional[Dict[str, Any]], Optional[Exception]]]:
+        """Agrupar por openweather_id en llamadas /group; el resto, por coordenadas"""
+
+        group_size = max(1, min(group_size or settings.etl_group_size, MAX_GROUP_SIZE))
+        grouped = [city for city in cities if city.openweather_id]
+        individual = [city for city in cities if not city.openweather_id]
+        chunks = [grouped[i:i + group_size] for i in range(0, len(grouped), group_size)]
+
+        async def fetch_chunk(chunk: List[City]):
+            try:
+                return chunk, await self.fetch_group([city.openweather_id for city in chunk]), None
+            except Exception as e:
+                logger.error("Error en request /group a OpenWeatherMap",
+                             city_ids=[city.id for city in chunk], error=str(e) or type(e).__name__)
+                return chunk, None, e
+
+        # Grupos y ciudades sin ID comparten el mismo límite de concurrencia
+        chunk_results, results = await asyncio.gather(
+            asyncio.gather(*(fetch_chunk(chunk) for chunk in chunks)),
+            self.fetch_cities(individual)
+        )
+
+        missing = []
+        for chunk, items, error in chunk_results:
+            for city in chunk:
+                if error is not None:
+                    results.append((city, None, error))
+                elif city.openweather_id in items:
+                    results.append((city, items[city.openweather_id], None))
+                else:
+                    # ID desconocido para la API: reintentar por coordenadas/nombre
+                    missing.append(city)
+
+        if missing:
+            results.extend(await self.fetch_cities(missing))
+        return results
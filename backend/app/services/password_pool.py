@@ -0,0 +1,78 @@
+"""
+Pool acotado para hash/verificación bcrypt fuera del event loop
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from app.config import settings
+
+
+class PasswordPoolBusyError(RuntimeError):
+    """Demasiadas operaciones bcrypt en cola: la petición debe rechazarse (429)"""
+
+
+class PasswordHashPool:
+    """Ejecuta bcrypt en hilos dedicados con un límite de operaciones pendientes.
+
+    bcrypt libera el GIL mientras calcula, así que los hilos aprovechan varios
+    núcleos sin bloquear el event loop ni el threadpool de las peticiones.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = max(1, workers)
+        self.max_pending = max(self.workers, max_pending)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+        # Métricas de cola
+        self.pending = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def run(self, func: Callable[..., Any], *args) -> Any:
+        """Ejecutar `func` en el pool; PasswordPoolBusyError si la cola está llena"""
+
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordPoolBusyError("Demasiadas operaciones de autenticación en curso, inténtalo de nuevo")
+            self.pending += 1
+            self.peak_pending = max(self.peak_pending, self.pending)
+
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool(), func, *args)
+        finally:
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Estado de la cola para /health y logs"""
+
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "queued": max(0, self.pending - self.workers),
+                "peak_pending": self.peak_pending,
+                "completed": self.completed,
+                "rejected": self.rejected
+            }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Instancia global compartida por los endpoints de autenticación
+password_pool = PasswordHashPool(settings.password_hash_workers, settings.password_hash_max_pending)
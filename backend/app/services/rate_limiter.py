@@ -0,0 +1,105 @@
+"""
+Limitador token bucket para llamadas salientes a OpenWeatherMap
+"""
+import asyncio
+import threading
+import time
+from typing import Dict, Any
+from app.config import settings
+
+
+class TokenBucket:
+    """Token bucket asíncrono, compartible entre hilos y event loops"""
+
+    def __init__(self, calls_per_minute: float, burst: int):
+        self.rate = max(calls_per_minute, 0.001) / 60.0  # tokens por segundo
+        self.capacity = max(1, burst)
+        self.calls_per_minute = calls_per_minute
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        # threading.Lock: el scheduler ejecuta el ETL en otro hilo con su propio loop
+        self._lock = threading.Lock()
+
+        # Contadores de cuota
+        self.calls = 0
+        self.throttled = 0
+        self.rate_limited = 0
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def try_acquire(self) -> float:
+        """Consumir un token; devuelve 0 si se obtuvo o los segundos a esperar"""
+
+        with self._lock:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self.calls += 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    async def acquire(self):
+        """Esperar hasta disponer de un token"""
+
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return
+            with self._lock:
+                self.throttled += 1
+            await asyncio.sleep(wait)
+
+    def penalize(self, seconds: float):
+        """Bloquear el bucket tras un 429 (Retry-After o backoff)"""
+
+        with self._lock:
+            self.rate_limited += 1
+            self._tokens = 0.0
+            self._updated = time.monotonic()
+            self._blocked_until = max(self._blocked_until, self._updated + seconds)
+
+    @property
+    def remaining(self) -> int:
+        """Llamadas disponibles ahora mismo sin esperar"""
+
+        with self._lock:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                return 0
+            self._refill(now)
+            return int(self._tokens)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Estado de la cuota para logs y /etl/status"""
+
+        return {
+            "calls_per_minute": self.calls_per_minute,
+            "burst": self.capacity,
+            "quota_remaining": self.remaining,
+            "calls": self.calls,
+            "throttled": self.throttled,
+            "rate_limited": self.rate_limited
+        }
+
+
+_limiters: Dict[str, TokenBucket] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(api_key: str) -> TokenBucket:
+    """Limitador compartido del proceso para una API key"""
+
+    with _limiters_lock:
+        limiter = _limiters.get(api_key)
+        if limiter is None:
+            limiter = TokenBucket(settings.openweather_calls_per_minute, settings.openweather_burst)
+            _limiters[api_key] = limiter
+        return limiter
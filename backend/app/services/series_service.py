@@ -0,0 +1,112 @@
+"""
+Lectura de series meteorológicas por columnas (sin entidades ORM)
+"""
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+from sqlalchemy import func, select
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+from app.models import WeatherHourly
+
+# Columnas que necesita WeatherService.convert_weather_data
+WEATHER_DATA_COLUMNS: Tuple[str, ...] = (
+    "ts", "temp_c", "feels_like_c", "humidity", "pressure", "wind_speed", "wind_deg",
+    "clouds", "visibility", "weather_main", "weather_description"
+)
+
+# Columnas mínimas por métrica de los endpoints /history/* y /compare/*
+METRIC_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    "temperature": WEATHER_DATA_COLUMNS,
+    "humidity": ("ts", "humidity"),
+    "pressure": ("ts", "pressure"),
+    "wind": ("ts", "wind_speed", "wind_deg"),
+}
+
+
+def columns_for_metrics(metrics: Iterable[str]) -> Tuple[str, ...]:
+    """Unión ordenada de las columnas de varias métricas"""
+
+    columns: List[str] = []
+    for metric in metrics:
+        for column in METRIC_COLUMNS[metric]:
+            if column not in columns:
+                columns.append(column)
+    return tuple(columns)
+
+
+class SeriesService:
+    """Consultas de series que devuelven Row (tuplas con acceso por nombre)"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    @staticmethod
+    def _columns(columns: Sequence[str]):
+        return [getattr(WeatherHourly, column) for column in columns]
+
+    def fetch(
+        self,
+        city_id: int,
+        columns: Sequence[str],
+        from_date: datetime,
+        to_date: datetime,
+        limit: int
+    ) -> List[Row]:
+        """Serie de una ciudad en orden ascendente, solo con las columnas pedidas"""
+
+        stmt = select(*self._columns(columns)).where(
+            WeatherHourly.city_id == city_id,
+            WeatherHourly.ts >= from_date,
+            WeatherHourly.ts <= to_date
+        ).order_by(WeatherHourly.ts.asc()).limit(limit)
+
+        return self.db.execute(stmt).all()
+
+    def fetch_arrays(
+        self,
+        city_id: int,
+        columns: Sequence[str],
+        from_date: datetime,
+        to_date: datetime,
+        limit: int
+    ) -> Dict[str, List[Any]]:
+        """Serie de una ciudad como arrays por columna ({"ts": [...], "humidity": [...]})"""
+
+        rows = self.fetch(city_id, columns, from_date, to_date, limit)
+        if not rows:
+            return {column: [] for column in columns}
+        return {column: list(values) for column, values in zip(columns, zip(*rows))}
+
+    def fetch_many(
+        self,
+        city_ids: Iterable[int],
+        columns: Sequence[str],
+        from_date: datetime,
+        to_date: datetime,
+        limit: int
+    ) -> Dict[int, List[Row]]:
+        """Series de varias ciudades en una consulta (máx. `limit` filas por ciudad)"""
+
+        city_ids = set(city_ids)
+        if not city_ids:
+            return {}
+
+        # ROW_NUMBER() por ciudad aplica el límite a cada serie, no al total
+        row_number = func.row_number().over(
+            partition_by=WeatherHourly.city_id,
+            order_by=WeatherHourly.ts.asc()
+        ).label("row_number")
+        ranked = select(WeatherHourly.city_id, *self._columns(columns), row_number).where(
+            WeatherHourly.city_id.in_(city_ids),
+            WeatherHourly.ts >= from_date,
+            WeatherHourly.ts <= to_date
+        ).subquery()
+
+        stmt = select(ranked.c.city_id, *[ranked.c[column] for column in columns]).where(
+            ranked.c.row_number <= limit
+        ).order_by(ranked.c.city_id, ranked.c.ts)
+
+        series: Dict[int, List[Row]] = {}
+        for row in self.db.execute(stmt):
+            series.setdefault(row.city_id, []).append(row)
+        return series
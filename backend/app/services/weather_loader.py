@@ -0,0 +1,187 @@
+"""
+Carga masiva de datos meteorológicos (weather_raw + weather_hourly + weather_latest + weather_daily)
+"""
+import json
+import structlog
+from datetime import datetime, timezone
+from typing import Dict, List, Any, Tuple
+from sqlalchemy import insert, func
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.database import dialect_insert
+from app.models import WeatherRaw, WeatherHourly, WeatherLatest
+from app.services.latest_weather import latest_weather_cache
+from app.services.daily_service import DailyWeatherService
+
+logger = structlog.get_logger()
+
+# Columnas que se sobrescriben cuando ya existe la fila (city_id, ts)
+UPSERT_COLUMNS = [
+    "temp_c", "feels_like_c", "humidity", "pressure", "wind_speed", "wind_deg",
+    "clouds", "visibility", "weather_main", "weather_description", "raw_id"
+]
+
+
+def transform_weather_payload(city_id: int, raw_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Transformar la respuesta de /weather en una fila de weather_hourly"""
+
+    main_data = raw_data.get("main", {})
+    wind_data = raw_data.get("wind", {})
+    clouds_data = raw_data.get("clouds", {})
+    weather_data = (raw_data.get("weather") or [{}])[0]
+
+    # Crear timestamp (usar timestamp de la API si está disponible)
+    api_timestamp = raw_data.get("dt")
+    if api_timestamp:
+        ts = datetime.fromtimestamp(api_timestamp, tz=timezone.utc)
+    else:
+        ts = datetime.now(timezone.utc)
+
+    return {
+        "city_id": city_id,
+        "ts": ts,
+        "temp_c": main_data.get("temp"),
+        "feels_like_c": main_data.get("feels_like"),
+        "humidity": main_data.get("humidity"),
+        "pressure": main_data.get("pressure"),
+        "wind_speed": wind_data.get("speed"),
+        "wind_deg": wind_data.get("deg"),
+        "clouds": clouds_data.get("all"),
+        "visibility": raw_data.get("visibility"),
+        "weather_main": weather_data.get("main"),
+        "weather_description": weather_data.get("description"),
+    }
+
+
+class WeatherLoader:
+    """Cargador por lotes con INSERT ... ON CONFLICT (city_id, ts) DO UPDATE"""
+
+    def __init__(self, db: Session, batch_size: int = None):
+        self.db = db
+        self.batch_size = max(1, batch_size or settings.etl_batch_size)
+        self.dialect = db.get_bind().dialect.name
+
+    def load(self, records: List[Tuple[int, Dict[str, Any]]]) -> Dict[str, Any]:
+        """Cargar registros (city_id, json de OpenWeatherMap); un commit por lote"""
+
+        loaded: List[Dict[str, Any]] = []
+        errors: List[Tuple[int, str]] = []
+
+        for start in range(0, len(records), self.batch_size):
+            batch = records[start:start + self.batch_size]
+            try:
+                batch_rows = self._load_batch(batch)
+                self.db.commit()
+                loaded.extend(batch_rows)
+                latest_weather_cache.invalidate({row["city_id"] for row in batch_rows})
+            except Exception as e:
+                self.db.rollback()
+                logger.error("Error cargando lote de datos", cities=[city_id for city_id, _ in batch], error=str(e))
+                errors.extend((city_id, str(e)) for city_id, _ in batch)
+
+        logger.info("Datos transformados y cargados", loaded=len(loaded), errors=len(errors))
+
+        return {"loaded": loaded, "errors": errors}
+
+    def _load_batch(self, batch: List[Tuple[int, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Insertar raw + upsert hourly/latest + rollup diario de un lote"""
+
+        fetched_at = datetime.now(timezone.utc)
+        raw_ids = self.db.execute(
+            insert(WeatherRaw).returning(WeatherRaw.id, sort_by_parameter_order=True),
+            [
+                {"city_id": city_id, "fetched_at": fetched_at, "data": json.dumps(raw_data)}
+                for city_id, raw_data in batch
+            ]
+        ).scalars().all()
+
+        # Una sola fila por (city_id, ts): ON CONFLICT no admite tocar dos veces la misma fila
+        rows: Dict[Tuple[int, datetime], Dict[str, Any]] = {}
+        for (city_id, raw_data), raw_id in zip(batch, raw_ids):
+            row = transform_weather_payload(city_id, raw_data)
+            row["raw_id"] = raw_id
+            rows[(row["city_id"], row["ts"])] = row
+
+        self._upsert_hourly(list(rows.values()))
+        self._upsert_latest(list(rows.values()))
+        # Rollup diario solo de los (ciudad, día) de este lote, en la misma transacción
+        DailyWeatherService(self.db).rollup(
+            (row["city_id"], row["ts"].astimezone(timezone.utc).date()) for row in rows.values()
+        )
+
+        return list(rows.values())
+
+    def _upsert_hourly(self, rows: List[Dict[str, Any]]):
+        """UPSERT de weather_hourly sobre la restricción unique_city_timestamp"""
+
+        if not rows:
+            return
+
+        upsert_insert = dialect_insert(self.db)
+        if upsert_insert is None:
+            self._upsert_hourly_generic(rows)
+            return
+
+        stmt = upsert_insert(WeatherHourly.__table__).values(rows)
+        set_ = {column: stmt.excluded[column] for column in UPSERT_COLUMNS}
+        if self.dialect == "postgresql":
+            stmt = stmt.on_conflict_do_update(constraint="unique_city_timestamp", set_=set_)
+        else:
+            stmt = stmt.on_conflict_do_update(index_elements=["city_id", "ts"], set_=set_)
+
+        self.db.execute(stmt)
+
+    def _upsert_latest(self, rows: List[Dict[str, Any]]):
+        """UPSERT de weather_latest (una fila por ciudad, nunca retrocede en el tiempo)"""
+
+        latest: Dict[int, Dict[str, Any]] = {}
+        for row in rows:
+            current = latest.get(row["city_id"])
+            if current is None or row["ts"] >= current["ts"]:
+                latest[row["city_id"]] = row
+        if not latest:
+            return
+
+        upsert_insert = dialect_insert(self.db)
+        if upsert_insert is None:
+            self._upsert_latest_generic(list(latest.values()))
+            return
+
+        table = WeatherLatest.__table__
+        stmt = upsert_insert(table).values(list(latest.values()))
+        set_ = {column: stmt.excluded[column] for column in ["ts"] + UPSERT_COLUMNS}
+        set_["updated_at"] = func.now()
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["city_id"],
+            set_=set_,
+            where=table.c.ts <= stmt.excluded.ts
+        )
+
+        self.db.execute(stmt)
+
+    def _upsert_latest_generic(self, rows: List[Dict[str, Any]]):
+        """Alternativa de weather_latest para motores sin ON CONFLICT"""
+
+        for row in rows:
+            existing = self.db.get(WeatherLatest, row["city_id"])
+            if existing is None:
+                self.db.add(WeatherLatest(**row))
+            elif existing.ts <= row["ts"]:
+                for column in ["ts"] + UPSERT_COLUMNS:
+                    setattr(existing, column, row[column])
+        self.db.flush()
+
+    def _upsert_hourly_generic(self, rows: List[Dict[str, Any]]):
+        """Alternativa para motores sin ON CONFLICT (fila a fila)"""
+
+        for row in rows:
+            existing = self.db.query(WeatherHourly).filter(
+                WeatherHourly.city_id == row["city_id"],
+                WeatherHourly.ts == row["ts"]
+            ).first()
+            if existing:
+                for column in UPSERT_COLUMNS:
+                    setattr(existing, column, row[column])
+            else:
+                self.db.add(WeatherHourly(**row))
+        self.db.flush()
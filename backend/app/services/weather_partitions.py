@@ -0,0 +1,150 @@
+"""
+Particiones mensuales de weather_hourly en PostgreSQL: creación anticipada y retirada de meses caducados
+"""
+import re
+import structlog
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.config import settings
+
+logger = structlog.get_logger()
+
+PARENT_TABLE = "weather_hourly"
+
+_PARTITION_NAME = re.compile(r"^weather_hourly_p(\d{4})_(\d{2})$")
+
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    years, index = divmod(month.month - 1 + months, 12)
+    return date(month.year + years, index + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_p{month:%Y_%m}"
+
+
+def partition_month(name: str) -> Optional[date]:
+    """Mes de una partición por su nombre (None si no sigue el formato mensual)"""
+
+    match = _PARTITION_NAME.match(name)
+    if match is None:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def create_partition_sql(month: date) -> str:
+    """DDL de la partición del mes (límites en UTC: ts es timestamptz)"""
+
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {PARENT_TABLE} "
+        f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{add_months(month, 1).isoformat()} 00:00:00+00')"
+    )
+
+
+class WeatherPartitionService:
+    """Mantenimiento de las particiones mensuales de weather_hourly.
+
+    No hay partición DEFAULT: una fila de un mes sin partición se rechaza, así que los
+    meses futuros deben crearse con antelación (arranque de la API y mantenimiento
+    diario). Sin particionado (SQLite o PostgreSQL sin la migración 005 activada) todas las
+    operaciones son no-op: la tabla es una tabla normal.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def is_partitioned(self) -> bool:
+        if self.db.get_bind().dialect.name != "postgresql":
+            return False
+        return bool(self.db.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table))"
+        ), {"table": PARENT_TABLE}).scalar())
+
+    def list_partitions(self) -> List[Tuple[str, Optional[date]]]:
+        """(nombre, mes) de las particiones adjuntas"""
+
+        rows = self.db.execute(text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:table) ORDER BY c.relname"
+        ), {"table": PARENT_TABLE}).scalars().all()
+        return [(name, partition_month(name)) for name in rows]
+
+    def ensure_partitions(self, months_ahead: int, today: Optional[date] = None) -> List[str]:
+        """Crear las particiones del mes actual y de los `months_ahead` siguientes que falten"""
+
+        current = month_start(today or datetime.now(timezone.utc).date())
+        existing = {name for name, _ in self.list_partitions()}
+        created = []
+        for offset in range(months_ahead + 1):
+            month = add_months(current, offset)
+            if partition_name(month) in existing:
+                continue
+            self.db.execute(text(create_partition_sql(month)))
+            created.append(partition_name(month))
+        self.db.commit()
+        return created
+
+    def detach_expired(self, retention_months: int, drop: bool = False, today: Optional[date] = None) -> List[str]:
+        """Desadjuntar (y opcionalmente borrar) las particiones anteriores a la retención.
+
+        Se conservan el mes actual y los `retention_months` anteriores. Sin `drop` la
+        partición queda como tabla independiente (archivo) fuera de las consultas.
+        """
+
+        cutoff = add_months(month_start(today or datetime.now(timezone.utc).date()), -retention_months)
+        expired = [name for name, month in self.list_partitions() if month is not None and month < cutoff]
+        for name in expired:
+            self.db.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+            if drop:
+                self.db.execute(text(f"DROP TABLE {name}"))
+        self.db.commit()
+        return expired
+
+    def ensure_upcoming(self, months_ahead: Optional[int] = None) -> List[str]:
+        """Solo crear las particiones que falten (arranque de la API; nunca desadjunta)"""
+
+        if not self.is_partitioned():
+            return []
+
+        months_ahead = settings.weather_hourly_partition_months_ahead if months_ahead is None else months_ahead
+        try:
+            created = self.ensure_partitions(months_ahead)
+        except Exception:
+            self.db.rollback()
+            raise
+
+        if created:
+            logger.info("Particiones de weather_hourly creadas", created=created)
+        return created
+
+    def maintain(
+        self,
+        months_ahead: Optional[int] = None,
+        retention_months: Optional[int] = None,
+        drop: bool = False
+    ) -> Dict[str, Any]:
+        """Crear particiones futuras y retirar las caducadas (retención 0 = conservar todo)"""
+
+        if not self.is_partitioned():
+            return {"partitioned": False, "created": [], "detached": []}
+
+        months_ahead = settings.weather_hourly_partition_months_ahead if months_ahead is None else months_ahead
+        retention_months = settings.weather_hourly_retention_months if retention_months is None else retention_months
+
+        try:
+            created = self.ensure_partitions(months_ahead)
+            detached = self.detach_expired(retention_months, drop=drop) if retention_months > 0 else []
+        except Exception:
+            self.db.rollback()
+            raise
+
+        if created or detached:
+            logger.info("Particiones de weather_hourly actualizadas",
+                        created=created, detached=detached, dropped=drop and bool(detached))
+        return {"partitioned": True, "created": created, "detached": detached}
@@ -1,8 +1,8 @@
 """
 Servicio para conversión de datos meteorológicos
 """
-from app.models import WeatherHourly
-from app.schemas import WeatherData, TemperatureUnit
+from app.models import WeatherHourly, WeatherDaily
+from app.schemas import WeatherData, WeatherDailyData, TemperatureUnit
 
 
 class WeatherService:
@@ -20,6 +20,13 @@ class WeatherService:
         else:
             return temp_c
     
+    @staticmethod
+    def convert_temperature_delta(delta_c: float, unit: TemperatureUnit) -> float:
+        """Convertir una diferencia de temperatura (p. ej. desviación estándar): solo escala"""
+        if unit == TemperatureUnit.FAHRENHEIT:
+            return round(delta_c * 9/5, 2)
+        return round(delta_c, 2)
+    
     @staticmethod
     def convert_weather_data(weather_hourly: WeatherHourly, unit: TemperatureUnit) -> WeatherData:
         """Convertir datos meteorológicos a la unidad especificada"""
@@ -43,6 +50,23 @@ class WeatherService:
             ts=weather_hourly.ts  # Incluir timestamp
         )
     
+    @staticmethod
+    def convert_daily_data(weather_daily: WeatherDaily, unit: TemperatureUnit) -> WeatherDailyData:
+        """Convertir un agregado diario a la unidad especificada"""
+        
+        def convert(temp_c):
+            return WeatherService.convert_temperature(temp_c, unit) if temp_c is not None else None
+        
+        return WeatherDailyData(
+            day=weather_daily.day,
+            temp_min=convert(weather_daily.temp_min),
+            temp_max=convert(weather_daily.temp_max),
+            temp_avg=convert(weather_daily.temp_avg),
+            humidity_avg=round(weather_daily.humidity_avg, 2) if weather_daily.humidity_avg is not None else None,
+            precip_total=weather_daily.precip_total,
+            unit=unit
+        )
+    
     @staticmethod
     def get_unit_symbol(unit: TemperatureUnit) -> str:
         """Obtener símbolo de unidad de temperatura"""
@@ -0,0 +1,141 @@
+"""
+Reducción de series para gráficas: LTTB y min/max por intervalo sobre arrays numpy
+"""
+from datetime import datetime
+from operator import attrgetter
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+
+# Puntos por intervalo a partir de los que el área de LTTB se calcula con numpy; en
+# intervalos más cortos cuesta más la llamada que el bucle (scripts/bench_downsampling.py)
+NUMPY_MIN_BUCKET = 64
+
+
+def _as_values(ys: Sequence[Optional[float]]) -> np.ndarray:
+    """Valores como float64 (None -> NaN)"""
+
+    return np.asarray(ys, dtype=np.float64)
+
+
+def _bucket_starts(n: int, buckets: int) -> np.ndarray:
+    """Inicio de cada intervalo del rango interior [1, n - 1), más el cierre n - 1"""
+
+    every = (n - 2) / buckets
+    return (np.arange(buckets + 1) * every).astype(np.int64) + 1
+
+
+def lttb_indices(xs: Sequence[float], ys: Sequence[Optional[float]], max_points: int) -> List[int]:
+    """Índices elegidos por Largest-Triangle-Three-Buckets (conserva la forma visual)
+
+    Queda un bucle por intervalo (cada elección depende de la anterior); en los
+    intervalos anchos el área y el argmax se calculan con numpy sobre el intervalo.
+    """
+
+    n = len(xs)
+    if max_points >= n or max_points < 3:
+        return list(range(n))
+
+    x = np.asarray(xs, dtype=np.float64)
+    y = _as_values(ys)
+    buckets = max_points - 2
+    starts = _bucket_starts(n, buckets)
+
+    # Valores por intervalo; la última posición cubre el punto final [n - 1, n)
+    sizes = np.diff(np.append(starts, n))
+    y_counts = np.add.reduceat((~np.isnan(y)).astype(np.int64), starts)
+    has_values = (y_counts > 0).tolist()
+    # Los intervalos completos usan argmax directo (sin el coste de nanargmax)
+    has_gaps = (y_counts < sizes).tolist()
+    starts = starts.tolist() + [n]
+    xs_list = x.tolist()
+    ys_list = y.tolist()
+
+    # Medias con sum() secuencial: mismo redondeo (y desempate) que la suma por filas
+    x_means, y_means = [], []
+    for bucket in range(buckets + 1):
+        start, end = starts[bucket], starts[bucket + 1]
+        x_means.append(sum(xs_list[start:end]) / (end - start))
+        values = ys_list[start:end]
+        if has_gaps[bucket]:
+            values = [value for value in values if value == value]
+        y_means.append(sum(values) / len(values) if values else None)
+
+    selected = [0]
+    a = 0
+    for bucket in range(buckets):
+        # Punto medio del intervalo siguiente (tercer vértice del triángulo)
+        avg_x = x_means[bucket + 1]
+        next_mean = y_means[bucket + 1]
+
+        ax = xs_list[a]
+        ay = ys_list[a]
+        if ay != ay:  # NaN: punto anterior sin valor
+            ay = next_mean if next_mean is not None else 0.0
+        avg_y = next_mean if next_mean is not None else ay
+
+        start, end = starts[bucket], starts[bucket + 1]
+        if not has_values[bucket]:
+            best = start
+        elif end - start >= NUMPY_MIN_BUCKET:
+            area = np.abs((ax - avg_x) * (y[start:end] - ay) - (ax - x[start:end]) * (avg_y - ay))
+            best = start + int(np.nanargmax(area) if has_gaps[bucket] else area.argmax())
+        else:
+            best, best_area = start, -1.0
+            for i in range(start, end):
+                value = ys_list[i]
+                if value != value:
+                    continue
+                area = abs((ax - avg_x) * (value - ay) - (ax - xs_list[i]) * (avg_y - ay))
+                if area > best_area:
+                    best, best_area = i, area
+
+        selected.append(best)
+        a = best
+
+    selected.append(n - 1)
+    return selected
+
+
+def minmax_indices(ys: Sequence[Optional[float]], max_points: int) -> List[int]:
+    """Índices del mínimo y el máximo de cada intervalo (conserva todos los picos)"""
+
+    n = len(ys)
+    if max_points >= n or max_points < 4:
+        return list(range(n))
+
+    y = _as_values(ys)
+    buckets = (max_points - 2) // 2
+    bounds = np.minimum(_bucket_starts(n, buckets), n - 1)
+    starts = bounds[:-1]
+    bucket_of = np.repeat(np.arange(buckets), np.diff(bounds))
+    interior = y[1:bounds[-1]]
+    positions = np.arange(1, bounds[-1])
+
+    # Extremos por intervalo (fmin/fmax ignoran NaN) y primera posición que los alcanza
+    lows = np.fmin.reduceat(interior, starts - 1)
+    highs = np.fmax.reduceat(interior, starts - 1)
+    low_at = np.minimum.reduceat(np.where(interior == lows[bucket_of], positions, n), starts - 1)
+    high_at = np.minimum.reduceat(np.where(interior == highs[bucket_of], positions, n), starts - 1)
+
+    found = low_at < n  # intervalos con algún valor
+    selected = np.concatenate(([0, n - 1], low_at[found], high_at[found]))
+    return np.unique(selected).tolist()
+
+
+def downsample_rows(rows: Sequence[Any], column: str, max_points: Optional[int], method: str = "lttb") -> List[Any]:
+    """Reducir filas con `ts` (Row u ORM) usando la columna indicada como eje Y"""
+
+    if not max_points or len(rows) <= max_points:
+        return list(rows)
+
+    # Arrays por columna con map/attrgetter (Row u ORM), sin bucle Python por fila
+    ys = _as_values(list(map(attrgetter(column), rows)))
+    if method == "minmax":
+        indices = minmax_indices(ys, max_points)
+    else:
+        timestamps = map(datetime.timestamp, map(attrgetter("ts"), rows))
+        xs = np.fromiter(timestamps, dtype=np.float64, count=len(rows))
+        indices = lttb_indices(xs, ys, max_points)
+
+    return [rows[i] for i in indices]
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Recalcular weather_daily a partir del histórico de weather_hourly
+
+El arranque de la API ya la rellena si está vacía; este script sirve para recalcular
+ciudades o rangos concretos.
+"""
+import argparse
+import sys
+import os
+from datetime import date
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal
+from app.services.daily_service import DailyWeatherService
+import structlog
+
+logger = structlog.get_logger()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--city-id", type=int, action="append", help="Ciudad a recalcular (repetible; por defecto todas)")
+    parser.add_argument("--from-day", type=date.fromisoformat, help="Primer día (YYYY-MM-DD)")
+    parser.add_argument("--to-day", type=date.fromisoformat, help="Último día (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        total = DailyWeatherService(db).backfill(args.city_id, args.from_day, args.to_day)
+        logger.info("weather_daily actualizada", rows=total)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
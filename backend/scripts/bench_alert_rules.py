@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Benchmark de evaluación de alertas tras una ingesta: bucle por alerta (if-chains)
+frente al índice compilado con búsqueda binaria, y escritura fila a fila frente a
+un INSERT masivo sobre una base SQLite temporal
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+# Añadir el directorio backend al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Permitir ejecutar el benchmark sin .env (usa su propia base SQLite)
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("POSTGRES_USER", "bench")
+os.environ.setdefault("POSTGRES_PASSWORD", "bench")
+os.environ.setdefault("OPENWEATHER_API_KEY", "bench")
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from app.database import Base
+from app.models import AlertHistory
+from app.services.alert_rules import AlertRuleIndex, observed_value
+
+OPERATORS = [">", "<", "=", ">=", "<="]
+
+# Métrica -> (rango de umbrales, unidades posibles)
+METRICS = {
+    "temp": ((-10.0, 45.0), [None, "c", "f", "k"]),
+    "humidity": ((0.0, 100.0), [None]),
+    "wind": ((0.0, 30.0), [None]),
+    "pressure": ((970.0, 1040.0), [None]),
+    "clouds": ((0.0, 100.0), [None]),
+    "visibility": ((0.0, 10000.0), [None]),
+}
+
+
+def build_alerts(count: int, cities: int, rng: random.Random):
+    """Tuplas (id, user_id, city_id, metric, operator, threshold, unit, hysteresis, cooldown) como las lee el motor"""
+
+    alerts = []
+    for alert_id in range(1, count + 1):
+        metric = rng.choice(list(METRICS))
+        (low, high), units = METRICS[metric]
+        unit = rng.choice(units)
+        threshold = round(rng.uniform(low, high), 1)
+        if unit == "f":
+            threshold = round(threshold * 9/5 + 32, 1)
+        elif unit == "k":
+            threshold = round(threshold + 273.15, 1)
+        alerts.append((alert_id, rng.randint(1, count // 5 or 1), rng.randint(1, cities), metric,
+                       rng.choice(OPERATORS), threshold, unit, None, None))
+    return alerts
+
+
+def build_observations(cities: int, rng: random.Random):
+    """Una observación por ciudad (filas de weather_hourly tal como las devuelve el cargador)"""
+
+    ts = datetime(2024, 7, 1, 12, tzinfo=timezone.utc)
+    return [
+        {
+            "city_id": city_id, "ts": ts, "temp_c": round(rng.uniform(-5, 42), 2),
+            "humidity": rng.randint(10, 100), "wind_speed": round(rng.uniform(0, 25), 2),
+            "pressure": rng.randint(980, 1035), "clouds": rng.randint(0, 100), "visibility": rng.choice([0, 5000, 10000])
+        }
+        for city_id in range(1, cities + 1)
+    ]
+
+
+def evaluate_naive(alerts, observations):
+    """Camino anterior: alertas de cada ciudad y condición evaluada una a una"""
+
+    by_city = {}
+    for alert in alerts:
+        by_city.setdefault(alert[2], []).append(alert)
+
+    fired = []
+    for row in observations:
+        for alert_id, user_id, city_id, metric, operator, threshold, unit, _, _ in by_city.get(row["city_id"], ()):
+            value = observed_value(metric, row, unit)
+            if value is None:
+                continue
+            if operator == ">":
+                met = value > threshold
+            elif operator == "<":
+                met = value < threshold
+            elif operator == "=":
+                met = abs(value - threshold) < 0.1
+            elif operator == ">=":
+                met = value >= threshold
+            else:
+                met = value <= threshold
+            if met:
+                fired.append((alert_id, row["city_id"], value))
+    return fired
+
+
+def evaluate_index(index, observations):
+    return [
+        (alert_id, row["city_id"], value)
+        for row in observations
+        for _, _, _, (alert_id, *_), value in index.match(row)
+    ]
+
+
+def history_rows(fired, observations):
+    ts = observations[0]["ts"]
+    return [
+        {"alert_id": alert_id, "user_id": 1, "city_id": city_id, "ts": ts, "metric": "temp",
+         "operator": ">", "threshold": 0.0, "observed_value": value}
+        for alert_id, city_id, value in fired
+    ]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--alerts", type=int, default=100_000)
+    parser.add_argument("--cities", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--write-limit", type=int, default=2000,
+                        help="Activaciones escritas en la comparación fila a fila (es lenta)")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    alerts = build_alerts(args.alerts, args.cities, rng)
+    observations = build_observations(args.cities, rng)
+
+    index, compile_ms = timed(AlertRuleIndex, alerts)
+    naive, naive_ms = timed(evaluate_naive, alerts, observations)
+    compiled, index_ms = timed(evaluate_index, index, observations)
+    assert sorted(naive) == sorted(compiled), "El índice no coincide con la evaluación alerta a alerta"
+
+    print(f"{args.alerts} alertas, {args.cities} ciudades, {len(compiled)} activaciones")
+    print(f"compilar índice       {compile_ms:9.1f} ms (una vez; se reutiliza entre ejecuciones)")
+    print(f"bucle por alerta      {naive_ms:9.1f} ms")
+    print(f"índice compilado      {index_ms:9.1f} ms | x{naive_ms / max(index_ms, 1e-6):.1f}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/bench.db")
+        Base.metadata.create_all(engine)
+        factory = sessionmaker(bind=engine)
+        rows = history_rows(compiled, observations)
+        sample = rows[:args.write_limit]
+
+        session = factory()
+        start = time.perf_counter()
+        for row in sample:
+            session.add(AlertHistory(**row))
+            session.commit()
+        per_row_ms = (time.perf_counter() - start) * 1000
+        session.close()
+
+        session = factory()
+        start = time.perf_counter()
+        session.execute(insert(AlertHistory), rows)
+        session.commit()
+        bulk_ms = (time.perf_counter() - start) * 1000
+        session.close()
+
+        print(f"escritura fila a fila {per_row_ms:9.1f} ms para {len(sample)} activaciones "
+              f"(~{per_row_ms / max(len(sample), 1) * len(rows):.0f} ms estimados para {len(rows)})")
+        print(f"INSERT masivo         {bulk_ms:9.1f} ms para {len(rows)} activaciones")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark de CityResolver con un catálogo sintético de ciudades
+frente a la búsqueda anterior (LIKE '%x%' sobre la tabla cities en SQLite)
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import string
+import sys
+import time
+
+# Añadir el directorio backend al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Permitir ejecutar el benchmark sin .env (no se usa la base de datos de la app)
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("POSTGRES_USER", "bench")
+os.environ.setdefault("POSTGRES_PASSWORD", "bench")
+os.environ.setdefault("OPENWEATHER_API_KEY", "bench")
+
+from app.services.city_resolver import CityResolver, fold_city_name
+
+SUFFIXES = ["", "", "", " de la Sierra", " del Mar", " City", " Nová", " São João"]
+COUNTRIES = ["ES", "MX", "AR", "CO", "US", "FR", "BR", "CZ"]
+
+
+def build_catalog(count: int, seed: int = 42):
+    """Tuplas (id, nombre, país) con nombres de varias palabras y acentos"""
+
+    rng = random.Random(seed)
+    catalog = [
+        (city_id,
+         "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 10))).title()
+         + rng.choice(SUFFIXES),
+         rng.choice(COUNTRIES))
+        for city_id in range(1, count + 1)
+    ]
+    # Ciudades reales para las consultas por alias
+    catalog += [(count + 1, "New York", "US"), (count + 2, "São Paulo", "BR"), (count + 3, "Bogotá", "CO")]
+    return catalog
+
+
+def measure(func, queries, repeat: int):
+    """Latencias por consulta en microsegundos"""
+
+    samples = []
+    for _ in range(repeat):
+        for query in queries:
+            start = time.perf_counter()
+            func(query)
+            samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return {
+        "p50": statistics.median(samples),
+        "p99": samples[int(len(samples) * 0.99) - 1],
+        "mean": statistics.fmean(samples)
+    }
+
+
+def report(label: str, stats):
+    print(f"{label:<30} p50={stats['p50']:>10.1f}µs  p99={stats['p99']:>10.1f}µs  media={stats['mean']:>10.1f}µs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cities", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=500, help="Consultas distintas por escenario")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--like-queries", type=int, default=50, help="Consultas LIKE de referencia (0 = omitir)")
+    args = parser.parse_args()
+
+    catalog = build_catalog(args.cities)
+    rng = random.Random(7)
+    sample = rng.sample(catalog, min(args.queries, len(catalog)))
+
+    resolver = CityResolver(refresh_seconds=0)
+    start = time.perf_counter()
+    resolver.build(catalog)
+    print(f"Catálogo: {len(catalog)} ciudades, índice construido en {time.perf_counter() - start:.2f}s")
+
+    lookup = resolver._index.lookup
+    scenarios = {
+        "exacto (nombre completo)": [fold_city_name(name) for _, name, _ in sample],
+        "alias (nueva_york, ...)": ["nueva york", "san pablo", "bogota dc"] * (args.queries // 3 or 1),
+        "prefijo (3 letras)": [fold_city_name(name)[:3] for _, name, _ in sample],
+        "palabra interior": ["sierra", "mar", "city", "nova"] * (args.queries // 4 or 1),
+        "sin coincidencia": ["zzzz" + str(i) for i in range(args.queries)],
+    }
+    for label, queries in scenarios.items():
+        report(label, measure(lookup, queries, args.repeat))
+
+    # Camino de la API sin BD: plegado de acentos + filtro por país
+    resolve = lambda query: lookup(fold_city_name(query[0]), fold_city_name(query[1]))
+    report("plegado + país", measure(resolve, [(name, country) for _, name, country in sample], args.repeat))
+
+    if args.like_queries:
+        conn = sqlite3.connect(":memory:")
+        conn.execute("CREATE TABLE cities (id INTEGER PRIMARY KEY, name TEXT, country TEXT)")
+        conn.executemany("INSERT INTO cities VALUES (?, ?, ?)", catalog)
+        like = lambda query: conn.execute(
+            "SELECT id FROM cities WHERE name LIKE ? LIMIT 1", (f"%{query}%",)
+        ).fetchone()
+        misses = ["zzzz" + str(i) for i in range(args.like_queries)]
+        hits = [name for _, name, _ in sample[:args.like_queries]]
+        report("LIKE '%x%' (acierto)", measure(like, hits, 1))
+        report("LIKE '%x%' (sin coincidencia)", measure(like, misses, 1))
+
+
+if __name__ == "__main__":
+    main()
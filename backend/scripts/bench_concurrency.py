@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Benchmark de concurrencia de la API: peticiones/segundo de un único worker uvicorn
+en los endpoints de lectura (weather, cities, alerts)
+
+Para comparar antes/después se lanza el mismo benchmark (misma base y misma carga)
+contra otro checkout con --app-dir:
+
+    python scripts/bench_concurrency.py
+    git worktree add /tmp/weatherhub-antes <commit>
+    python scripts/bench_concurrency.py --app-dir /tmp/weatherhub-antes/backend
+
+Con SQLite la E/S es casi nula y el resultado mide sobre todo CPU; la diferencia entre
+acceso síncrono y async aparece con latencia de red real (--database-url a PostgreSQL).
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Añadir el directorio backend al path
+sys.path.append(BACKEND_DIR)
+
+# Permitir ejecutar el benchmark sin .env; el servidor usa la misma clave JWT
+os.environ.setdefault("POSTGRES_USER", "bench")
+os.environ.setdefault("POSTGRES_PASSWORD", "bench")
+os.environ.setdefault("OPENWEATHER_API_KEY", "bench")
+os.environ.setdefault("JWT_SECRET_KEY", "bench-secret")
+
+CITY_COUNT = 20
+BENCH_EMAIL = "bench@weatherhub.local"
+
+# Escenarios: nombre -> ruta (relativa a la raíz de la API)
+SCENARIOS = {
+    "current": "/weather/current?city=Ciudad 1",
+    "history": "/weather/history/temperature?city=Ciudad 2&from_date={from_date}&to_date={to_date}",
+    "compare": "/weather/compare/humidity?cities=Ciudad 3,Ciudad 4&from_date={from_date}&to_date={to_date}",
+    "cities": "/cities/?limit=50",
+    "alerts": "/alerts/history/?limit=50",
+}
+
+
+def seed(database_url: str, rows: int) -> datetime:
+    """Ciudades, observaciones horarias, usuario y activaciones de alerta (si la base está vacía)"""
+
+    from sqlalchemy import create_engine, insert
+    from sqlalchemy.orm import sessionmaker
+    from app.database import Base
+    from app.models import Alert, AlertHistory, City, User, WeatherHourly
+
+    start = datetime(2024, 1, 1)
+    engine = create_engine(database_url)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    try:
+        if session.query(City.id).first() is not None:
+            return start
+
+        session.add_all([
+            City(id=i, name=f"Ciudad {i}", country="XX", lat=float(i), lon=float(i)) for i in range(1, CITY_COUNT + 1)
+        ])
+        # Hash fijo: el benchmark no inicia sesión, usa un token firmado con JWT_SECRET_KEY
+        user = User(email=BENCH_EMAIL, password_hash="!")
+        session.add(user)
+        session.commit()
+
+        session.execute(insert(WeatherHourly), [
+            {
+                "city_id": city_id, "ts": start + timedelta(hours=i), "temp_c": 15 + (i % 10), "feels_like_c": 14.0,
+                "humidity": 40 + (i % 50), "pressure": 1000 + (i % 30), "wind_speed": 3.5, "wind_deg": i % 360,
+                "clouds": i % 100, "visibility": 10000, "weather_main": "Clouds", "weather_description": "nubes dispersas"
+            }
+            for city_id in range(1, CITY_COUNT + 1)
+            for i in range(rows)
+        ])
+
+        alert = Alert(user_id=user.id, city_id=1, metric="temp", operator=">", threshold=20.0, unit="c")
+        session.add(alert)
+        session.flush()
+        session.execute(insert(AlertHistory), [
+            {
+                "alert_id": alert.id, "user_id": user.id, "city_id": 1, "ts": start + timedelta(hours=i),
+                "metric": "temp", "operator": ">", "threshold": 20.0, "observed_value": 21.0
+            }
+            for i in range(200)
+        ])
+        session.commit()
+        return start
+    finally:
+        session.close()
+        engine.dispose()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(app_dir: str, database_url: str, port: int) -> subprocess.Popen:
+    """uvicorn con un solo worker sobre el checkout indicado"""
+
+    env = dict(
+        os.environ,
+        DATABASE_URL=database_url,
+        DEBUG="false",
+        ETL_ENABLED="false",
+        LOG_LEVEL="WARNING",
+        PYTHONPATH=app_dir
+    )
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", "1", "--log-level", "warning", "--no-access-log"],
+        cwd=app_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+async def wait_ready(client, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("El servidor no arrancó a tiempo")
+
+
+async def run_scenario(client, path: str, concurrency: int, requests: int):
+    """Peticiones/segundo, latencias p50/p95 (ms) y errores con `concurrency` clientes"""
+
+    import httpx
+
+    latencies = []
+    errors = 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                response = await client.get(path)
+                if response.status_code != 200:
+                    errors += 1
+            except httpx.HTTPError:
+                # Timeouts incluidos: un event loop bloqueado deja de responder
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    return len(latencies) / elapsed, statistics.median(latencies), p95, errors
+
+
+async def bench(base_url: str, token: str, scenarios, start: datetime, rows: int, args):
+    import httpx
+
+    window = {"from_date": start.isoformat(), "to_date": (start + timedelta(hours=rows)).isoformat()}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    headers = {"Authorization": f"Bearer {token}"}
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=args.timeout) as client:
+        await wait_ready(client)
+        for name in scenarios:
+            path = SCENARIOS[name].format(**window)
+            # Calentamiento: caché de usuario, índice de ciudades y conexiones del pool
+            await run_scenario(client, path, args.concurrency, args.concurrency * 2)
+            rps, p50, p95, errors = await run_scenario(client, path, args.concurrency, args.requests)
+            print(f"{name:<10} {rps:8.1f} req/s | p50 {p50:7.1f} ms | p95 {p95:7.1f} ms | errores {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app-dir", default=BACKEND_DIR, help="Directorio backend del checkout a medir")
+    parser.add_argument("--database-url", default="", help="Base de pruebas (vacía = SQLite temporal)")
+    parser.add_argument("--rows", type=int, default=2000, help="Observaciones horarias por ciudad")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=500, help="Peticiones por escenario")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--timeout", type=float, default=60.0, help="Timeout por petición (segundos)")
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    for name in scenarios:
+        if name not in SCENARIOS:
+            parser.error(f"Escenario '{name}' no válido. Escenarios: {', '.join(SCENARIOS)}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url or f"sqlite:///{tmp}/bench.db"
+        os.environ["DATABASE_URL"] = database_url
+        start = seed(database_url, args.rows)
+
+        from app.auth import create_access_token
+        token = create_access_token(data={"sub": BENCH_EMAIL}, expires_delta=timedelta(hours=1))
+
+        port = free_port()
+        server = start_server(os.path.abspath(args.app_dir), database_url, port)
+        try:
+            print(f"{args.app_dir}: 1 worker, {args.concurrency} clientes, {args.requests} peticiones por escenario")
+            asyncio.run(bench(f"http://127.0.0.1:{port}", token, scenarios, start, args.rows, args))
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+                server.wait()
+
+
+if __name__ == "__main__":
+    main()
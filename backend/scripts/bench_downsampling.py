@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Benchmark de reducción de series (LTTB y min/max) con filas como las de SeriesService
+
+Sirve para ajustar NUMPY_MIN_BUCKET en app/utils/downsampling.py: `--min-bucket 0`
+fuerza numpy en todos los intervalos y un valor enorme fuerza el bucle Python.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+# Añadir el directorio backend al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils import downsampling
+
+# Misma interfaz que los Row de SQLAlchemy (_fields y acceso por atributo)
+SeriesRow = namedtuple("SeriesRow", ["ts", "temp_c"])
+
+
+def make_rows(count: int, rng: random.Random):
+    """Serie horaria con ruido y algún hueco (None)"""
+
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [
+        SeriesRow(start + timedelta(hours=i), None if rng.random() < 0.01 else 15 + 10 * rng.random())
+        for i in range(count)
+    ]
+
+
+def run(rows, max_points: int, method: str, repeat: int) -> float:
+    """Mediana en ms de downsample_rows"""
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        downsampling.downsample_rows(rows, "temp_c", max_points, method)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="10000,100000", help="Tamaños de serie")
+    parser.add_argument("--max-points", default="200,1000,5000", help="Puntos de salida")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--min-bucket", type=int, help="Sustituir NUMPY_MIN_BUCKET")
+    args = parser.parse_args()
+
+    if args.min_bucket is not None:
+        downsampling.NUMPY_MIN_BUCKET = args.min_bucket
+
+    rng = random.Random(7)
+    print(f"NUMPY_MIN_BUCKET={downsampling.NUMPY_MIN_BUCKET}, mediana de {args.repeat} repeticiones")
+    print(f"{'filas':>8} {'puntos':>7} {'ancho':>6} {'lttb ms':>9} {'minmax ms':>10}")
+    for count in (int(value) for value in args.rows.split(",")):
+        rows = make_rows(count, rng)
+        for max_points in (int(value) for value in args.max_points.split(",")):
+            lttb_ms = run(rows, max_points, "lttb", args.repeat)
+            minmax_ms = run(rows, max_points, "minmax", args.repeat)
+            width = count / max(1, max_points - 2)
+            print(f"{count:>8} {max_points:>7} {width:>6.0f} {lttb_ms:>9.1f} {minmax_ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la extracción concurrente del ETL contra un stub local de OpenWeatherMap
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# Añadir el directorio backend al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Permitir ejecutar el benchmark sin .env (no se usa la base de datos)
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("POSTGRES_USER", "bench")
+os.environ.setdefault("POSTGRES_PASSWORD", "bench")
+os.environ.setdefault("OPENWEATHER_API_KEY", "bench")
+
+from app.models import City
+from app.config import settings
+from app.services.openweather_client import OpenWeatherClient
+from app.services.rate_limiter import TokenBucket
+from stub_openweather import start_stub_server
+
+
+def build_cities(count: int):
+    """Ciudades transitorias (no se guardan en BD)"""
+    return [
+        City(id=i, name=f"Ciudad {i}", country="XX", lat=round(-60 + (i % 120), 4), lon=round(-170 + (i % 340), 4),
+             openweather_id=100000 + i)
+        for i in range(1, count + 1)
+    ]
+
+
+async def run_level(base_url: str, cities, concurrency: int, group: bool, rate: int):
+    # Sin --rate el limitador no debe ser el cuello de botella del benchmark
+    limiter = TokenBucket(rate, burst=max(1, rate // 60)) if rate else TokenBucket(10 ** 9, burst=10 ** 6)
+    async with OpenWeatherClient(base_url, "bench", concurrency=concurrency, limiter=limiter) as client:
+        start = time.perf_counter()
+        if group:
+            results = await client.fetch_cities_batched(cities)
+        else:
+            results = await client.fetch_cities(cities)
+        elapsed = time.perf_counter() - start
+    errors = sum(1 for _, _, error in results if error is not None)
+    return elapsed, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cities", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="Latencia simulada por petición (s)")
+    parser.add_argument("--levels", default="1,5,10,25,50", help="Niveles de concurrencia")
+    parser.add_argument("--group", action="store_true", help="Usar el endpoint /group (20 IDs por llamada)")
+    parser.add_argument("--rate", type=int, default=0, help="Llamadas/minuto del token bucket (0 = sin límite)")
+    parser.add_argument("--fail-every", type=int, default=0, help="El stub responde 429 cada N peticiones")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(latency=args.latency, fail_every=args.fail_every)
+    # Reintentos rápidos: el stub envía Retry-After: 0
+    settings.etl_retry_delay = 0
+    cities = build_cities(args.cities)
+    levels = [int(level) for level in args.levels.split(",")]
+
+    mode = "/group" if args.group else "/weather"
+    print(f"[INFO] {args.cities} ciudades vía {mode}, latencia simulada {args.latency * 1000:.0f} ms")
+    print(f"{'concurrencia':>12} {'segundos':>10} {'ciudades/s':>12} {'peticiones':>11} {'errores':>8}")
+    try:
+        for level in levels:
+            server.request_count = 0
+            elapsed, errors = asyncio.run(run_level(base_url, cities, level, args.group, args.rate))
+            print(f"{level:>12} {elapsed:>10.2f} {args.cities / elapsed:>12.1f} {server.request_count:>11} {errors:>8}")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
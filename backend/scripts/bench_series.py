@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark de lectura de series: entidades ORM frente a SeriesService (columnas proyectadas)
+sobre una base SQLite temporal
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+# Añadir el directorio backend al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Permitir ejecutar el benchmark sin .env (usa su propia base SQLite)
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("POSTGRES_USER", "bench")
+os.environ.setdefault("POSTGRES_PASSWORD", "bench")
+os.environ.setdefault("OPENWEATHER_API_KEY", "bench")
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from app.database import Base
+from app.models import City, WeatherHourly
+from app.services.series_service import SeriesService, METRIC_COLUMNS
+
+
+def seed(session, rows: int) -> datetime:
+    """Una ciudad con `rows` observaciones horarias; devuelve el ts inicial"""
+
+    session.add(City(id=1, name="Bench", country="XX", lat=0.0, lon=0.0))
+    session.commit()
+    start = datetime(2024, 1, 1)
+    session.execute(insert(WeatherHourly), [
+        {
+            "city_id": 1, "ts": start + timedelta(hours=i), "temp_c": 15 + (i % 10), "feels_like_c": 14.0,
+            "humidity": 40 + (i % 50), "pressure": 1000 + (i % 30), "wind_speed": 3.5, "wind_deg": i % 360,
+            "clouds": i % 100, "visibility": 10000, "weather_main": "Clouds", "weather_description": "nubes dispersas"
+        }
+        for i in range(rows)
+    ])
+    session.commit()
+    return start
+
+
+# Métrica del endpoint -> columna que se serializa en el benchmark
+METRIC_VALUE = {"temperature": "temp_c", "humidity": "humidity", "pressure": "pressure", "wind": "wind_speed"}
+
+
+def orm_path(session, metric: str, from_date, to_date, limit):
+    """Camino anterior: entidades WeatherHourly completas"""
+
+    column = METRIC_VALUE[metric]
+    weather_data = session.query(WeatherHourly).filter(
+        WeatherHourly.city_id == 1,
+        WeatherHourly.ts >= from_date,
+        WeatherHourly.ts <= to_date
+    ).order_by(WeatherHourly.ts.asc()).limit(limit).all()
+    return [{"timestamp": data.ts, column: getattr(data, column), "city_id": data.city_id} for data in weather_data]
+
+
+def series_path(session, metric: str, from_date, to_date, limit):
+    """Camino nuevo: solo las columnas de la métrica como Row"""
+
+    column = METRIC_VALUE[metric]
+    weather_data = SeriesService(session).fetch(1, METRIC_COLUMNS[metric], from_date, to_date, limit)
+    return [{"timestamp": data.ts, column: getattr(data, column), "city_id": 1} for data in weather_data]
+
+
+def run(factory, func, metric, from_date, to_date, limit, repeat):
+    """Mediana de tiempo (ms) y pico de memoria (KiB) con una sesión nueva por repetición"""
+
+    timings = []
+    for _ in range(repeat):
+        session = factory()
+        start = time.perf_counter()
+        func(session, metric, from_date, to_date, limit)
+        timings.append((time.perf_counter() - start) * 1000)
+        session.close()
+
+    session = factory()
+    tracemalloc.start()
+    func(session, metric, from_date, to_date, limit)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    session.close()
+    return statistics.median(timings), peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--metrics", default="humidity,pressure,wind,temperature")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/bench.db")
+        Base.metadata.create_all(engine)
+        factory = sessionmaker(bind=engine)
+
+        session = factory()
+        start = seed(session, args.rows)
+        session.close()
+        end = start + timedelta(hours=args.rows)
+
+        print(f"{args.rows} filas, mediana de {args.repeat} repeticiones")
+        for metric in args.metrics.split(","):
+            orm_ms, orm_kib = run(factory, orm_path, metric, start, end, args.rows, args.repeat)
+            series_ms, series_kib = run(factory, series_path, metric, start, end, args.rows, args.repeat)
+            print(f"{metric:<12} ORM {orm_ms:8.1f} ms {orm_kib:9.0f} KiB | "
+                  f"columnas {series_ms:8.1f} ms {series_kib:9.0f} KiB | x{orm_ms / series_ms:.1f}")
+
+
+if __name__ == "__main__":
+    main()
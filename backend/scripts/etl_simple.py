@@ -4,86 +4,35 @@ Script ETL simplificado para WeatherHub con SQLite
 """
 import sys
 import os
-import requests
-import json
-from datetime import datetime
-from sqlalchemy.orm import Session
+import asyncio
 
 # Añadir el directorio backend al path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.database import SessionLocal
-from app.models import City, WeatherRaw, WeatherHourly
-from app.config import settings
+from app.models import City
+from app.services.alert_service import AlertService
+from app.services.openweather_client import OpenWeatherClient
+from app.services.weather_loader import WeatherLoader
 
-def get_weather_data(city_id, openweather_id):
-    """Obtener datos de OpenWeatherMap para una ciudad"""
-    try:
-        url = f"{settings.openweather_base_url}/weather"
-        params = {
-            'id': openweather_id,
-            'appid': settings.openweather_api_key,
-            'units': 'metric'
-        }
-        
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        
-        return response.json()
-    
-    except Exception as e:
-        print(f"Error obteniendo datos para ciudad {city_id}: {e}")
-        return None
+async def fetch_weather_data(cities):
+    """Obtener datos de OpenWeatherMap para todas las ciudades.
 
-def save_weather_data(db: Session, city_id: int, weather_data: dict):
-    """Guardar datos meteorológicos en la base de datos"""
-    try:
-        # Guardar datos raw
-        weather_raw = WeatherRaw(
-            city_id=city_id,
-            fetched_at=datetime.utcnow(),
-            data=json.dumps(weather_data)
-        )
-        db.add(weather_raw)
-        db.flush()  # Para obtener el ID
-        
-        # Extraer y guardar datos procesados
-        main_data = weather_data.get('main', {})
-        weather_info = weather_data.get('weather', [{}])[0]
-        wind_data = weather_data.get('wind', {})
-        
-        # Usar timestamp de la API si está disponible, sino usar hora actual
-        api_timestamp = weather_data.get('dt')
-        if api_timestamp:
-            ts = datetime.fromtimestamp(api_timestamp)
-        else:
-            ts = datetime.utcnow()
-        
-        weather_hourly = WeatherHourly(
-            city_id=city_id,
-            ts=ts,
-            temp_c=main_data.get('temp'),
-            feels_like_c=main_data.get('feels_like'),
-            humidity=main_data.get('humidity'),
-            pressure=main_data.get('pressure'),
-            wind_speed=wind_data.get('speed'),
-            wind_deg=wind_data.get('deg'),
-            clouds=weather_data.get('clouds', {}).get('all'),
-            visibility=weather_data.get('visibility'),
-            weather_main=weather_info.get('main'),
-            weather_description=weather_info.get('description'),
-            raw_id=weather_raw.id
-        )
-        
-        db.add(weather_hourly)
-        db.commit()
-        
-        return True
+    Usa el mismo cliente que el ETL de la API: token bucket por API key,
+    reintentos ante 429/5xx y llamadas /group para ciudades con openweather_id.
+    """
+    async with OpenWeatherClient() as client:
+        results = await client.fetch_cities_batched(cities)
+        quota_remaining = client.limiter.remaining
     
-    except Exception as e:
-        print(f"Error guardando datos para ciudad {city_id}: {e}")
-        db.rollback()
-        return False
+    weather_by_city = {}
+    for city, weather_data, error in results:
+        if error is not None:
+            print(f"Error obteniendo datos para ciudad {city.id}: {error}")
+        weather_by_city[city.id] = weather_data
+    
+    print(f"[INFO] Cuota restante de OpenWeatherMap: {quota_remaining} llamadas")
+    return weather_by_city
 
 def main():
     """Función principal del ETL"""
@@ -96,28 +45,34 @@ def main():
         cities = db.query(City).all()
         print(f"[INFO] Procesando {len(cities)} ciudades...")
         
-        success_count = 0
-        error_count = 0
+        # Obtener datos de OpenWeatherMap (respetando la cuota de la API key)
+        weather_by_city = asyncio.run(fetch_weather_data(cities))
         
+        records = []
+        error_count = 0
         for city in cities:
-            print(f"[PROCESS] Procesando {city.name}, {city.country}...")
-            
-            # Obtener datos de OpenWeatherMap
-            weather_data = get_weather_data(city.id, city.openweather_id)
-            
+            weather_data = weather_by_city.get(city.id)
             if weather_data:
-                # Guardar en base de datos
-                if save_weather_data(db, city.id, weather_data):
-                    success_count += 1
-                    temp = weather_data.get('main', {}).get('temp', 'N/A')
-                    print(f"[OK] {city.name}: {temp}°C")
-                else:
-                    error_count += 1
-                    print(f"[ERROR] Error guardando {city.name}")
+                records.append((city.id, weather_data))
             else:
                 error_count += 1
                 print(f"[ERROR] Error obteniendo datos de {city.name}")
         
+        # Mismo cargador que el ETL de la API: weather_raw, weather_hourly (UPSERT en UTC),
+        # weather_latest y rollup de weather_daily por lotes
+        load_result = WeatherLoader(db).load(records)
+        for city_id, error in load_result["errors"]:
+            error_count += 1
+            print(f"[ERROR] Error guardando ciudad {city_id}: {error}")
+        
+        # Alertas de las observaciones cargadas, igual que run_etl_all_cities
+        AlertService(db).evaluate_observations(load_result["loaded"])
+        
+        names = {city.id: city.name for city in cities}
+        for row in load_result["loaded"]:
+            print(f"[OK] {names[row['city_id']]}: {row['temp_c'] if row['temp_c'] is not None else 'N/A'}°C")
+        success_count = len(load_result["loaded"])
+        
         print(f"\n[COMPLETE] ETL completado!")
         print(f"[OK] Exitosos: {success_count}")
         print(f"[ERROR] Errores: {error_count}")
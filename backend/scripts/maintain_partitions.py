@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Mantener las particiones mensuales de weather_hourly (PostgreSQL): crear las de los
+próximos meses y desadjuntar (o borrar) las anteriores a la retención
+
+Pensado para ejecutarse a diario (cron); sin particionado no hace nada.
+"""
+import argparse
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal
+from app.services.weather_partitions import WeatherPartitionService
+import structlog
+
+logger = structlog.get_logger()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--months-ahead", type=int, help="Meses futuros a crear (por defecto WEATHER_HOURLY_PARTITION_MONTHS_AHEAD)")
+    parser.add_argument("--retention-months", type=int, help="Meses anteriores a conservar (por defecto WEATHER_HOURLY_RETENTION_MONTHS; 0 = todos)")
+    parser.add_argument("--drop", action="store_true", help="Borrar las particiones caducadas en lugar de dejarlas como tablas sueltas")
+    parser.add_argument("--list", action="store_true", help="Listar las particiones tras el mantenimiento")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        service = WeatherPartitionService(db)
+        result = service.maintain(args.months_ahead, args.retention_months, drop=args.drop)
+        if not result["partitioned"]:
+            logger.info("weather_hourly no está particionada; nada que hacer")
+            return
+        logger.info("Particiones de weather_hourly al día", created=result["created"], detached=result["detached"])
+        if args.list:
+            for name, month in service.list_partitions():
+                print(f"{name}\t{month.isoformat() if month else '-'}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
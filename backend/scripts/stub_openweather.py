@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Servidor local que imita la API de OpenWeatherMap (benchmarks y pruebas manuales)
+"""
+import json
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+def build_payload(key: str) -> dict:
+    """Respuesta sintética con la forma de /weather (y de cada elemento de /group)"""
+    seed = sum(ord(c) for c in key)
+    return {
+        "coord": {"lon": 0.0, "lat": 0.0},
+        "weather": [{"id": 800, "main": "Clear", "description": "cielo claro", "icon": "01d"}],
+        "main": {
+            "temp": round(10 + seed % 20 + 0.5, 2),
+            "feels_like": round(9 + seed % 20, 2),
+            "humidity": 40 + seed % 50,
+            "pressure": 1000 + seed % 30,
+        },
+        "visibility": 10000,
+        "wind": {"speed": round((seed % 100) / 10, 1), "deg": seed % 360},
+        "clouds": {"all": seed % 100},
+        "dt": int(time.time()) // 3600 * 3600,
+        "name": key,
+    }
+
+
+class StubOpenWeatherHandler(BaseHTTPRequestHandler):
+    """Handler HTTP/1.1 (keep-alive) con latencia artificial"""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency = 0.05
+    fail_every = 0  # Cada N peticiones responder `fail_status` (0 = nunca)
+    fail_status = 429
+    retry_after = "0"  # Cabecera Retry-After de las respuestas 429
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        time.sleep(self.latency)
+
+        with self.server.lock:
+            self.server.request_count += 1
+            request_number = self.server.request_count
+            self.server.requests.append((time.monotonic(), url.path, params))
+        if self.fail_every and request_number % self.fail_every == 0:
+            if self.fail_status == 429:
+                self._send_json(429, {"cod": 429, "message": "rate limit"}, {"Retry-After": self.retry_after})
+            else:
+                self._send_json(self.fail_status, {"cod": self.fail_status, "message": "server error"})
+            return
+
+        if url.path.endswith("/group"):
+            ids = [int(value) for value in params.get("id", [""])[0].split(",") if value]
+            items = []
+            for openweather_id in ids:
+                item = build_payload(str(openweather_id))
+                item["id"] = openweather_id
+                items.append(item)
+            self._send_json(200, {"cnt": len(items), "list": items})
+        elif url.path.endswith("/weather"):
+            key = (params.get("q") or params.get("id") or [f"{params.get('lat', [''])[0]},{params.get('lon', [''])[0]}"])[0]
+            self._send_json(200, build_payload(key))
+        else:
+            self._send_json(404, {"cod": "404", "message": "not found"})
+
+    def _send_json(self, status_code: int, body: dict, headers: dict = None):
+        data = json.dumps(body).encode()
+        self.send_response(status_code)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    """Servidor multihilo con cola de conexiones amplia"""
+
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = threading.Lock()
+        self.request_count = 0
+        # (instante monotónico, ruta, parámetros) de las últimas peticiones recibidas
+        self.requests = deque(maxlen=10000)
+
+
+def start_stub_server(
+    latency: float = 0.05,
+    port: int = 0,
+    fail_every: int = 0,
+    fail_status: int = 429,
+    retry_after: str = "0"
+):
+    """Arrancar el servidor en un hilo; devuelve (server, base_url)"""
+    handler = type("Handler", (StubOpenWeatherHandler,), {
+        "latency": latency, "fail_every": fail_every, "fail_status": fail_status, "retry_after": retry_after
+    })
+    server = StubServer(("127.0.0.1", port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, bound_port = server.server_address
+    return server, f"http://{host}:{bound_port}/data/2.5"
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8099
+    server, base_url = start_stub_server(port=port)
+    print(f"[INFO] Stub OpenWeatherMap en {base_url} (Ctrl+C para salir)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
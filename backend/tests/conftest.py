@@ -0,0 +1,41 @@
+"""
+Configuración común de las pruebas: entorno mínimo y servidor stub de OpenWeatherMap
+"""
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, "scripts"))
+
+# Las pruebas no necesitan .env: usan sus propias bases y el stub local
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("POSTGRES_USER", "test")
+os.environ.setdefault("POSTGRES_PASSWORD", "test")
+os.environ.setdefault("OPENWEATHER_API_KEY", "test")
+os.environ.setdefault("DEBUG", "false")
+
+from stub_openweather import start_stub_server  # noqa: E402
+
+
+@pytest.fixture
+def stub_server(monkeypatch):
+    """Arrancar stubs de OpenWeatherMap; devuelve una función (opciones) -> (server, base_url)"""
+
+    # Las peticiones al stub no deben pasar por un proxy del entorno
+    monkeypatch.setenv("NO_PROXY", "127.0.0.1")
+    monkeypatch.setenv("no_proxy", "127.0.0.1")
+    servers = []
+
+    def start(**options):
+        options.setdefault("latency", 0)
+        server, base_url = start_stub_server(**options)
+        servers.append(server)
+        return server, base_url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
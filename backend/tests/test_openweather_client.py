@@ -0,0 +1,163 @@
+"""
+OpenWeatherClient contra el stub local: reintentos (429/5xx), agrupación /group y límite de llamadas
+"""
+import time
+
+import httpx
+import pytest
+
+from app.config import settings
+from app.models import City
+from app.services import openweather_client
+from app.services.openweather_client import MAX_GROUP_SIZE, OpenWeatherClient
+from app.services.rate_limiter import TokenBucket
+
+RETRY_DELAY = 0.05
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    """Backoff corto y sin jitter (siempre el máximo) para medirlo sin esperas largas"""
+
+    monkeypatch.setattr(settings, "etl_retry_attempts", 3)
+    monkeypatch.setattr(settings, "etl_retry_delay", RETRY_DELAY)
+    monkeypatch.setattr(settings, "etl_retry_max_delay", 1)
+    monkeypatch.setattr(openweather_client.random, "uniform", lambda low, high: high)
+
+
+def make_client(base_url: str, limiter: TokenBucket = None) -> OpenWeatherClient:
+    # Un limitador propio por prueba: el compartido por API key arrastraría estado
+    return OpenWeatherClient(
+        base_url=base_url,
+        api_key="test",
+        concurrency=10,
+        timeout=5,
+        limiter=limiter or TokenBucket(calls_per_minute=60000, burst=100)
+    )
+
+
+def record_delays(client: OpenWeatherClient, monkeypatch) -> list:
+    """Esperas calculadas por el cliente antes de cada reintento"""
+
+    delays = []
+    backoff_delay = client._backoff_delay
+
+    def spy(attempt, retry_after=None):
+        delay = backoff_delay(attempt, retry_after)
+        delays.append(delay)
+        return delay
+
+    monkeypatch.setattr(client, "_backoff_delay", spy)
+    return delays
+
+
+def request_times(server, path: str) -> list:
+    return [at for at, request_path, _ in server.requests if request_path.endswith(path)]
+
+
+def make_cities(count: int, with_openweather_id: bool, first_id: int = 1) -> list:
+    return [
+        City(
+            id=city_id, name=f"Ciudad {city_id}", country="XX",
+            openweather_id=1000 + city_id if with_openweather_id else None
+        )
+        for city_id in range(first_id, first_id + count)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_429_waits_retry_after_and_penalizes_limiter(stub_server, monkeypatch):
+    server, base_url = stub_server(fail_every=2, fail_status=429, retry_after="0.3")
+    limiter = TokenBucket(calls_per_minute=60000, burst=100)
+
+    async with make_client(base_url, limiter) as client:
+        delays = record_delays(client, monkeypatch)
+        await client._get("/weather", {"q": "Madrid"})
+        data = await client._get("/weather", {"q": "Madrid"})
+
+    assert data["name"] == "Madrid"
+    assert server.request_count == 3
+    # Retry-After manda sobre el backoff (0.05 s) y el reintento no llega antes
+    assert delays == [0.3]
+    first, rate_limited, retried = request_times(server, "/weather")
+    assert retried - rate_limited >= 0.3
+    # El 429 bloquea el bucket compartido, no solo la petición que lo recibió
+    assert limiter.rate_limited == 1
+
+
+@pytest.mark.asyncio
+async def test_5xx_retries_with_exponential_backoff(stub_server, monkeypatch):
+    server, base_url = stub_server(fail_every=1, fail_status=503)
+    limiter = TokenBucket(calls_per_minute=60000, burst=100)
+
+    async with make_client(base_url, limiter) as client:
+        delays = record_delays(client, monkeypatch)
+        with pytest.raises(httpx.HTTPStatusError) as excinfo:
+            await client._get("/weather", {"q": "Madrid"})
+
+    assert excinfo.value.response.status_code == 503
+    assert server.request_count == settings.etl_retry_attempts + 1
+    assert delays == [RETRY_DELAY * 2 ** attempt for attempt in range(settings.etl_retry_attempts)]
+    times = request_times(server, "/weather")
+    for delay, before, after in zip(delays, times, times[1:]):
+        assert after - before >= delay
+    # Un 5xx no se trata como límite de cuota
+    assert limiter.rate_limited == 0
+
+
+@pytest.mark.asyncio
+async def test_5xx_recovers_on_retry(stub_server, monkeypatch):
+    server, base_url = stub_server(fail_every=2, fail_status=500)
+
+    async with make_client(base_url) as client:
+        delays = record_delays(client, monkeypatch)
+        await client._get("/weather", {"q": "Madrid"})
+        data = await client._get("/weather", {"q": "Sevilla"})
+
+    assert data["name"] == "Sevilla"
+    assert server.request_count == 3
+    assert delays == [RETRY_DELAY]
+
+
+@pytest.mark.asyncio
+async def test_group_requests_are_chunked(stub_server):
+    server, base_url = stub_server()
+    grouped = make_cities(2 * MAX_GROUP_SIZE + 5, with_openweather_id=True)
+    individual = make_cities(1, with_openweather_id=False, first_id=len(grouped) + 1)
+
+    async with make_client(base_url) as client:
+        # Un tamaño mayor que el de la API se recorta a MAX_GROUP_SIZE
+        results = await client.fetch_cities_batched(grouped + individual, group_size=50)
+
+    group_sizes = sorted(
+        len(params["id"][0].split(",")) for _, path, params in server.requests if path.endswith("/group")
+    )
+    assert group_sizes == [5, MAX_GROUP_SIZE, MAX_GROUP_SIZE]
+    assert len(request_times(server, "/weather")) == 1
+
+    assert len(results) == len(grouped) + len(individual)
+    assert all(error is None for _, _, error in results)
+    for city, data, _ in results:
+        if city.openweather_id:
+            assert data["id"] == city.openweather_id
+
+
+@pytest.mark.asyncio
+async def test_requests_respect_rate_limiter(stub_server):
+    server, base_url = stub_server()
+    # 10 llamadas/s con ráfaga de 2: 6 peticiones necesitan al menos 0.4 s
+    limiter = TokenBucket(calls_per_minute=600, burst=2)
+    cities = make_cities(6, with_openweather_id=False)
+
+    started = time.monotonic()
+    async with make_client(base_url, limiter) as client:
+        results = await client.fetch_cities(cities)
+    elapsed = time.monotonic() - started
+
+    assert all(error is None for _, _, error in results)
+    assert limiter.calls == 6
+    assert limiter.throttled > 0
+    times = request_times(server, "/weather")
+    assert len(times) == 6
+    assert times[-1] - times[0] >= 0.35
+    assert elapsed >= 0.35
@@ -55,7 +55,8 @@ async def main():
         logger.info("ETL job completado", 
                    processed=result["processed"],
                    errors=len(result["errors"]),
-                   total_cities=result["total_cities"])
+                   total_cities=result["total_cities"],
+                   quota_remaining=result["quota_remaining"])
         
         # Log de errores si los hay
         if result["errors"]: